@@ -1,63 +1,317 @@
+import asyncio
+import contextvars
 import os
-import json
-from db_service import supabase
+import threading
+import time
+from db_client import get_client, execute
+from outbox import outbox
+from risk_history import risk_history
 
 PRIORITY_WEIGHTS = {"LOW": 1, "MEDIUM": 3, "HIGH": 6, "CRITICAL": 10}
 STATUS_WEIGHTS = {"TODO": 1, "IN_PROGRESS": 0, "BLOCKED": 15, "DONE": 0}
 
 RISK_THRESHOLD = 8
 
-def evaluate_shift_risk(shift_id: str) -> dict:
+# Full task/alert rescan at least this often per shift, to catch changes made outside this process
+RISK_RECONCILE_SECONDS = float(os.getenv("RISK_RECONCILE_SECONDS", "30"))
+# Background evaluation: bursts of /chat events on a shift within this window share one run
+RISK_DEBOUNCE_MS = float(os.getenv("RISK_DEBOUNCE_MS", "250"))
+# Processes serving the app (serve.py exports it). Above 1, the shifts row can change under this process,
+# so the published-score shortcut is off and every evaluation re-reads the row before deciding to write.
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "1"))
+
+
+def task_weight(task: dict) -> int:
+    return PRIORITY_WEIGHTS.get(task.get("priority", "LOW"), 1) + STATUS_WEIGHTS.get(task.get("status", "TODO"), 0)
+
+
+class _ShiftRisk:
+    def __init__(self):
+        self.tasks = {}  # task_id -> {"priority", "status"}
+        self.task_risk = 0
+        self.alert_ids = set()
+        self.reconciled_at = 0.0
+        self.epoch = 0  # bumped by every delta; a rescan that raced one is not trusted
+
+
+class RiskAccumulator:
+    """
+    Per-shift running totals behind evaluate_shift_risk, so /chat doesn't re-download every task and alert.
+    - Seeded by a full rescan (reconcile), then kept current from the deltas db_service already has in hand:
+      created tasks, status transitions, queued alerts.
+    - A shift is rescanned when it is untracked, older than RISK_RECONCILE_SECONDS, or a delta landed
+      while its rescan was in flight; rescans that disagree with the running totals count as drift.
+    - Deltas for shifts that aren't tracked are ignored: their next evaluation rescans anyway.
+    - Everything here is per process. Under serve.py each worker only sees its own deltas, so its totals can
+      lag other workers' writes by up to RISK_RECONCILE_SECONDS, and the last published score is only cached
+      when this is the only worker (cache_published).
+    """
+
+    def __init__(self, reconcile_seconds: float = RISK_RECONCILE_SECONDS, cache_published: bool = SERVE_WORKERS <= 1):
+        self.reconcile_seconds = reconcile_seconds
+        self.cache_published = cache_published
+        self._lock = threading.Lock()
+        self._shifts = {}
+        self._task_shift = {}  # task_id -> shift_id, for deltas that only know the task
+        self._published = {}  # shift_id -> {"risk", "escalated"} as stored in shifts
+        self._incremental = 0
+        self._full_scans = 0
+        self._drift = 0
+
+    def totals(self, shift_id: str):
+        """(task_count, task_risk, active_alerts) if the running totals can be used, else None."""
+        with self._lock:
+            state = self._shifts.get(shift_id)
+            if state is None or time.monotonic() - state.reconciled_at > self.reconcile_seconds:
+                return None
+            self._incremental += 1
+            return len(state.tasks), state.task_risk, len(state.alert_ids)
+
+    def begin_reconcile(self, shift_id: str) -> int:
+        with self._lock:
+            state = self._shifts.get(shift_id)
+            return state.epoch if state else 0
+
+    def reconcile(self, shift_id: str, tasks: list, alerts: list, epoch: int):
+        """Replaces the shift's totals with a full rescan read after begin_reconcile() returned `epoch`."""
+        with self._lock:
+            self._full_scans += 1
+            old = self._shifts.get(shift_id)
+            state = _ShiftRisk()
+            for task in tasks:
+                state.tasks[task["id"]] = {"priority": task.get("priority", "LOW"), "status": task.get("status", "TODO")}
+                state.task_risk += task_weight(task)
+                self._task_shift[task["id"]] = shift_id
+            state.alert_ids = {a.get("id") for a in alerts}
+
+            if old is not None:
+                if old.reconciled_at and (old.task_risk, len(old.tasks), len(old.alert_ids)) != \
+                        (state.task_risk, len(state.tasks), len(state.alert_ids)) and old.epoch == epoch:
+                    self._drift += 1
+                state.epoch = old.epoch
+            # Deltas that arrived during the rescan may be missing from it: use it, but rescan again next time
+            state.reconciled_at = time.monotonic() if state.epoch == epoch else 0.0
+            self._shifts[shift_id] = state
+
+    def _state_for_task(self, task_id):
+        shift_id = self._task_shift.get(task_id)
+        return self._shifts.get(shift_id) if shift_id else None
+
+    def task_created(self, task: dict):
+        with self._lock:
+            state = self._shifts.get(task.get("shift_id"))
+            if state is None or task.get("id") in state.tasks:
+                return
+            state.tasks[task["id"]] = {"priority": task.get("priority", "LOW"), "status": task.get("status", "TODO")}
+            state.task_risk += task_weight(task)
+            state.epoch += 1
+            self._task_shift[task["id"]] = task["shift_id"]
+
+    def task_status_changed(self, task_id: str, new_status: str):
+        with self._lock:
+            state = self._state_for_task(task_id)
+            if state is None or task_id not in state.tasks:
+                return
+            task = state.tasks[task_id]
+            state.task_risk -= task_weight(task)
+            task["status"] = new_status
+            state.task_risk += task_weight(task)
+            state.epoch += 1
+
+    def alerts_added(self, alerts: list):
+        with self._lock:
+            for alert in alerts:
+                state = self._shifts.get(alert.get("shift_id"))
+                if state is not None and alert.get("is_active"):
+                    state.alert_ids.add(alert.get("id"))
+                    state.epoch += 1
+
+    def published(self, shift_id: str):
+        """Last risk_score / is_high_risk known to be in the shifts row (None = unknown)."""
+        with self._lock:
+            return self._published.get(shift_id)
+
+    def set_published(self, shift_id: str, value):
+        with self._lock:
+            if value is None or not self.cache_published:
+                self._published.pop(shift_id, None)
+            else:
+                self._published[shift_id] = value
+
+    def forget(self, shift_id: str):
+        with self._lock:
+            self._published.pop(shift_id, None)
+            state = self._shifts.pop(shift_id, None)
+            for task_id in (state.tasks if state else ()):
+                self._task_shift.pop(task_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            evaluations = self._incremental + self._full_scans
+            return {
+                "tracked_shifts": len(self._shifts),
+                "reconcile_seconds": self.reconcile_seconds,
+                "incremental_evaluations": self._incremental,
+                "full_scans": self._full_scans,
+                "incremental_rate": round(self._incremental / evaluations, 4) if evaluations else 0.0,
+                "drift_corrections": self._drift,
+            }
+
+
+risk_tracker = RiskAccumulator()
+
+async def evaluate_shift_risk(shift_id: str) -> dict:
     """
     Evaluates risk and ONLY logs escalation exactly as demanded by Phase 7 and 12(C).
     DOES NOT CLOSE THE SHIFT OR MUTATE TASKS.
+    Task/alert totals come from risk_tracker when fresh; otherwise from a full rescan that re-seeds it.
+    Writes shifts only when the score or high-risk flag changes, and logs the escalation message only when
+    the score crosses RISK_THRESHOLD (the flag flip is a conditional update, so one writer owns each edge).
+    Every computed score is also recorded in risk_history (trend for /shift/risk/history).
     Returns: {"risk": int, "escalated": bool}
     """
     try:
-        # Fetch actual tasks
-        tasks_response = supabase.table("tasks").select("*").eq("shift_id", shift_id).execute()
-        tasks = tasks_response.data
-        if not tasks:
+        db = await get_client()
+
+        totals = risk_tracker.totals(shift_id)
+        if totals is None:
+            epoch = risk_tracker.begin_reconcile(shift_id)
+
+            # Fetch actual tasks
+            tasks_response = await execute(db.table("tasks").select("id, priority, status").eq("shift_id", shift_id))
+            tasks = tasks_response.data
+            if not tasks:
+                return {"risk": 0, "escalated": False}
+
+            # Fetch active alerts
+            alerts_response = await execute(db.table("alerts").select("id").eq("shift_id", shift_id).eq("is_active", True))
+            alerts = alerts_response.data or []
+            # Alerts still waiting in the outbox count too (same client-side id once flushed)
+            seen = {a.get("id") for a in alerts}
+            alerts += [a for a in outbox.pending("alerts", shift_id) if a.get("is_active") and a["id"] not in seen]
+
+            risk_tracker.reconcile(shift_id, tasks, alerts, epoch)
+            totals = (len(tasks), sum(task_weight(t) for t in tasks), len(alerts))
+
+        task_count, task_risk, alert_count = totals
+        if not task_count:
             return {"risk": 0, "escalated": False}
 
-        # Fetch active alerts
-        alerts_response = supabase.table("alerts").select("*").eq("shift_id", shift_id).eq("is_active", True).execute()
-        alerts = alerts_response.data
-        
         # Calculate Risk deterministically
-        task_risk = sum(
-            PRIORITY_WEIGHTS.get(t.get("priority", "LOW"), 1) + STATUS_WEIGHTS.get(t.get("status", "TODO"), 0)
-            for t in tasks
-        )
-        alert_risk = sum(10 for _ in alerts)
+        alert_risk = 10 * alert_count
         
         base_risk = task_risk + alert_risk
         risk_score = min(10, base_risk // 10)
+        escalated = risk_score >= RISK_THRESHOLD
+        risk_history.record(shift_id, risk_score, escalated)
+
+        previous = risk_tracker.published(shift_id)
+        if previous is None:
+            shift_response = await execute(db.table("shifts").select("risk_score, is_high_risk").eq("id", shift_id))
+            row = (shift_response.data or [{}])[0]
+            previous = {"risk": row.get("risk_score") or 0, "escalated": bool(row.get("is_high_risk"))}
+
+        current = {"risk": risk_score, "escalated": escalated}
+        if current == previous:
+            risk_tracker.set_published(shift_id, previous)
+            return current
+
+        query = db.table("shifts").update({"risk_score": risk_score, "is_high_risk": escalated}).eq("id", shift_id)
+        if escalated != previous["escalated"]:
+            # Only the writer that actually flips the flag owns the edge. A shift never evaluated has NULL
+            # is_high_risk, which eq(False) would not match.
+            if previous["escalated"]:
+                query = query.eq("is_high_risk", True)
+            else:
+                query = query.or_("is_high_risk.is.null,is_high_risk.eq.false")
+        response = await execute(query)
 
-        escalated = False
+        if escalated != previous["escalated"] and not response.data:
+            # Another worker already applied this edge (and logged it); re-read next time
+            risk_tracker.set_published(shift_id, None)
+            return current
+        risk_tracker.set_published(shift_id, current)
 
-        if risk_score >= RISK_THRESHOLD:
+        if escalated and not previous["escalated"]:
             # Phase 7 & Phase 12(C): Only Log Escelation! Do NOT close the shift!
             print(f"Shift {shift_id} crossed threshold (Risk {risk_score}). System event logged.")
-            supabase.table("chat_messages").insert({
+            outbox.enqueue("chat_messages", [{
                 "shift_id": shift_id,
                 "sender_id": None,
                 "message_text": f"Warning! Operational Risk threshold breached! Score: {risk_score}/10.",
                 "message_type": "SYSTEM" 
-            }).execute()
-            escalated = True
+            }])
 
-        # Update the live score exactly once
-        supabase.table("shifts").update({
-            "risk_score": risk_score,
-            "is_high_risk": escalated
-        }).eq("id", shift_id).execute()
-
-        return {
-            "risk": risk_score,
-            "escalated": escalated
-        }
+        return current
 
     except Exception as e:
         print(f"RISK AGENT ERROR: {str(e)}")
         return {"risk": 0, "escalated": False}
+
+
+class RiskEvaluator:
+    """
+    Runs evaluate_shift_risk off the request path. notify() after a mutation schedules one run per shift
+    RISK_DEBOUNCE_MS later; every notify that lands before (or while) it runs is folded into it, with one
+    more run if anything arrived mid-evaluation. latest() is what /chat returns immediately.
+    """
+
+    def __init__(self, debounce_ms: float = None):
+        self.debounce_ms = RISK_DEBOUNCE_MS if debounce_ms is None else debounce_ms
+        self._runs = {}  # shift_id -> task
+        self._dirty = set()
+        self._latest = {}
+        self._notified = 0
+        self._evaluations = 0
+
+    def notify(self, shift_id: str):
+        self._notified += 1
+        run = self._runs.get(shift_id)
+        if run is not None and not run.done():
+            self._dirty.add(shift_id)
+            return
+        # Fresh context: the run must not inherit the triggering request's DB budget
+        self._runs[shift_id] = asyncio.get_running_loop().create_task(
+            self._run(shift_id), context=contextvars.Context()
+        )
+
+    async def _run(self, shift_id: str):
+        try:
+            while True:
+                await asyncio.sleep(self.debounce_ms / 1000)
+                self._dirty.discard(shift_id)
+                self._latest[shift_id] = await evaluate_shift_risk(shift_id)
+                self._evaluations += 1
+                if shift_id not in self._dirty:
+                    break
+        finally:
+            if self._runs.get(shift_id) is asyncio.current_task():
+                del self._runs[shift_id]
+
+    def knows(self, shift_id: str) -> bool:
+        return shift_id in self._latest
+
+    def latest(self, shift_id: str, shift: dict = None) -> dict:
+        """Last evaluated score, else what the given shifts row (risk_score / is_high_risk) says."""
+        if shift_id in self._latest:
+            return dict(self._latest[shift_id])
+        shift = shift or {}
+        return {"risk": shift.get("risk_score") or 0, "escalated": bool(shift.get("is_high_risk"))}
+
+    async def drain(self, timeout: float = 5.0):
+        """Lets scheduled runs finish (shutdown, tests)."""
+        runs = [run for run in self._runs.values() if not run.done()]
+        if runs:
+            await asyncio.wait(runs, timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "debounce_ms": self.debounce_ms,
+            "notified": self._notified,
+            "evaluations": self._evaluations,
+            "merged": self._notified - self._evaluations - len(self._runs),
+            "scheduled": len(self._runs),
+        }
+
+
+risk_evaluator = RiskEvaluator()
@@ -1,5 +1,7 @@
+import asyncio
 import os
-from db_service import supabase
+from db_client import get_client, execute
+from resilience import separate_budget
 import google.generativeai as genai
 
 # Configure Gemini once globally
@@ -15,15 +17,17 @@ generation_config = {
   "response_mime_type": "text/plain",
 }
 
-def generate_shift_summary(shift_id: str) -> None:
+async def generate_shift_summary(shift_id: str) -> None:
     """
     Phase 6: Shift End Integration (Gemini Component)
     Fetches shift metrics, asks Gemini to summarize strictly based on numbers,
     and saves it to the DB. Does NOT crash if Gemini fails.
     """
     try:
+        db = await get_client()
+
         # Fetch Shift Data
-        shift_response = supabase.table("shifts").select("*").eq("id", shift_id).execute()
+        shift_response = await execute(db.table("shifts").select("*").eq("id", shift_id))
         shift = shift_response.data[0] if shift_response.data else None
         
         if not shift:
@@ -31,7 +35,7 @@ def generate_shift_summary(shift_id: str) -> None:
             return
 
         # Fetch Tasks
-        tasks_response = supabase.table("tasks").select("status").eq("shift_id", shift_id).execute()
+        tasks_response = await execute(db.table("tasks").select("status").eq("shift_id", shift_id))
         tasks = tasks_response.data or []
         
         # Calculate Metrics
@@ -41,7 +45,7 @@ def generate_shift_summary(shift_id: str) -> None:
         pending_tasks = total_tasks - completed_tasks - blocked_tasks
 
         # Fetch Active Alerts
-        alerts_response = supabase.table("alerts").select("id").eq("shift_id", shift_id).eq("is_active", True).execute()
+        alerts_response = await execute(db.table("alerts").select("id").eq("shift_id", shift_id).eq("is_active", True))
         alerts_count = len(alerts_response.data or [])
 
         risk_score = shift.get("risk_score", 0)
@@ -72,23 +76,26 @@ Only describe based on numbers provided."""
                 generation_config=generation_config,
             )
             chat_session = model.start_chat(history=[])
-            response = chat_session.send_message(prompt)
+            # Blocking SDK call: keep it off the event loop
+            response = await asyncio.to_thread(chat_session.send_message, prompt)
             ai_summary = response.text.strip()
             print(f"Shift {shift_id} Gemini summary successfully generated.")
         except Exception as e:
             print(f"Gemini API failure: {str(e)}")
             ai_summary = "AI summary unavailable due to generation error."
 
-        # Insert final summary into database
-        supabase.table("shift_summaries").insert({
-            "shift_id": shift_id,
-            "total_tasks": total_tasks,
-            "completed_tasks": completed_tasks,
-            "blocked_tasks": blocked_tasks,
-            "alerts_raised": alerts_count,
-            "final_risk_score": risk_score,
-            "ai_summary": ai_summary
-        }).execute()
+        # Insert final summary into database. The Gemini call above can eat the whole /shift/end request
+        # budget, so the write gets a budget of its own instead of failing with DeadlineExceeded.
+        with separate_budget():
+            await execute(db.table("shift_summaries").insert({
+                "shift_id": shift_id,
+                "total_tasks": total_tasks,
+                "completed_tasks": completed_tasks,
+                "blocked_tasks": blocked_tasks,
+                "alerts_raised": alerts_count,
+                "final_risk_score": risk_score,
+                "ai_summary": ai_summary
+            }))
         
     except Exception as e:
         print(f"Summary Service DB Error: {str(e)}")
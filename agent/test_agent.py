@@ -1,11 +1,22 @@
+import asyncio
+import os
+import tempfile
+
+# SYSTEM messages are queued in the outbox; keep the test's queue out of the repo
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+# The tests edit mock_db directly (outside db_service), so every evaluation must rescan
+os.environ.setdefault("RISK_RECONCILE_SECONDS", "0")
+
 from agent_service import evaluate_shift_risk, PRIORITY_WEIGHTS, STATUS_WEIGHTS, RISK_THRESHOLD
-import agent_service
+import db_client
+from outbox import outbox
 
 # Mock Supabase
 class MockQuery:
     def __init__(self, data):
         self._data = data
         self._eq_filters = {}
+        self._update = None
         
     def select(self, *args, **kwargs):
         return self
@@ -18,11 +29,16 @@ class MockQuery:
         self._single = True
         return self
         
-    def execute(self):
+    async def execute(self):
         # Apply filters
         result = self._data
         for k, v in self._eq_filters.items():
             result = [row for row in result if row.get(k) == v]
+
+        # update(): applied to the filtered rows, which are returned (PostgREST returns representation)
+        if self._update is not None:
+            for row in result:
+                row.update(self._update)
         
         # for single()
         if hasattr(self, '_single') and self._single:
@@ -35,14 +51,7 @@ class MockQuery:
         return self
         
     def update(self, data):
-        for row in self._data:
-            match = True
-            for k, v in self._eq_filters.items():
-                if row.get(k) != v:
-                    match = False
-                    break
-            if match:
-                row.update(data)
+        self._update = data
         return self
 
 class MockTable:
@@ -72,7 +81,7 @@ class MockSupabase:
 
 # Inject Mock
 mock_db = MockSupabase()
-agent_service.supabase = mock_db
+db_client.use_client(mock_db)
 
 # ---------------------------------------------------------
 # TEST SETUP
@@ -99,16 +108,16 @@ mock_db.db["tasks"].extend([
 ])
 
 print("\n--- TEST 1: 3 CRITICAL TODOs ---")
-evaluate_shift_risk(shift_id)
+asyncio.run(evaluate_shift_risk(shift_id))
 shift = mock_db.db["shifts"][0]
 print(f"Risk Score (Expected 15): {shift['risk_score']}")
 print(f"Is High Risk (Expected False): {shift['is_high_risk']}")
 
 print("\n--- TEST 2: Block 1 CRITICAL task (Force Escalation) ---")
 mock_db.db["tasks"][2]["status"] = "BLOCKED"
-evaluate_shift_risk(shift_id)
+asyncio.run(evaluate_shift_risk(shift_id))
 shift = mock_db.db["shifts"][0]
-messages = mock_db.db["chat_messages"]
+messages = mock_db.db["chat_messages"] + outbox.pending("chat_messages", shift_id)
 
 print(f"Risk Score (Expected 20): {shift['risk_score']}")
 print(f"Is High Risk (Expected True): {shift['is_high_risk']}")
@@ -120,9 +129,9 @@ if messages:
 print("\n--- TEST 3: FSM Guard (No duplicate spam) ---")
 # Update a task without changing risk (e.g. TODO -> IN_PROGRESS, weight stays 1)
 mock_db.db["tasks"][0]["status"] = "IN_PROGRESS"
-evaluate_shift_risk(shift_id)
+asyncio.run(evaluate_shift_risk(shift_id))
 shift = mock_db.db["shifts"][0]
-messages = mock_db.db["chat_messages"]
+messages = mock_db.db["chat_messages"] + outbox.pending("chat_messages", shift_id)
 
 print(f"Risk Score (Expected 20): {shift['risk_score']}")
 print(f"Is High Risk (Expected True): {shift['is_high_risk']}")
@@ -144,14 +153,14 @@ def mock_router_mark_done(task_id):
     # THE REQUIRED ALERT DEACTIVATION
     mock_db.db["alerts"][0]["is_active"] = False
     
-    evaluate_shift_risk(shift_id)
+    asyncio.run(evaluate_shift_risk(shift_id))
 
 mock_router_mark_done(task_1_id)
 mock_router_mark_done(task_2_id)
 mock_router_mark_done(task_3_id)
 
 shift = mock_db.db["shifts"][0]
-messages = mock_db.db["chat_messages"]
+messages = mock_db.db["chat_messages"] + outbox.pending("chat_messages", shift_id)
 alerts = mock_db.db["alerts"]
 
 print(f"Risk Score (Expected 0): {shift['risk_score']}")
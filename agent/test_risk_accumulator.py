@@ -0,0 +1,100 @@
+import asyncio
+import os
+import random
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+import db_service
+from agent.agent_service import evaluate_shift_risk, risk_tracker
+from fake_supabase import FakeSupabase, seed_demo
+
+STATUSES = ["TODO", "IN_PROGRESS", "BLOCKED", "DONE"]
+PRIORITIES = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+
+async def full_rescan(shift_id: str) -> dict:
+    risk_tracker.forget(shift_id)
+    return await evaluate_shift_risk(shift_id)
+
+
+async def random_change(rng: random.Random, fake: FakeSupabase, shift_id: str):
+    codes = [t["task_code"] for t in fake.tables["tasks"] if t["shift_id"] == shift_id]
+    op = rng.randrange(6)
+    if op == 0:
+        await db_service.create_task(f"Task {rng.random():.4f}", "house")
+    elif op == 1:
+        await db_service.create_tasks_bulk([
+            {"title": "Bulk", "assigned_to": "house", "priority": rng.choice(PRIORITIES)} for _ in range(rng.randint(1, 4))
+        ])
+    elif op == 2:
+        await db_service.transition_task_status_by_code(rng.choice(codes), rng.choice(STATUSES))
+    elif op == 3:
+        await db_service.update_task_statuses_by_code({code: rng.choice(STATUSES) for code in rng.sample(codes, 3)})
+    elif op == 4:
+        task = rng.choice([t for t in fake.tables["tasks"] if t["shift_id"] == shift_id])
+        await db_service.update_task_status(task["id"], rng.choice(STATUSES))
+    else:
+        await db_service.create_alerts([{"shift_id": shift_id, "alert_type": "BLOCK", "weight": 8, "is_active": True}])
+
+
+async def run_tests():
+    fake = FakeSupabase()
+    shift_id = seed_demo(fake, tasks=12)
+    db_client.use_client(fake)
+    db_service.active_shift_cache.invalidate()
+    rng = random.Random(11)
+
+    print("\n--- TEST 1: Incremental results match a full rescan after every change ---")
+    await full_rescan(shift_id)
+    mismatches = 0
+    for _ in range(150):
+        await random_change(rng, fake, shift_id)
+        incremental = await evaluate_shift_risk(shift_id)
+        expected = await full_rescan(shift_id)
+        mismatches += incremental != expected
+    print(f"Mismatches over 150 random changes (Expected 0): {mismatches}")
+    print(f"Drift corrections (Expected 0): {risk_tracker.stats()['drift_corrections']}")
+
+    print("\n--- TEST 2: Evaluations stop re-reading tasks and alerts ---")
+    fake.reset_stats()
+    for _ in range(20):
+        await db_service.create_task("Routine check", "house")
+        await evaluate_shift_risk(shift_id)
+    print(f"Task/alert reads for 20 evaluations (Expected 0): "
+          f"{fake.calls.get('select tasks', 0) + fake.calls.get('select alerts', 0)}")
+
+    print("\n--- TEST 3: Changes made behind our back are caught by reconciliation ---")
+    fake = FakeSupabase()
+    shift_id = seed_demo(fake, tasks=4)
+    db_client.use_client(fake)
+    await evaluate_shift_risk(shift_id)
+    for task in fake.tables["tasks"]:
+        task["status"] = "BLOCKED"  # edited directly in the database
+    stale = await evaluate_shift_risk(shift_id)
+    risk_tracker.reconcile_seconds = 0
+    reconciled = await evaluate_shift_risk(shift_id)
+    print(f"Risk before / after reconciliation (Expected 2 / 8): {stale['risk']} / {reconciled['risk']}")
+    print(f"Drift corrections (Expected 1): {risk_tracker.stats()['drift_corrections']}")
+
+    print("\n--- TEST 4: With several workers the shifts row is re-read before skipping a write ---")
+    mine = await evaluate_shift_risk(shift_id)
+    row = next(s for s in fake.tables["shifts"] if s["id"] == shift_id)
+    row["risk_score"], row["is_high_risk"] = 0, False  # another worker wrote since
+    await evaluate_shift_risk(shift_id)
+    print(f"Single worker trusts its cache (Expected 0): {row['risk_score']}")
+    risk_tracker.cache_published = False
+    risk_tracker.set_published(shift_id, None)
+    row["risk_score"], row["is_high_risk"] = 0, False
+    await evaluate_shift_risk(shift_id)
+    print(f"Several workers re-read and write (Expected {mine['risk']} True): {row['risk_score']} {row['is_high_risk']}")
+    risk_tracker.cache_published = True
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+import db_service
+from agent.agent_service import RiskEvaluator, evaluate_shift_risk, risk_tracker
+from fake_supabase import FakeSupabase, seed_demo
+from outbox import outbox
+
+
+def escalation_messages(shift_id: str) -> int:
+    return sum(1 for m in outbox.pending("chat_messages", shift_id) if "threshold breached" in m["message_text"])
+
+
+async def run_tests():
+    fake = FakeSupabase()
+    shift_id = seed_demo(fake, tasks=4)
+    db_client.use_client(fake)
+    db_service.active_shift_cache.invalidate()
+    evaluator = RiskEvaluator(debounce_ms=20)
+
+    print("\n--- TEST 1: A burst of notifies shares one evaluation ---")
+    for _ in range(25):
+        evaluator.notify(shift_id)
+    print(f"latest() before the run (Expected 0): {evaluator.latest(shift_id)['risk']}")
+    await evaluator.drain()
+    stats = evaluator.stats()
+    print(f"Evaluations / merged (Expected 1 / 24): {stats['evaluations']} / {stats['merged']}")
+    print(f"latest() after the run (Expected 2): {evaluator.latest(shift_id)['risk']}")
+
+    print("\n--- TEST 2: Unchanged score does not write shifts ---")
+    fake.reset_stats()
+    for _ in range(5):
+        evaluator.notify(shift_id)
+        await evaluator.drain()
+    print(f"Evaluations (Expected 6): {evaluator.stats()['evaluations']}")
+    print(f"Shift writes for 5 same-score runs (Expected 0): {fake.calls.get('update shifts', 0)}")
+
+    print("\n--- TEST 3: Escalation is logged once per upward crossing ---")
+    await db_service.create_alerts([
+        {"shift_id": shift_id, "alert_type": "BLOCK", "weight": 8, "is_active": True} for _ in range(6)
+    ])
+    evaluator.notify(shift_id)
+    await evaluator.drain()
+    for _ in range(3):  # stays above the threshold
+        await db_service.create_task("Restock", "house")
+        evaluator.notify(shift_id)
+        await evaluator.drain()
+    shift = next(s for s in fake.tables["shifts"] if s["id"] == shift_id)
+    print(f"Escalated (Expected True True): {shift['is_high_risk']} {shift['risk_score'] >= 8}")
+    print(f"Escalation messages (Expected 1): {escalation_messages(shift_id)}")
+
+    print("\n--- TEST 4: Concurrent evaluators log the same edge only once ---")
+    shift["is_high_risk"], shift["risk_score"] = False, 2  # edge reset behind our back
+    fake.latency_ms = 5
+    risk_tracker.set_published(shift_id, None)
+    # Both read the flag as down before either writes; only the conditional update that flips it wins
+    results = await asyncio.gather(*(evaluate_shift_risk(shift_id) for _ in range(4)))
+    print(f"All report the escalation (Expected [True, True, True, True]): {[r['escalated'] for r in results]}")
+    print(f"Escalation messages (Expected 2): {escalation_messages(shift_id)}")
+
+    print("\n--- TEST 5: A shift whose flag was never set (NULL) still escalates ---")
+    shift["is_high_risk"], shift["risk_score"] = None, None  # column defaults on a fresh shift
+    risk_tracker.set_published(shift_id, None)
+    result = await evaluate_shift_risk(shift_id)
+    print(f"Escalated and stored (Expected True True): {result['escalated']} {shift['is_high_risk']}")
+    print(f"Escalation messages (Expected 3): {escalation_messages(shift_id)}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,121 @@
+"""
+Benchmark: shift rotation latency and the "rotation window" (time during which readers see no active shift,
+or two), legacy five-round-trip rotation vs. the atomic rotate_shift RPC with the cached ring.
+  legacy: live active select -> ring select -> deactivate -> activate -> message insert   = 5 round trips
+  atomic: active shift (re-read once per rotation) + cached ring -> rotate_shift         = 2 round trips
+Runs offline against FakeSupabase with the given round-trip latency. A probe task samples the shifts table
+while rotations run; every sample that does not see exactly one active shift is time /chat would fail.
+
+Usage:
+    python bench_shift_rotation.py [--rotations 50] [--latency-ms 40] [--jitter-ms 10] [--shifts 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+import db_service
+from db_client import get_client, execute
+from fake_supabase import FakeSupabase, seed_demo
+
+PROBE_INTERVAL_SECONDS = 0.0005
+
+
+async def legacy_rotation():
+    """The pre-RPC end_active_shift, step for step."""
+    db = await get_client()
+    active = (await execute(db.table("shifts").select("*").eq("is_active", True).limit(1))).data[0]
+    all_shifts = (await execute(db.table("shifts").select("*").order("sequence_order"))).data
+    index = next(i for i, s in enumerate(all_shifts) if s["id"] == active["id"])
+    next_shift = all_shifts[(index + 1) % len(all_shifts)]
+    await execute(db.table("shifts").update({"is_active": False}).eq("id", active["id"]))
+    await execute(db.table("shifts").update({"is_active": True}).eq("id", next_shift["id"]))
+    await execute(db.table("chat_messages").insert({
+        "shift_id": next_shift["id"],
+        "sender_id": None,
+        "message_text": f"Shift changed from {active['name']} to {next_shift['name']}",
+        "message_type": "SYSTEM"
+    }))
+
+
+async def atomic_rotation():
+    _, err = await db_service.end_active_shift()
+    if err:
+        raise RuntimeError(err)
+
+
+async def probe(fake: FakeSupabase, stop: asyncio.Event, window: dict):
+    """Samples the table directly (no simulated latency) so the window is measured, not blurred."""
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+        now = time.perf_counter()
+        active = sum(1 for s in fake.tables["shifts"] if s.get("is_active"))
+        window["samples"] += 1
+        if active != 1:
+            window["bad_samples"] += 1
+            window["seconds"] += now - last
+        last = now
+
+
+async def measure(rotate, args) -> dict:
+    fake = FakeSupabase(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=7)
+    seed_demo(fake, shifts=args.shifts, tasks=0)
+    db_client.use_client(fake)
+    db_service.active_shift_cache.invalidate()
+    db_service.shift_ring_cache.invalidate()
+    await rotate()  # warm-up (fills the caches on the atomic path)
+    fake.reset_stats()
+
+    window = {"samples": 0, "bad_samples": 0, "seconds": 0.0}
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(fake, stop, window))
+    latencies = []
+    for _ in range(args.rotations):
+        t0 = time.perf_counter()
+        await rotate()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    stop.set()
+    await prober
+    db_client.use_client(None)
+
+    ordered = sorted(latencies)
+    return {
+        "round_trips": round(fake.stats()["round_trips"] / args.rotations, 1),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "window_ms": round(window["seconds"] * 1000 / args.rotations, 2),
+        "bad_probe_pct": round(100 * window["bad_samples"] / max(1, window["samples"]), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rotations", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--shifts", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {
+        "legacy (5 round trips)": asyncio.run(measure(legacy_rotation, args)),
+        "atomic rpc + cached ring": asyncio.run(measure(atomic_rotation, args)),
+    }
+
+    print(f"\n{'path':<26} {'trips':>6} {'p50_ms':>9} {'p95_ms':>9} {'window_ms':>10} {'bad_probes':>11}")
+    for name, r in results.items():
+        print(f"{name:<26} {r['round_trips']:>6} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+              f"{r['window_ms']:>10} {r['bad_probe_pct']:>10}%")
+    print("\nwindow_ms: mean time per rotation during which readers saw zero or two active shifts.")
+
+
+if __name__ == "__main__":
+    main()
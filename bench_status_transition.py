@@ -0,0 +1,95 @@
+"""
+Benchmark: chat status transition latency, current multi-round-trip path vs. the single RPC.
+  legacy: select id by task_code -> update_task_status (select * by id, then update)   = 3 round trips
+  rpc:    transition_task_status_by_code (sql/001_transition_task_status.sql)          = 1 round trip
+Runs against the Supabase project in .env. The given task is flipped between TODO and BLOCKED
+(never DONE, so it stays reusable) and restored to its original status afterwards.
+
+Usage:
+    python bench_status_transition.py T-1023 [--iterations 50] [--warmup 5]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from db_client import get_client, execute, close_client
+from db_service import update_task_status, transition_task_status_by_code
+
+STATES = ("BLOCKED", "TODO")
+
+
+async def legacy_transition(task_code: str, new_status: str):
+    db = await get_client()
+    t_res = await execute(db.table("tasks").select("id").eq("task_code", task_code))
+    if not t_res.data:
+        raise RuntimeError(f"Task {task_code} not found")
+    _, err, _ = await update_task_status(t_res.data[0]["id"], new_status)
+    if err:
+        raise RuntimeError(err)
+
+
+async def rpc_transition(task_code: str, new_status: str):
+    _, err, _ = await transition_task_status_by_code(task_code, new_status)
+    if err:
+        raise RuntimeError(err)
+
+
+async def measure(fn, task_code: str, iterations: int, warmup: int) -> list:
+    latencies = []
+    for i in range(warmup + iterations):
+        t0 = time.perf_counter()
+        await fn(task_code, STATES[i % 2])
+        elapsed = (time.perf_counter() - t0) * 1000
+        if i >= warmup:
+            latencies.append(elapsed)
+    return latencies
+
+
+def summarize(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+    }
+
+
+async def run(args):
+    db = await get_client()
+    original = (await execute(db.table("tasks").select("id, status").eq("task_code", args.task_code))).data
+    if not original:
+        sys.exit(f"Task {args.task_code} not found.")
+    if original[0]["status"] == "DONE":
+        sys.exit(f"Task {args.task_code} is DONE; pick a task that can still change status.")
+
+    try:
+        results = {
+            "legacy (3 round trips)": summarize(await measure(legacy_transition, args.task_code, args.iterations, args.warmup)),
+            "rpc (1 round trip)": summarize(await measure(rpc_transition, args.task_code, args.iterations, args.warmup)),
+        }
+    finally:
+        await update_task_status(original[0]["id"], original[0]["status"])
+        await close_client()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("task_code")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print(f"\n{'path':<24} {'mean_ms':>9} {'p50_ms':>9} {'p95_ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<24} {r['mean_ms']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9}")
+    legacy, rpc = results.values()
+    print(f"\nRPC speedup (p50): {legacy['p50_ms'] / rpc['p50_ms']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
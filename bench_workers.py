@@ -0,0 +1,162 @@
+"""
+Benchmark: requests/sec vs. worker count for the pre-fork server (serve.py) on one box.
+For each worker count it boots serve.py, waits for /ready, hammers POST /nlp/classify
+(NLP only, no DB writes) from several client processes and records throughput, latency
+and total PSS of the server process tree (Linux), which shows the copy-on-write sharing.
+
+Usage:
+    python bench_workers.py [--workers 1 2 4] [--duration 15] [--clients 4] [--concurrency 16]
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+
+
+def load_messages() -> list:
+    with open(os.path.join(BASE_DIR, "nlp", "full_dataset.csv"), newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+
+def wait_ready(port: int, timeout: float = 300) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(HOST, port, timeout=2)
+            conn.request("GET", "/ready")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def client_thread(port: int, messages: list, stop_at: float) -> list:
+    latencies = []
+    errors = 0
+    conn = http.client.HTTPConnection(HOST, port, timeout=30)
+    while time.time() < stop_at:
+        body = json.dumps({"message": random.choice(messages)})
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/nlp/classify", body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn = http.client.HTTPConnection(HOST, port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies, errors
+
+
+def client_process(port: int, messages: list, duration: float, concurrency: int):
+    stop_at = time.time() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: client_thread(port, messages, stop_at), range(concurrency)))
+    latencies = [l for lat, _ in results for l in lat]
+    errors = sum(e for _, e in results)
+    return latencies, errors
+
+
+def process_tree_pss_mb(root_pid: int):
+    """Proportional set size of a process and its children; shared pages are counted once."""
+    def children(pid):
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                return [int(p) for p in f.read().split()]
+        except OSError:
+            return []
+
+    def pss_kb(pid):
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+        return 0
+
+    if not os.path.exists("/proc"):
+        return None
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        kb = pss_kb(pid)
+        if kb is None:
+            return None
+        total += kb
+        stack.extend(children(pid))
+    return round(total / 1024, 1)
+
+
+def bench(workers: int, args, messages: list) -> dict:
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "serve.py"), "--workers", str(workers),
+         "--host", HOST, "--port", str(port), "--log-level", "warning"],
+        cwd=BASE_DIR,
+    )
+    try:
+        if not wait_ready(port):
+            raise RuntimeError(f"serve.py with {workers} workers never became ready")
+        time.sleep(1)  # let every worker finish its startup hook
+
+        with ProcessPoolExecutor(max_workers=args.clients) as pool:
+            futures = [pool.submit(client_process, port, messages, args.duration, args.concurrency)
+                       for _ in range(args.clients)]
+            pss = process_tree_pss_mb(server.pid)
+            results = [f.result() for f in futures]
+
+        latencies = sorted(l for lat, _ in results for l in lat)
+        errors = sum(e for _, e in results)
+        if not latencies:
+            raise RuntimeError("no successful requests")
+        return {
+            "workers": workers,
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / args.duration, 1),
+            "p50_ms": round(latencies[len(latencies) // 2], 2),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+            "server_pss_mb": pss,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--clients", type=int, default=4, help="Load-generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Connections per client process")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    messages = load_messages()
+    rows = [bench(w, args, messages) for w in args.workers]
+
+    print(f"\n{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'PSS MB':>10}")
+    for r in rows:
+        print(f"{r['workers']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}{str(r['server_pss_mb']):>10}")
+
+
+if __name__ == "__main__":
+    main()
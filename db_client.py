@@ -0,0 +1,319 @@
+"""
+Shared async Supabase data-access layer.
+One AsyncClient per process (rebuilt after fork or when used from a different event loop), all of whose
+PostgREST/auth traffic goes through ONE tuned httpx pool: keep-alive, HTTP/2 when `h2` is installed,
+bounded connection counts and default timeouts. Queries are awaited through execute(), which applies the
+per-call timeout (capped by the request budget), goes through the circuit breaker and feeds the pool
+metrics served at /db/stats; idempotent reads use execute_read() for hedging and last-known-good fallback
+(see resilience.py).
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, LastGood, ReadLatency, UNAVAILABLE_ERRORS,
+    DB_HEDGE_ENABLED, DB_REQUEST_BUDGET_MS, hedged, remaining_budget,
+)
+
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_POOL_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_POOL_KEEPALIVE_SECONDS", "30"))
+SUPABASE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "3"))
+# Default per-call deadline; execute(query, timeout=...) overrides it for a single call
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+
+
+class PoolMetrics:
+    """Counters for the shared pool. Latency is time to response headers, per HTTP request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = 0
+            self._errors = 0
+            self._timeouts = 0
+            self._in_flight = 0
+            self._peak_in_flight = 0
+            self._http2_responses = 0
+            self._latencies_ms = deque(maxlen=2048)
+
+    def started(self):
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def finished(self, elapsed_ms: float, http_version: bytes = None, error: bool = False):
+        with self._lock:
+            self._in_flight -= 1
+            self._latencies_ms.append(elapsed_ms)
+            if error:
+                self._errors += 1
+            elif http_version == b"HTTP/2":
+                self._http2_responses += 1
+
+    def timed_out(self):
+        with self._lock:
+            self._timeouts += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            ordered = sorted(self._latencies_ms)
+
+            def pct(q):
+                return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3) if ordered else 0.0
+
+            return {
+                "requests": self._requests,
+                "errors": self._errors,
+                "timeouts": self._timeouts,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "http2_responses": self._http2_responses,
+                "p50_ms": pct(0.50),
+                "p99_ms": pct(0.99),
+            }
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx pooled transport that reports every request to PoolMetrics."""
+
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+        self._metrics = metrics
+
+    async def handle_async_request(self, request):
+        self._metrics.started()
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._metrics.finished((time.perf_counter() - started) * 1000, error=True)
+            raise
+        self._metrics.finished((time.perf_counter() - started) * 1000, response.extensions.get("http_version"))
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def connections(self) -> list:
+        # httpcore pool behind httpx's transport; only used for stats
+        pool = getattr(self._transport, "_pool", None)
+        return list(getattr(pool, "connections", []))
+
+
+class ResilienceMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"deadline_exceeded": 0, "fast_failed": 0, "reads": 0, "hedges_sent": 0,
+                           "hedges_won": 0, "stale_served": 0}
+
+    def incr(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+class CachedResponse:
+    """Last known good result, returned by execute_read when the live read failed."""
+
+    def __init__(self, data, stored_at: float):
+        self.data = data
+        self.stored_at = stored_at
+        self.stale = True
+
+
+metrics = PoolMetrics()
+breaker = CircuitBreaker()
+read_latency = ReadLatency()
+last_good = LastGood()
+resilience_metrics = ResilienceMetrics()
+
+_client = None
+_client_loop = None
+_transport = None
+_override = None
+
+
+def _build_client() -> AsyncClient:
+    global _transport
+    _transport = _InstrumentedTransport(
+        metrics,
+        http2=SUPABASE_HTTP2,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_POOL_KEEPALIVE_SECONDS,
+        ),
+    )
+    http_client = httpx.AsyncClient(
+        transport=_transport,
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT_SECONDS, connect=SUPABASE_CONNECT_TIMEOUT_SECONDS),
+        follow_redirects=True,
+    )
+    return AsyncClient(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, AsyncClientOptions(httpx_client=http_client))
+
+
+async def get_client():
+    """The process-wide client (or the one injected with use_client)."""
+    global _client, _client_loop
+    if _override is not None:
+        return _override
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        # httpx connections are bound to the loop that opened them
+        _client = _build_client()
+        _client_loop = loop
+    return _client
+
+
+def use_client(client):
+    """Injects a client (e.g. a test double) for every caller; use_client(None) restores the real one."""
+    global _override
+    _override = client
+
+
+async def execute(query, timeout: float = None):
+    """
+    Awaits a built query (`client.table(...).select(...)`, `client.rpc(...)`) with a per-call deadline:
+    `timeout` (default SUPABASE_TIMEOUT_SECONDS), cut down to what is left of the request budget.
+    Fails fast with CircuitOpenError while the breaker is open and DeadlineExceeded once the budget is spent.
+    """
+    budget = remaining_budget()
+    if budget is not None and budget <= 0:
+        resilience_metrics.incr("deadline_exceeded")
+        raise DeadlineExceeded("DB request budget exhausted")
+    if not breaker.allow():
+        resilience_metrics.incr("fast_failed")
+        raise CircuitOpenError("Supabase circuit breaker is open")
+
+    limit = timeout or SUPABASE_TIMEOUT_SECONDS
+    budget_bound = budget is not None and budget < limit
+    try:
+        result = await asyncio.wait_for(query.execute(), budget if budget_bound else limit)
+    except asyncio.CancelledError:
+        breaker.release()  # a cancelled hedge says nothing about backend health
+        raise
+    except asyncio.TimeoutError:
+        metrics.timed_out()
+        if budget_bound:
+            # The caller ran out of time, not necessarily the backend: no verdict for the breaker
+            breaker.release()
+            resilience_metrics.incr("deadline_exceeded")
+            raise DeadlineExceeded("DB request budget exhausted")
+        breaker.record(False)
+        raise
+    except UNAVAILABLE_ERRORS:
+        breaker.record(False)
+        raise
+    except Exception:
+        breaker.record(True)  # PostgREST answered (4xx, constraint violation): the backend is up
+        raise
+    breaker.record(True)
+    return result
+
+
+async def execute_read(build, key=None, timeout: float = None):
+    """
+    Idempotent read. `build()` returns a fresh query (it may be sent twice). A read still pending after the
+    recent p95 read latency is hedged with one duplicate request. With a `key`, the result is remembered, and
+    if the read fails for availability reasons (timeout, connection error, open breaker) the last known good
+    result for that key is returned as a CachedResponse instead.
+    """
+    resilience_metrics.incr("reads")
+    started = time.perf_counter()
+    try:
+        if DB_HEDGE_ENABLED:
+            result, hedge_won = await hedged(
+                lambda: execute(build(), timeout),
+                read_latency.hedge_after_ms() / 1000,
+                on_hedge=lambda: resilience_metrics.incr("hedges_sent"),
+            )
+            if hedge_won:
+                resilience_metrics.incr("hedges_won")
+        else:
+            result = await execute(build(), timeout)
+    except UNAVAILABLE_ERRORS:
+        cached = last_good.get(key) if key is not None else None
+        if cached is None:
+            raise
+        resilience_metrics.incr("stale_served")
+        data, stored_at = cached
+        return CachedResponse(_copy_rows(data), stored_at)
+
+    read_latency.add((time.perf_counter() - started) * 1000)
+    if key is not None:
+        last_good.put(key, _copy_rows(result.data))  # callers may mutate result.data
+    return result
+
+
+def _copy_rows(data):
+    if isinstance(data, list):
+        return [dict(row) if isinstance(row, dict) else row for row in data]
+    return dict(data) if isinstance(data, dict) else data
+
+
+async def close_client():
+    global _client, _client_loop, _transport
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.options.httpx_client.aclose()
+    _client = _client_loop = _transport = None
+
+
+def pool_stats() -> dict:
+    connections = _transport.connections() if _transport else []
+    return {
+        "http2_enabled": SUPABASE_HTTP2,
+        "max_connections": SUPABASE_POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": SUPABASE_POOL_MAX_KEEPALIVE,
+        "keepalive_expiry_seconds": SUPABASE_POOL_KEEPALIVE_SECONDS,
+        "timeout_seconds": SUPABASE_TIMEOUT_SECONDS,
+        "open_connections": len(connections),
+        "idle_connections": sum(1 for c in connections if c.is_idle()),
+        **metrics.stats(),
+    }
+
+
+def resilience_stats() -> dict:
+    return {
+        "request_budget_ms": DB_REQUEST_BUDGET_MS,
+        "hedging_enabled": DB_HEDGE_ENABLED,
+        "hedge_after_ms": round(read_latency.hedge_after_ms(), 2),
+        "last_good_keys": len(last_good),
+        "breaker": breaker.stats(),
+        **resilience_metrics.stats(),
+    }
+
+
+def _reset_after_fork():
+    # Sockets inherited from the parent must not be shared; each worker opens its own pool
+    global _client, _client_loop, _transport
+    _client = _client_loop = _transport = None
+    for counters in (metrics, breaker, resilience_metrics):
+        counters._lock = threading.Lock()
+        counters.reset()
+    read_latency._lock = threading.Lock()
+    last_good._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,98 +1,261 @@
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+import base64
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from db_client import get_client, execute, execute_read, pool_stats, resilience_stats
+from resilience import UNAVAILABLE_ERRORS
+from shift_cache import ActiveShiftCache
+from outbox import outbox
+from risk_history import risk_history
+from agent.agent_service import SERVE_WORKERS, risk_tracker, risk_evaluator
+
+# The active shift only changes in end_active_shift (which invalidates); the TTL covers edits made elsewhere.
+# The cache is per process: under serve.py with several workers only the worker that rotated invalidates, and
+# the others keep serving the old shift to /chat and task creation for up to the TTL. That is why the default
+# drops from 30s to 2s when SERVE_WORKERS > 1. ACTIVE_SHIFT_CACHE_TTL_SECONDS=0 disables caching.
+ACTIVE_SHIFT_CACHE_TTL_SECONDS = float(os.getenv("ACTIVE_SHIFT_CACHE_TTL_SECONDS", "30" if SERVE_WORKERS <= 1 else "2"))
+active_shift_cache = ActiveShiftCache(ttl_seconds=ACTIVE_SHIFT_CACHE_TTL_SECONDS)
+
+# Shift ring (all shifts by sequence_order) for rotation; it only changes when shifts are added or reordered.
+# Same single-value cache; rotate_shift rejects a stale successor and end_active_shift reloads once.
+SHIFT_RING_CACHE_TTL_SECONDS = float(os.getenv("SHIFT_RING_CACHE_TTL_SECONDS", "300"))
+shift_ring_cache = ActiveShiftCache(ttl_seconds=SHIFT_RING_CACHE_TTL_SECONDS)
+
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+def get_db_stats():
+    return {
+        "active_shift_cache": active_shift_cache.stats(),
+        "shift_ring_cache": shift_ring_cache.stats(),
+        "pool": pool_stats(),
+        "resilience": resilience_stats(),
+        "outbox": outbox.stats(),
+        "risk_accumulator": risk_tracker.stats(),
+        "risk_evaluator": risk_evaluator.stats(),
+        "risk_history": risk_history.stats(),
+    }
 
 
-def check_db_connection():
+async def check_db_connection():
     try:
-        response = supabase.table("shifts").select("id").limit(1).execute()
+        db = await get_client()
+        response = await execute(db.table("shifts").select("id").limit(1))
         return True
     except Exception as e:
         print("DB ERROR:", e)
         return False
 
 
-def get_active_shift():
+# Rewritten by evaluate_shift_risk whenever the score changes, so never served from the active shift cache;
+# read them live with get_shift_risk
+SHIFT_RISK_COLUMNS = ("risk_score", "is_high_risk")
+
+
+async def _fetch_active_shift():
+    db = await get_client()
+    # Hedged; falls back to the last active shift seen while Supabase is unavailable
+    response = await execute_read(lambda: db.table("shifts").select("*").eq("is_active", True).limit(1),
+                                  key="active_shift")
+    shifts = response.data
+    if not shifts:
+        return None
+    shift = shifts[0]
+    for column in SHIFT_RISK_COLUMNS:
+        shift.pop(column, None)
+    return shift
+
+
+async def get_active_shift(use_cache: bool = True):
     try:
-        response = supabase.table("shifts").select("*").eq("is_active", True).limit(1).execute()
-        shifts = response.data
-        if not shifts:
-            return None
-        return shifts[0]
+        if not use_cache:
+            return await _fetch_active_shift()
+        return await active_shift_cache.get(_fetch_active_shift)
     except Exception as e:
         print("DB ERROR:", e)
         return None
 
 
-def get_shift_tasks(shift_id: str):
+async def get_shift_risk(shift_id: str):
+    """Live {"risk_score", "is_high_risk"} of a shift (not cached), or None if missing / on DB error."""
     try:
-        response = supabase.table("tasks").select("*").eq("shift_id", shift_id).execute()
-        tasks = response.data
-        if not tasks:
-            return []
-        
-        priority_order = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
-        
-        def sort_key(task):
-            prio = priority_order.get(task.get("priority", "LOW"), 4)
-            created = task.get("created_at", "")
-            return (prio, created)
-            
-        tasks.sort(key=sort_key)
-        return tasks
+        db = await get_client()
+        response = await execute_read(
+            lambda: db.table("shifts").select(", ".join(SHIFT_RISK_COLUMNS)).eq("id", shift_id),
+            key=("shift_risk", shift_id)
+        )
+        return (response.data or [None])[0]
     except Exception as e:
         print("DB ERROR:", e)
         return None
 
 
-def end_active_shift():
+# Exactly the fields /shift/tasks returns (aliased to its names), plus the sort key for the cursor
+SHIFT_TASK_COLUMNS = "task_id:id, task_code, title, status, priority, assigned_to, created_at, priority_rank"
+SHIFT_TASKS_PAGE_SIZE = int(os.getenv("SHIFT_TASKS_PAGE_SIZE", "100"))
+SHIFT_TASKS_MAX_PAGE_SIZE = int(os.getenv("SHIFT_TASKS_MAX_PAGE_SIZE", "500"))
+
+
+def encode_task_cursor(task: dict) -> str:
+    key = [task["priority_rank"], task["created_at"], task["task_id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_task_cursor(cursor: str) -> tuple:
+    """
+    Raises ValueError for anything that isn't a cursor we issued. The values end up inside an or_() filter
+    string, so each one is parsed and re-serialised (int rank, ISO timestamp, uuid), never passed through.
+    """
     try:
-        active_shift = get_active_shift()
-        if not active_shift:
-            return None, "No active shift found"
+        rank, created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if type(rank) is not int or not isinstance(created_at, str) or not isinstance(task_id, str):
+            raise ValueError
+        return rank, datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(task_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
 
-        response = supabase.table("shifts").select("*").order("sequence_order").execute()
-        all_shifts = response.data
-        if not all_shifts:
-            return None, "No shifts available"
 
-        current_id = active_shift.get("id")
-        current_index = next((i for i, s in enumerate(all_shifts) if s.get("id") == current_id), -1)
+async def get_shift_tasks(shift_id: str, limit: int = None, cursor: str = None, statuses: list = None, priorities: list = None):
+    """
+    One page of a shift's tasks, ordered in the database by priority (CRITICAL first), created_at, id
+    (priority_rank column + index from sql/002_task_priority_rank.sql). Keyset pagination: `cursor` is the
+    next_cursor of the previous page, so every page costs the same regardless of shift size.
+    Returns {"tasks", "next_cursor", "has_more"}, or None on DB error. Raises ValueError for a bad cursor.
+    """
+    limit = max(1, min(limit or SHIFT_TASKS_PAGE_SIZE, SHIFT_TASKS_MAX_PAGE_SIZE))
+    after = decode_task_cursor(cursor) if cursor else None
+    try:
+        db = await get_client()
 
-        if current_index == -1:
-            return None, "Active shift not found in ordered list"
+        def build():
+            query = db.table("tasks").select(SHIFT_TASK_COLUMNS).eq("shift_id", shift_id)
+            if statuses:
+                query = query.in_("status", statuses)
+            if priorities:
+                query = query.in_("priority", priorities)
+            if after:
+                rank, created_at, task_id = after
+                query = query.or_(
+                    f'priority_rank.gt.{rank},'
+                    f'and(priority_rank.eq.{rank},created_at.gt."{created_at}"),'
+                    f'and(priority_rank.eq.{rank},created_at.eq."{created_at}",id.gt.{task_id})'
+                )
+            # One extra row tells us whether another page exists
+            return query.order("priority_rank").order("created_at").order("id").limit(limit + 1)
 
-        next_index = current_index + 1 if current_index + 1 < len(all_shifts) else 0
-        next_shift = all_shifts[next_index]
+        # Hedged; the last good copy of this exact page is served while Supabase is unavailable
+        key = ("shift_tasks", shift_id, limit, cursor, tuple(statuses or ()), tuple(priorities or ()))
+        response = await execute_read(build, key=key)
+        tasks = response.data or []
+        has_more = len(tasks) > limit
+        tasks = tasks[:limit]
+        next_cursor = encode_task_cursor(tasks[-1]) if has_more else None
+        for task in tasks:
+            task.pop("priority_rank", None)
+        return {"tasks": tasks, "next_cursor": next_cursor, "has_more": has_more}
+    except Exception as e:
+        print("DB ERROR:", e)
+        return None
 
-        old_name = active_shift["name"]
-        new_name = next_shift["name"]
 
-        # Update database
-        supabase.table("shifts").update({"is_active": False}).eq("id", current_id).execute()
-        supabase.table("shifts").update({"is_active": True}).eq("id", next_shift.get("id")).execute()
+async def get_shift_risk_history(shift_id: str, before: float = None, limit: int = None):
+    """
+    Stored risk trend points for a shift (sql/004_shift_risk_history.sql), the newest `limit` of them recorded
+    before `before` (epoch seconds; None = all). Used to backfill risk_history rings. Returns a list, or None
+    on DB error.
+    """
+    limit = limit or risk_history.points
+    try:
+        db = await get_client()
 
+        def build():
+            query = db.table("shift_risk_history").select("recorded_at, risk_score, is_high_risk").eq("shift_id", shift_id)
+            if before is not None:
+                query = query.lt("recorded_at", datetime.fromtimestamp(before, timezone.utc).isoformat())
+            return query.order("recorded_at", desc=True).limit(limit)
 
-        # Insert system message
-        message = {
+        response = await execute_read(build, key=("shift_risk_history", shift_id, before, limit))
+        return response.data or []
+    except Exception as e:
+        print("DB ERROR:", e)
+        return None
+
+
+async def _fetch_shift_ring():
+    db = await get_client()
+    response = await execute(db.table("shifts").select("id, name, sequence_order").order("sequence_order"))
+    return tuple(response.data or ())
+
+
+async def end_active_shift():
+    """
+    Rotates to the next shift in sequence_order with ONE write: the active shift and the ring come from the
+    in-process caches, and the rotate_shift RPC (sql/003_rotate_shift.sql) checks the active shift and flips
+    both rows atomically, so readers never see zero or two active shifts. If another request already rotated, nothing changes
+    (a double-submitted /shift/end must not skip a shift).
+    """
+    try:
+        db = await get_client()
+
+        for _ in range(2):
+            active_shift = await active_shift_cache.get(_fetch_active_shift)
+            if not active_shift:
+                return None, "No active shift found"
+
+            all_shifts = await shift_ring_cache.get(_fetch_shift_ring)
+            if not all_shifts:
+                return None, "No shifts available"
+
+            current_id = active_shift.get("id")
+            current_index = next((i for i, s in enumerate(all_shifts) if s.get("id") == current_id), -1)
+
+            if current_index == -1:
+                # Shift added since the ring was cached
+                shift_ring_cache.invalidate()
+                continue
+
+            next_shift = all_shifts[(current_index + 1) % len(all_shifts)]
+
+            response = await execute(db.rpc("rotate_shift", {
+                "p_from_shift_id": current_id,
+                "p_to_shift_id": next_shift["id"]
+            }))
+            rows = response.data
+            if not rows:
+                # Cached ring is stale (successor rejected by the RPC): reload it and try once more
+                shift_ring_cache.invalidate()
+                continue
+            if not rows[0].get("rotated"):
+                return None, "Shift was already rotated"
+            break
+        else:
+            return None, "Active shift not found in ordered list"
+
+        old_name = active_shift["name"]
+        new_name = next_shift["name"]
+        risk_tracker.forget(current_id)
+
+        # System message goes through the outbox (flushed in the background)
+        outbox.enqueue("chat_messages", [{
             "shift_id": next_shift.get("id"),
             "sender_id": None,
             "message_text": f"Shift changed from {old_name} to {new_name}",
             "message_type": "SYSTEM"
-        }
-        supabase.table("chat_messages").insert(message).execute()
+        }])
 
         return {"previous_shift": old_name, "current_shift": new_name}, None
     except Exception as e:
         print("DB ERROR:", e)
         return None, "Internal server error"
+    finally:
+        # Also on failure or conflict: never keep serving the pre-rotation row
+        active_shift_cache.invalidate()
 
 from datetime import datetime, timezone
 
-def update_task_status(task_id: str, new_status: str):
+async def update_task_status(task_id: str, new_status: str):
     try:
-        response = supabase.table("tasks").select("*").eq("id", task_id).execute()
+        db = await get_client()
+        response = await execute(db.table("tasks").select("*").eq("id", task_id))
         tasks = response.data
         if not tasks:
             return None, "Task not found", 404
@@ -109,42 +272,292 @@ def update_task_status(task_id: str, new_status: str):
         else:
             update_data["completed_at"] = None
             
-        supabase.table("tasks").update(update_data).eq("id", task_id).execute()
+        await execute(db.table("tasks").update(update_data).eq("id", task_id))
+        risk_tracker.task_status_changed(task_id, new_status)
         
         return {"task_id": task_id, "previous_status": current_status, "current_status": new_status}, None, 200
         
     except Exception as e:
         print("DB ERROR:", e)
-def create_task(title: str, assigned_to: str):
+        return None, "Internal server error", 500
+
+
+async def transition_task_status_by_code(task_code: str, new_status: str):
+    """
+    Lookup by task_code + "not already DONE" guard + update in ONE round trip
+    (Postgres function in sql/001_transition_task_status.sql).
+    Returns (data, err, status_code) like update_task_status, with the task_id added to data.
+    """
     try:
-        active_shift = supabase.table("shifts") \
-            .select("id") \
-            .eq("is_active", True) \
-            .limit(1) \
-            .execute()
+        db = await get_client()
+        response = await execute(db.rpc("transition_task_status", {
+            "p_task_code": task_code,
+            "p_new_status": new_status
+        }))
+        rows = response.data
+        if not rows:
+            return None, f"Task {task_code} not found in active records.", 404
+
+        row = rows[0]
+        if not row.get("updated"):
+            return None, "Cannot modify a completed task", 400
+
+        risk_tracker.task_status_changed(row["task_id"], row["current_status"])
+        return {"task_id": row["task_id"], "previous_status": row["previous_status"], "current_status": row["current_status"]}, None, 200
 
-        if not active_shift.data:
+    except Exception as e:
+        print("DB ERROR:", e)
+        return None, "Internal server error", 500
+
+
+async def create_task(title: str, assigned_to: str):
+    try:
+        db = await get_client()
+        active_shift = await active_shift_cache.get(_fetch_active_shift)
+        if not active_shift:
             return None, "No active shift", 400
 
-        active_shift_id = active_shift.data[0]["id"]
+        active_shift_id = active_shift["id"]
 
         creator_id = "235b4451-e7f9-4dc6-9ffd-3bf8ce30ca9b"
 
-        insert_response = supabase.table("tasks").insert({
+        insert_response = await execute(db.table("tasks").insert({
             "title": title,
             "shift_id": active_shift_id,
             "created_by": creator_id,
             "assigned_to": assigned_to,
             "status": "TODO",
             "priority": "MEDIUM"
-        }).execute()
+        }))
 
         inserted_data = insert_response.data
         if not inserted_data:
             return None, "Failed to insert task", 500
-            
+
+        risk_tracker.task_created(inserted_data[0])
         return inserted_data[0], None, 201
         
     except Exception as e:
         print("CREATE TASK ERROR:", str(e))
         return None, str(e), 500
+
+
+async def create_tasks(items: list):
+    """
+    Batched create_task: ONE (cached) active-shift lookup and ONE multi-row insert.
+    items: [{"title": str, "assigned_to": str}]
+    Returns (inserted_rows, err, status_code)
+    """
+    try:
+        db = await get_client()
+        active_shift = await active_shift_cache.get(_fetch_active_shift)
+        if not active_shift:
+            return None, "No active shift", 400
+
+        active_shift_id = active_shift["id"]
+
+        creator_id = "235b4451-e7f9-4dc6-9ffd-3bf8ce30ca9b"
+
+        rows = [{
+            "title": item["title"],
+            "shift_id": active_shift_id,
+            "created_by": creator_id,
+            "assigned_to": item["assigned_to"],
+            "status": "TODO",
+            "priority": "MEDIUM"
+        } for item in items]
+
+        insert_response = await execute(db.table("tasks").insert(rows))
+
+        inserted_data = insert_response.data
+        if not inserted_data or len(inserted_data) != len(rows):
+            return None, "Failed to insert tasks", 500
+
+        for task in inserted_data:
+            risk_tracker.task_created(task)
+        return inserted_data, None, 201
+
+    except Exception as e:
+        print("CREATE TASKS ERROR:", str(e))
+        return None, str(e), 500
+
+
+TASK_PRIORITIES = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+# Rows per multi-row INSERT for bulk loads (keeps request bodies and statement size bounded)
+TASK_BULK_CHUNK_SIZE = int(os.getenv("TASK_BULK_CHUNK_SIZE", "100"))
+
+
+def _validate_task_item(item) -> str:
+    """Returns an error message for a bad bulk row, or None."""
+    if not isinstance(item, dict):
+        return "Task must be an object"
+    if not (item.get("title") or "").strip():
+        return "Missing title"
+    if not (item.get("assigned_to") or "").strip():
+        return "Missing assigned_to"
+    if item.get("priority") is not None and item["priority"] not in TASK_PRIORITIES:
+        return f"Invalid priority {item['priority']!r}"
+    return None
+
+
+async def _upsert_tasks_by_id(db, rows: list) -> list:
+    """Idempotent re-send of rows carrying client-side ids; returns every one of them that is now stored."""
+    await execute(db.table("tasks").upsert(rows, on_conflict="id", ignore_duplicates=True))
+    response = await execute(db.table("tasks").select("*").in_("id", [row["id"] for row in rows]))
+    return response.data or []
+
+
+async def create_tasks_bulk(items: list, chunk_size: int = None):
+    """
+    Shift-start bulk load: ONE (cached) active-shift lookup, then one multi-row insert per chunk.
+    Rows are validated individually and get a client-side id. If PostgREST rejects a chunk, its rows are
+    retried one by one so the error lands on the offending row only; if the outcome is unknown (timeout,
+    dropped connection) the chunk is re-sent as an upsert that ignores ids already stored, never duplicated.
+    items: [{"title": str, "assigned_to": str, "priority": optional str}]
+    Returns ({"shift_id", "created": [(index, row)], "errors": [{"index", "error"}]}, err, status_code)
+    """
+    try:
+        active_shift = await active_shift_cache.get(_fetch_active_shift)
+        if not active_shift:
+            return None, "No active shift", 400
+
+        db = await get_client()
+        creator_id = "235b4451-e7f9-4dc6-9ffd-3bf8ce30ca9b"
+
+        created = []
+        errors = []
+        pending = []  # (index, row)
+        for index, item in enumerate(items):
+            error = _validate_task_item(item)
+            if error:
+                errors.append({"index": index, "error": error})
+                continue
+            pending.append((index, {
+                "id": str(uuid.uuid4()),  # client-side, so an ambiguous failure can be retried without duplicates
+                "title": item["title"].strip(),
+                "shift_id": active_shift["id"],
+                "created_by": creator_id,
+                "assigned_to": item["assigned_to"].strip(),
+                "status": "TODO",
+                "priority": item.get("priority") or "MEDIUM"
+            }))
+
+        chunk_size = chunk_size or TASK_BULK_CHUNK_SIZE
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            rows = [row for _, row in chunk]
+            try:
+                response = await execute(db.table("tasks").insert(rows))
+                inserted = response.data or []
+            except UNAVAILABLE_ERRORS as e:
+                # Ambiguous: the chunk may have committed before the connection dropped / the deadline hit.
+                # Re-send it idempotently (client-side ids) and read back what is stored.
+                print("BULK TASK CHUNK ERROR (retrying idempotently):", str(e))
+                try:
+                    inserted = await _upsert_tasks_by_id(db, rows)
+                except Exception as retry_error:
+                    errors.extend({"index": index, "error": f"Insert outcome unknown: {retry_error}"}
+                                  for index, _ in chunk)
+                    continue
+            except Exception as e:
+                # Definite rejection (PostgREST answered, nothing committed): retry row by row so the error
+                # lands on the offending row only
+                print("BULK TASK CHUNK ERROR:", str(e))
+                inserted = None
+
+            if inserted is not None:
+                stored = {row["id"]: row for row in inserted}
+                for index, row in chunk:
+                    if row["id"] in stored:
+                        created.append((index, stored[row["id"]]))
+                    else:
+                        errors.append({"index": index, "error": "Failed to insert task"})
+            else:
+                for index, row in chunk:
+                    try:
+                        response = await execute(db.table("tasks").insert(row))
+                        if not response.data:
+                            raise Exception("Failed to insert task")
+                        created.append((index, response.data[0]))
+                    except Exception as row_error:
+                        errors.append({"index": index, "error": str(row_error)})
+
+        for _, task in created:
+            risk_tracker.task_created(task)
+        errors.sort(key=lambda e: e["index"])
+        return {"shift_id": active_shift["id"], "created": created, "errors": errors}, None, 201
+
+    except Exception as e:
+        print("BULK CREATE TASKS ERROR:", str(e))
+        return None, str(e), 500
+
+
+async def update_task_statuses_by_code(updates: dict):
+    """
+    Batched status transitions keyed by task code: {task_code: new_status}.
+    ONE lookup for every code, then ONE update per target status (DONE tasks are never modified; a code
+    whose row the guarded update did not return reports an error and leaves the risk totals alone).
+    Returns ({task_code: {"task_id", "previous_status", "current_status"} | {"error": str}}, err)
+    """
+    try:
+        db = await get_client()
+        codes = list(updates.keys())
+        response = await execute(db.table("tasks").select("id, task_code, status").in_("task_code", codes))
+        found = {t["task_code"]: t for t in (response.data or [])}
+
+        results = {}
+        by_status = {}
+        for code, new_status in updates.items():
+            task = found.get(code)
+            if not task:
+                results[code] = {"error": f"Task {code} not found in active records."}
+            elif task.get("status") == "DONE":
+                results[code] = {"error": "Cannot modify a completed task"}
+            else:
+                by_status.setdefault(new_status, []).append(task)
+
+        for new_status, tasks in by_status.items():
+            update_data = {"status": new_status}
+            if new_status == "DONE":
+                update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
+            else:
+                update_data["completed_at"] = None
+
+            response = await execute(db.table("tasks").update(update_data)
+                .in_("id", [t["id"] for t in tasks])
+                .neq("status", "DONE"))
+            updated = {row["id"] for row in (response.data or [])}
+
+            for t in tasks:
+                if t["id"] not in updated:
+                    # Completed (or removed) between the lookup and the guarded update: nothing changed
+                    results[t["task_code"]] = {"error": "Cannot modify a completed task"}
+                    continue
+                risk_tracker.task_status_changed(t["id"], new_status)
+                results[t["task_code"]] = {
+                    "task_id": t["id"],
+                    "previous_status": t.get("status"),
+                    "current_status": new_status
+                }
+
+        return results, None
+
+    except Exception as e:
+        print("DB ERROR:", e)
+        return None, "Internal server error"
+
+
+async def create_alerts(alerts: list):
+    """
+    Queues alerts in the durable outbox; the background flusher batches them into multi-row inserts.
+    Returns (queued_rows with their client-side ids, err)
+    """
+    try:
+        if not alerts:
+            return [], None
+        queued = outbox.enqueue("alerts", alerts)
+        risk_tracker.alerts_added(queued)
+        return queued, None
+    except Exception as e:
+        print("DB ERROR:", e)
+        return None, "Failed to log alerts"
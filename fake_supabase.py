@@ -0,0 +1,450 @@
+"""
+In-memory Supabase stand-in for offline load testing and profiling.
+Implements the slice of the postgrest query builder this backend uses:
+    table(...).select/eq/neq/gt/gte/lt/lte/in_/or_/order/limit/single/insert/upsert/update/delete
+    rpc("transition_task_status", ...), rpc("rotate_shift", ...)   (same contracts as the functions in sql/)
+and awaits an injectable round-trip latency on every execute(), so the app's real query count shows up as
+real wall time. Column defaults the database would fill (ids, created_at, task_code, priority_rank) are
+generated here.
+
+Inject it in-process:
+    db_client.use_client(FakeSupabase(latency_ms=40, jitter_ms=10))
+
+or serve the whole FastAPI app against seeded fake data:
+    python fake_supabase.py --latency-ms 40 --tasks 200 [--port 8000]
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import os
+import random
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from postgrest.exceptions import APIError
+
+PRIORITY_RANKS = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# --- filters ---
+
+def _coerce(raw, current):
+    """PostgREST compares in the column's type; or_() values arrive as text."""
+    if not isinstance(raw, str) or current is None or isinstance(current, str):
+        return raw
+    if isinstance(current, bool):
+        return raw.lower() == "true"
+    if isinstance(current, (int, float)):
+        return type(current)(raw)
+    return raw
+
+
+def _compare(op, current, value):
+    if op == "is":
+        return current is None if value in (None, "null") else current == _coerce(value, current)
+    if op == "in":
+        return current in [_coerce(v, current) for v in value]
+    if current is None:
+        return False  # SQL: comparisons with NULL are never true
+    value = _coerce(value, current)
+    if op == "eq":
+        return current == value
+    if op == "neq":
+        return current != value
+    if op == "gt":
+        return current > value
+    if op == "gte":
+        return current >= value
+    if op == "lt":
+        return current < value
+    if op == "lte":
+        return current <= value
+    raise NotImplementedError(f"filter operator {op!r}")
+
+
+def _split_top_level(text: str) -> list:
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_logic(text: str):
+    """Parses a PostgREST logic tree ('a.eq.1,and(b.gt.2,c.lt."x")') into a row predicate."""
+    match = re.fullmatch(r"(and|or)\((.*)\)", text, re.S)
+    if match:
+        return _combine(match.group(1), match.group(2))
+    column, op, value = text.split(".", 2)
+    if op == "in":
+        value = [v.strip().strip('"') for v in _split_top_level(value.strip("()"))]
+    elif len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return lambda row: _compare(op, row.get(column), value)
+
+
+def _combine(kind: str, body: str):
+    predicates = [_parse_logic(part) for part in _split_top_level(body)]
+    if kind == "and":
+        return lambda row: all(p(row) for p in predicates)
+    return lambda row: any(p(row) for p in predicates)
+
+
+def _sort_key(value):
+    # Postgres default: NULLS LAST for ascending order
+    return (value is None, value if value is not None else 0)
+
+
+class FakeQueryBuilder:
+    def __init__(self, client, table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = None
+        self._payload = None
+        self._on_conflict = "id"
+        self._ignore_duplicates = False
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._single = False
+        self._maybe = False
+
+    # --- verbs ---
+
+    def select(self, *columns, count=None):
+        self._columns = ",".join(columns) if columns else "*"
+        return self
+
+    def insert(self, rows, **kwargs):
+        self._op, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", ignore_duplicates: bool = False, **kwargs):
+        self._op, self._payload = "upsert", rows
+        self._on_conflict, self._ignore_duplicates = on_conflict or "id", ignore_duplicates
+        return self
+
+    def update(self, data: dict, **kwargs):
+        self._op, self._payload = "update", data
+        return self
+
+    def delete(self, **kwargs):
+        self._op = "delete"
+        return self
+
+    # --- filters / modifiers ---
+
+    def _filter(self, op, column, value):
+        self._filters.append(lambda row: _compare(op, row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def is_(self, column, value):
+        return self._filter("is", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def or_(self, filters: str, reference_table: str = None):
+        self._filters.append(_combine("or", filters))
+        return self
+
+    def order(self, column, desc: bool = False, nullsfirst: bool = None, **kwargs):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self._limit = size
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._single = self._maybe = True
+        return self
+
+    # --- execution ---
+
+    def _matching(self, rows: list) -> list:
+        return [row for row in rows if all(f(row) for f in self._filters)]
+
+    def _project(self, row: dict) -> dict:
+        if self._columns in (None, "*"):
+            return copy.deepcopy(row)
+        projected = {}
+        for column in (c.strip() for c in self._columns.split(",")):
+            if column == "*":
+                projected.update(copy.deepcopy(row))
+                continue
+            alias, _, source = column.rpartition(":")
+            projected[alias or source] = copy.deepcopy(row.get(source))
+        return projected
+
+    def _run(self):
+        store = self._client.tables.setdefault(self._table, [])
+
+        if self._op in ("insert", "upsert"):
+            rows = self._payload if isinstance(self._payload, list) else [self._payload]
+            written = []
+            for row in rows:
+                row = self._client.with_defaults(self._table, copy.deepcopy(row))
+                existing = next((r for r in store if r.get(self._on_conflict) == row.get(self._on_conflict)), None)
+                if existing is not None:
+                    if self._op == "insert":
+                        raise APIError({"code": "23505", "message": f"duplicate key value violates unique "
+                                                                    f"constraint on {self._table}.{self._on_conflict}"})
+                    if self._ignore_duplicates:
+                        continue
+                    existing.update(row)
+                    written.append(existing)
+                else:
+                    store.append(row)
+                    written.append(row)
+            result = written
+        elif self._op == "update":
+            result = self._matching(store)
+            for row in result:
+                row.update(copy.deepcopy(self._payload))
+                self._client.derive(self._table, row)
+        elif self._op == "delete":
+            result = self._matching(store)
+            ids = {id(row) for row in result}
+            store[:] = [row for row in store if id(row) not in ids]
+        else:
+            result = self._matching(store)
+            for column, desc in reversed(self._orders):
+                result = sorted(result, key=lambda r: _sort_key(r.get(column)), reverse=desc)
+            if self._limit is not None:
+                result = result[:self._limit]
+            if self._client.max_rows is not None:
+                result = result[:self._client.max_rows]  # PostgREST db-max-rows: silently short
+
+        data = [self._project(row) for row in result]
+        if self._single:
+            if len(data) == 1:
+                return FakeResponse(data[0])
+            if self._maybe and not data:
+                return None
+            raise APIError({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                            "details": f"The result contains {len(data)} rows"})
+        return FakeResponse(data)
+
+    async def execute(self):
+        await self._client.round_trip(f"{self._op} {self._table}")
+        return self._run()
+
+
+class FakeRPC:
+    def __init__(self, client, name: str, params: dict):
+        self._client, self._name, self._params = client, name, params
+
+    async def execute(self):
+        await self._client.round_trip(f"rpc {self._name}")
+        handler = self._client.functions.get(self._name)
+        if handler is None:
+            raise APIError({"code": "PGRST202", "message": f"Could not find the function public.{self._name}"})
+        return FakeResponse(handler(self._client, **self._params))
+
+
+def transition_task_status(client, p_task_code, p_new_status):
+    """Mirror of sql/001_transition_task_status.sql."""
+    task = next((t for t in client.tables.get("tasks", []) if t.get("task_code") == p_task_code), None)
+    if task is None:
+        return []
+    previous = task["status"]
+    if previous == "DONE":
+        return [{"task_id": task["id"], "previous_status": previous, "current_status": previous, "updated": False}]
+    task["status"] = p_new_status
+    task["completed_at"] = _now() if p_new_status == "DONE" else None
+    return [{"task_id": task["id"], "previous_status": previous, "current_status": p_new_status, "updated": True}]
+
+
+def rotate_shift(client, p_from_shift_id, p_to_shift_id):
+    """Mirror of sql/003_rotate_shift.sql (both rows flip with no await in between)."""
+    ring = sorted(client.tables.get("shifts", []), key=lambda s: _sort_key(s.get("sequence_order")))
+    active = next((s for s in ring if s.get("is_active")), None)
+    if active is None or active["id"] != p_from_shift_id:
+        return [{"rotated": False, "active_shift_id": active["id"] if active else None}]
+    successor = ring[(ring.index(active) + 1) % len(ring)]
+    if successor["id"] != p_to_shift_id:
+        return []
+    active["is_active"] = False
+    successor["is_active"] = True
+    return [{"rotated": True, "active_shift_id": p_to_shift_id}]
+
+
+class FakeSupabase:
+    """
+    Drop-in for supabase.AsyncClient on the data path (db_client.use_client(FakeSupabase())).
+    latency_ms / jitter_ms: simulated round trip awaited by every execute() (uniform jitter, seeded by `seed`).
+    tail_rate / tail_ms: fraction of calls that take tail_ms instead (a slow replica, a GC pause).
+    error_rate: fraction of calls that fail with ConnectionError after their latency (1.0 = outage).
+    max_rows: server-side cap on rows per select, like PostgREST's db-max-rows (Supabase default 1000).
+    All of them can be changed on a live instance.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = None, tables: dict = None,
+                 tail_ms: float = 0.0, tail_rate: float = 0.0, error_rate: float = 0.0, max_rows: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.max_rows = max_rows
+        self.tables = copy.deepcopy(tables) if tables else {}
+        self.functions = {"transition_task_status": transition_task_status, "rotate_shift": rotate_shift}
+        self.round_trips = 0
+        self.calls = {}
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        self._task_codes = itertools.count(1001)
+
+    def table(self, name: str) -> FakeQueryBuilder:
+        return FakeQueryBuilder(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: dict = None) -> FakeRPC:
+        return FakeRPC(self, name, params or {})
+
+    async def round_trip(self, label: str):
+        self.round_trips += 1
+        self.calls[label] = self.calls.get(label, 0) + 1
+        if self.tail_rate and self._random.random() < self.tail_rate:
+            delay = self.tail_ms
+        else:
+            delay = self.latency_ms + (self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        # Always yield, as a real network call would, so concurrency behaves realistically
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.injected_errors += 1
+            raise ConnectionError(f"injected failure: {label}")
+
+    def with_defaults(self, table: str, row: dict) -> dict:
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now())
+        if table == "tasks":
+            row.setdefault("task_code", f"T-{next(self._task_codes)}")
+            row.setdefault("status", "TODO")
+            row.setdefault("priority", "MEDIUM")
+        elif table == "shifts":
+            row.setdefault("is_active", False)
+            row.setdefault("risk_score", 0)
+            row.setdefault("is_high_risk", False)
+        elif table == "alerts":
+            row.setdefault("is_active", True)
+        return self.derive(table, row)
+
+    def derive(self, table: str, row: dict) -> dict:
+        """Generated columns (sql/002_task_priority_rank.sql)."""
+        if table == "tasks":
+            row["priority_rank"] = PRIORITY_RANKS.get(row.get("priority"), 4)
+        return row
+
+    def stats(self) -> dict:
+        return {"round_trips": self.round_trips, "injected_errors": self.injected_errors,
+                "calls": dict(sorted(self.calls.items()))}
+
+    def reset_stats(self):
+        self.round_trips = 0
+        self.injected_errors = 0
+        self.calls.clear()
+
+
+def seed_demo(client: FakeSupabase, shifts: int = 3, tasks: int = 50) -> str:
+    """Seeds a rotation of shifts (the first one active) and `tasks` tasks on it. Returns the active shift id."""
+    names = ["Morning", "Evening", "Night", "Swing", "Weekend"]
+    shift_rows = [client.with_defaults("shifts", {
+        "name": names[i % len(names)] if i < len(names) else f"Shift {i + 1}",
+        "is_active": i == 0,
+        "sequence_order": i + 1,
+    }) for i in range(shifts)]
+    client.tables.setdefault("shifts", []).extend(shift_rows)
+    client.tables.setdefault("users", []).append(
+        {"id": "235b4451-e7f9-4dc6-9ffd-3bf8ce30ca9b", "name": "Dr. Gregory House", "role_type": "HEAD"}
+    )
+
+    start = datetime.now(timezone.utc)
+    priorities = list(PRIORITY_RANKS)
+    client.tables.setdefault("tasks", []).extend(client.with_defaults("tasks", {
+        "title": f"Seeded task {i + 1}",
+        "shift_id": shift_rows[0]["id"],
+        "created_by": "235b4451-e7f9-4dc6-9ffd-3bf8ce30ca9b",
+        "assigned_to": "house",
+        "priority": priorities[i % len(priorities)],
+        "created_at": (start + timedelta(milliseconds=i)).isoformat(),
+    }) for i in range(tasks))
+    return shift_rows[0]["id"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--tail-ms", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--shifts", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=50)
+    args = parser.parse_args()
+
+    # config.py insists on credentials; nothing is sent to them while the fake is injected
+    os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+
+    import uvicorn
+    import db_client
+    from main import app
+
+    fake = FakeSupabase(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_ms=args.tail_ms,
+                        tail_rate=args.tail_rate, error_rate=args.error_rate)
+    seed_demo(fake, shifts=args.shifts, tasks=args.tasks)
+    db_client.use_client(fake)
+    print(f"Serving against FakeSupabase ({args.latency_ms}±{args.jitter_ms} ms per round trip).")
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
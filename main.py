@@ -1,11 +1,20 @@
+import asyncio
+import os
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from pydantic import BaseModel
-from db_service import check_db_connection, get_active_shift, get_shift_tasks, end_active_shift, update_task_status, create_task, supabase
+from db_service import check_db_connection, get_active_shift, get_shift_risk, get_shift_tasks, get_shift_risk_history, end_active_shift, update_task_status, transition_task_status_by_code, create_task, create_tasks, create_tasks_bulk, update_task_statuses_by_code, create_alerts, get_db_stats
+from db_client import close_client
+from resilience import request_budget
+from outbox import outbox
+from risk_history import risk_history
 
 # Strict integration routing (Phase 8 verification)
-from nlp.engine import process_message
-from agent.agent_service import evaluate_shift_risk
+from nlp.engine import process_message_async, process_clauses_async, InferenceQueueFull, is_ready, get_nlp_stats, start_background_load, wait_until_ready, get_load_status
+from nlp.segmenter import split_clauses
+from agent.agent_service import risk_evaluator
 from agent.summary_service import generate_shift_summary
 
 app = FastAPI(title="MediStream Backend")
@@ -17,22 +26,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# How long /chat waits for a still-loading model before answering "warming"
+NLP_CHAT_READY_WAIT_SECONDS = float(os.getenv("NLP_CHAT_READY_WAIT_SECONDS", "2"))
+# Retry-After sent with the "busy" response when the inference queue is full
+NLP_BUSY_RETRY_AFTER_SECONDS = os.getenv("NLP_BUSY_RETRY_AFTER_SECONDS", "1")
+# Upper bound on rows accepted by POST /task/bulk
+TASK_BULK_MAX_ITEMS = int(os.getenv("TASK_BULK_MAX_ITEMS", "1000"))
+
+@app.middleware("http")
+async def db_request_budget(request, call_next):
+    """Every Supabase call made while serving a request shares one latency budget (DB_REQUEST_BUDGET_MS)."""
+    with request_budget():
+        return await call_next(request)
+
+
 @app.on_event("startup")
-def startup_event():
-    """Phase 4: Guaranteeing Model Load exactly once on startup"""
+async def startup_event():
+    """Phase 4: Guaranteeing Model Load exactly once on startup (in the background, see /ready)"""
     print("MEDI-STREAM STARTUP SEQUENCE INITIATED.")
     
     # Connection Check
-    if not check_db_connection():
+    if not await check_db_connection():
         print("CRITICAL: Supabase Database inaccessible!")
     else:
         print("Supabase Data Link: OK")
 
-    # NLP Engine Force-Init Check
-    print("Pre-warming NLP pipelines...")
-    _ = process_message("Test warmup CREATE_TASK", user_id="system")
-    print("NLP Link: OK")
-    print("Backend Fully Armed.")
+    # NLP Engine loads + pre-warms on its own thread; the server binds immediately
+    print("Loading NLP pipelines in background...")
+    start_background_load()
+
+    # Alerts / SYSTEM messages are written behind the request; rows left from a previous run go out first
+    outbox.start()
+    # Risk trend points go to the outbox every RISK_HISTORY_FLUSH_SECONDS
+    risk_history.start()
+    print("Backend Accepting Connections.")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Finish scheduled risk runs (they may queue escalation messages and trend points), flush queued rows while
+    # the pool is still open, then close keep-alive connections
+    await risk_evaluator.drain()
+    await risk_history.stop()
+    await outbox.drain()
+    await close_client()
 
 class ChatRequest(BaseModel):
     message: str
@@ -48,6 +85,15 @@ class TaskCreateRequest(BaseModel):
     title: str
     assigned_to: str
 
+class BulkTaskItem(BaseModel):
+    # Optional so one bad row is reported per row instead of rejecting the whole request
+    title: Optional[str] = None
+    assigned_to: Optional[str] = None
+    priority: Optional[str] = None
+
+class BulkTaskCreateRequest(BaseModel):
+    tasks: List[BulkTaskItem]
+
 
 # --- Dummy Response Helper ---
 
@@ -55,11 +101,41 @@ def ok():
     return {"status": "success", "message": "Endpoint working", "data": {}}
 
 
+def warming_response():
+    return JSONResponse(status_code=503, headers={"Retry-After": "5"}, content={
+        "status": "warming",
+        "message": "NLP models are still loading. Retry shortly.",
+        "data": get_load_status()
+    })
+
+
+def busy_response():
+    """Backpressure: the inference queue is full, so shed load instead of letting latency grow."""
+    return JSONResponse(status_code=503, headers={"Retry-After": NLP_BUSY_RETRY_AFTER_SECONDS}, content={
+        "status": "busy",
+        "message": "NLP inference queue is full. Retry shortly.",
+        "data": {"batcher": get_nlp_stats()["batcher"]}
+    })
+
+
+async def nlp_ready() -> bool:
+    """Waits (off the event loop) up to NLP_CHAT_READY_WAIT_SECONDS for the models to finish loading."""
+    if is_ready():
+        return True
+    return await asyncio.to_thread(wait_until_ready, NLP_CHAT_READY_WAIT_SECONDS)
+
+
+async def latest_risk(shift_id: str) -> dict:
+    """Latest evaluated score; before this process has evaluated the shift, its live shifts row."""
+    row = None if risk_evaluator.knows(shift_id) else await get_shift_risk(shift_id)
+    return risk_evaluator.latest(shift_id, row)
+
+
 # --- Endpoints ---
 
 @app.get("/health")
-def health():
-    if check_db_connection():
+async def health():
+    if await check_db_connection():
         return {
             "status": "success",
             "backend": "running",
@@ -73,8 +149,57 @@ def health():
         }
 
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once NLP models are loaded, 503 while warming (with per-model load timings)."""
+    load_status = get_load_status()
+    if load_status["state"] == "ready":
+        return {"status": "success", "message": "Ready", "data": load_status}
+    return JSONResponse(status_code=503, content={
+        "status": "warming" if load_status["state"] == "loading" else "error",
+        "message": "NLP models are not ready",
+        "data": load_status
+    })
+
+
+@app.get("/nlp/stats")
+def nlp_stats():
+    """Micro-batcher throughput/latency counters and rule-tier hit rates for tuning the NLP path."""
+    return {
+        "status": "success",
+        "message": "NLP stats",
+        "data": get_nlp_stats()
+    }
+
+
+@app.get("/db/stats")
+def db_stats():
+    """Cache counters (hits = Supabase round trips saved), pool, resilience (budget/hedging/breaker), outbox and risk metrics."""
+    return {
+        "status": "success",
+        "message": "DB stats",
+        "data": get_db_stats()
+    }
+
+
+@app.post("/nlp/classify")
+async def nlp_classify(body: ChatRequest):
+    """Dry-run of the NLP stage of /chat: returns the extracted signals, touches no DB state."""
+    if not await nlp_ready():
+        return warming_response()
+    try:
+        nlp_res = await process_message_async(body.message, user_id=None)
+    except InferenceQueueFull:
+        return busy_response()
+    return {
+        "status": "success",
+        "message": "Message classified",
+        "data": nlp_res
+    }
+
+
 @app.post("/chat")
-def chat(body: ChatRequest):
+async def chat(body: ChatRequest):
     """
     Phase 5: Single Chat Execution Pipeline
     Validates rules, triggers strict NLP extraction, mutates DB properly, then observes Risk constraints.
@@ -82,14 +207,28 @@ def chat(body: ChatRequest):
     user_id = "235b4451-e7f9-4dc6-9ffd-3bf8ce30ca9b" # Phase 1 Mock Auth
     
     # 1. Fetch active shift context
-    shift = get_active_shift()
+    shift = await get_active_shift()
     if not shift:
         raise HTTPException(status_code=400, detail="Cannot log. System has no active shift.")
     
     shift_id = shift.get("id")
 
-    # 2. Extract deterministic NLP Signals
-    nlp_res = process_message(body.message, user_id)
+    # 2. Extract deterministic NLP Signals (models may still be loading right after a restart)
+    if not await nlp_ready():
+        return warming_response()
+
+    # Compound messages ("T-1023 done, T-1102 waiting for lab report, @Riya ...") take the batched path
+    clauses = split_clauses(body.message)
+    try:
+        if len(clauses) > 1:
+            nlp_results = await process_clauses_async(clauses, user_id)
+        else:
+            nlp_res = await process_message_async(body.message, user_id)
+    except InferenceQueueFull:
+        return busy_response()
+    if len(clauses) > 1:
+        return await chat_compound(shift_id, nlp_results)
+
     if nlp_res.get("status") == "invalid":
          raise HTTPException(status_code=400, detail="Message too vague for operational logging.")
     
@@ -110,7 +249,7 @@ def chat(body: ChatRequest):
         if intent == "CREATE_TASK":
             if not entities.get("assigned_to"):
                 return {"status": "error", "message": "Failed determining assignee from chat."}
-            task, err, _ = create_task(entities["title"], entities["assigned_to"])
+            task, err, _ = await create_task(entities["title"], entities["assigned_to"])
             if err: raise Exception(err)
             action_summary = f"Generated Task {task['task_code']} for @{entities['assigned_to']}"
 
@@ -118,11 +257,8 @@ def chat(body: ChatRequest):
             task_code = entities.get("task_code")
             if not task_code: raise Exception("No valid task code recognized to complete.")
             
-            # Find DB ID via task_code (simplification for mock)
-            t_res = supabase.table("tasks").select("id").eq("task_code", task_code).execute()
-            if not t_res.data: raise Exception(f"Task {task_code} not found in active records.")
-            
-            _, err, _ = update_task_status(t_res.data[0]["id"], "DONE")
+            # Lookup + DONE guard + update in one round trip
+            _, err, _ = await transition_task_status_by_code(task_code, "DONE")
             if err: raise Exception(err)
             action_summary = f"Marked {task_code} as DONE."
             
@@ -130,32 +266,31 @@ def chat(body: ChatRequest):
              task_code = entities.get("task_code")
              if not task_code: raise Exception("No valid task code recognized to block.")
              
-             t_res = supabase.table("tasks").select("id").eq("task_code", task_code).execute()
-             if not t_res.data: raise Exception(f"Task {task_code} not found in active records.")
-             
-             _, err, _ = update_task_status(t_res.data[0]["id"], "BLOCKED")
+             transition, err, _ = await transition_task_status_by_code(task_code, "BLOCKED")
              if err: raise Exception(err)
              
              # Sub-action: Log Alert for Risk Agent observation matching exact schema
-             supabase.table("alerts").insert({
+             _, err = await create_alerts([{
                  "shift_id": shift_id,
-                 "task_id": t_res.data[0]["id"],
+                 "task_id": transition["task_id"],
                  "alert_type": "BLOCK",
                  "weight": 8,
                  "message": entities.get("block_reason", "Unspecified block action"),
                  "is_active": True
-             }).execute()
+             }])
+             if err: raise Exception(err)
              
              action_summary = f"Task {task_code} BLOCKED. Alert logged."
 
         elif intent == "ALERT":
-             supabase.table("alerts").insert({
+             _, err = await create_alerts([{
                  "shift_id": shift_id,
                  "alert_type": "EMERGENCY",
                  "weight": 10,
                  "message": entities.get("alert_message", "Emergency Alert Declared"),
                  "is_active": True
-             }).execute()
+             }])
+             if err: raise Exception(err)
              action_summary = "Critical Alert broadcast securely."
              
     except Exception as e:
@@ -163,8 +298,10 @@ def chat(body: ChatRequest):
         return {"status": "error", "message": f"Execution halted: {str(e)}"}
         
     # 5. Call Observer Agentic Risk Service
-    # (Only logs System Events on thresholds. Never closes)
-    risk_evaluation = evaluate_shift_risk(shift_id)
+    # (Only logs System Events on thresholds. Never closes) Runs in the background, debounced per shift;
+    # the response carries the latest known score.
+    risk_evaluator.notify(shift_id)
+    risk_evaluation = await latest_risk(shift_id)
 
     # 6. Structured Return matching existing Frontend stub expectations
     return {
@@ -179,62 +316,209 @@ def chat(body: ChatRequest):
     }
 
 
+async def chat_compound(shift_id: str, nlp_results: list):
+    """
+    Multi-command /chat: every clause is validated like a single message, then all DB mutations run
+    batched (one task insert, one status lookup + update per status, one alerts insert) and risk is
+    re-evaluated ONCE at the end. Each clause reports its own outcome.
+    """
+    outcomes = []
+    creates = []        # (outcome, entities)
+    status_updates = {} # task_code -> (new_status, outcome, entities); a later clause for the same code wins
+    alerts = []         # (row, outcome)
+    for res in nlp_results:
+        outcome = {"clause": res["clause"], "intent": res.get("intent"), "confidence": res.get("confidence")}
+        outcomes.append(outcome)
+
+        if res.get("status") == "invalid":
+            outcome.update(status="error", message="Message too vague for operational logging.")
+            continue
+        if res["confidence"] < 0.60:
+            outcome.update(status="error", message=f"NLP Confidence ({res['confidence']:.2f}) below safe threshold. Request human intervention.")
+            continue
+
+        intent = res["intent"]
+        entities = res["entities"]
+        if intent == "CREATE_TASK":
+            if not entities.get("assigned_to"):
+                outcome.update(status="error", message="Failed determining assignee from chat.")
+                continue
+            creates.append((outcome, entities))
+
+        elif intent in ("COMPLETE_TASK", "BLOCK_TASK"):
+            task_code = entities.get("task_code")
+            if not task_code:
+                verb = "complete" if intent == "COMPLETE_TASK" else "block"
+                outcome.update(status="error", message=f"No valid task code recognized to {verb}.")
+                continue
+            new_status = "DONE" if intent == "COMPLETE_TASK" else "BLOCKED"
+            if task_code in status_updates:
+                earlier = status_updates[task_code][1]
+                earlier.update(status="error", message=f"Superseded by a later command for {task_code}.")
+            status_updates[task_code] = (new_status, outcome, entities)
+
+        elif intent == "ALERT":
+            alerts.append(({
+                "shift_id": shift_id,
+                "alert_type": "EMERGENCY",
+                "weight": 10,
+                "message": entities.get("alert_message", "Emergency Alert Declared"),
+                "is_active": True
+            }, outcome))
+            outcome.update(status="success", message="Critical Alert broadcast securely.")
+
+        else:
+            outcome.update(status="success", message="Processed message.")
+
+    # Batched DB mutations
+    if creates:
+        tasks, err, _ = await create_tasks([{"title": e["title"], "assigned_to": e["assigned_to"]} for _, e in creates])
+        for i, (outcome, entities) in enumerate(creates):
+            if err:
+                outcome.update(status="error", message=f"Execution halted: {err}")
+            else:
+                outcome.update(status="success", message=f"Generated Task {tasks[i]['task_code']} for @{entities['assigned_to']}")
+
+    if status_updates:
+        results, err = await update_task_statuses_by_code({code: u[0] for code, u in status_updates.items()})
+        for code, (new_status, outcome, entities) in status_updates.items():
+            result = (results or {}).get(code) or {"error": err or "Internal server error"}
+            if "error" in result:
+                outcome.update(status="error", message=f"Execution halted: {result['error']}")
+            elif new_status == "DONE":
+                outcome.update(status="success", message=f"Marked {code} as DONE.")
+            else:
+                alerts.append(({
+                    "shift_id": shift_id,
+                    "task_id": result["task_id"],
+                    "alert_type": "BLOCK",
+                    "weight": 8,
+                    "message": entities.get("block_reason", "Unspecified block action"),
+                    "is_active": True
+                }, outcome))
+                outcome.update(status="success", message=f"Task {code} BLOCKED. Alert logged.")
+
+    if alerts:
+        _, err = await create_alerts([row for row, _ in alerts])
+        if err:
+            print("Pipeline DB Mutation error", err)
+            for _, outcome in alerts:
+                outcome.update(status="error", message=f"Execution halted: {err}")
+
+    # Risk observed once for the whole message (background, debounced)
+    risk_evaluator.notify(shift_id)
+    risk_evaluation = await latest_risk(shift_id)
+
+    succeeded = [o for o in outcomes if o.get("status") == "success"]
+    return {
+        "status": "success" if succeeded else "error",
+        "message": " ".join(o.get("message", "") for o in outcomes),
+        "data": {
+            "intent": "MULTI",
+            "clauses": outcomes,
+            "system_risk_update": risk_evaluation
+        }
+    }
+
+
 @app.get("/shift/tasks")
-def shift_tasks():
-    shift = get_active_shift()
+async def shift_tasks(limit: Optional[int] = None, cursor: Optional[str] = None,
+                      status: Optional[str] = None, priority: Optional[str] = None):
+    """
+    One page of the active shift's tasks, ordered by priority then created_at in the database.
+    Pass `next_cursor` back as `cursor` for the next page; status/priority accept comma-separated values.
+    """
+    shift = await get_active_shift()
     if not shift:
         return {
             "status": "error",
             "message": "No active shift found"
         }
-    
-    tasks = get_shift_tasks(shift.get("id"))
-    if tasks is None:
+
+    statuses = [v.strip().upper() for v in status.split(",") if v.strip()] if status else None
+    priorities = [v.strip().upper() for v in priority.split(",") if v.strip()] if priority else None
+    try:
+        page = await get_shift_tasks(shift.get("id"), limit=limit, cursor=cursor, statuses=statuses, priorities=priorities)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
         return {
             "status": "error",
             "message": "Failed to fetch tasks"
         }
-        
-    mapped_tasks = []
-    for t in tasks:
-        mapped_tasks.append({
-            "task_id": t.get("id"),
-            "task_code": t.get("task_code"),
-            "title": t.get("title"),
-            "status": t.get("status"),
-            "priority": t.get("priority"),
-            "assigned_to": t.get("assigned_to"),
-            "created_at": t.get("created_at")
-        })
-        
+
+    # Rows are already projected to the response shape by the query
     return {
         "status": "success",
         "message": "Tasks fetched",
-        "data": mapped_tasks
+        "data": page["tasks"],
+        "pagination": {
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"]
+        }
     }
 
 
 @app.get("/shift/status")
-def shift_status():
-    shift = get_active_shift()
+async def shift_status():
+    shift = await get_active_shift()
     if not shift:
         return {
             "status": "error",
             "message": "No active shift found"
         }
     
+    # The cached shift row carries identity only; risk changes under it
+    risk = await get_shift_risk(shift.get("id")) or {}
     return {
         "status": "success",
         "message": "Active shift fetched",
         "data": {
             "shift_id": shift.get("id"),
             "shift_name": shift.get("shift_name"),
-            "risk_score": shift.get("risk_score"),
-            "is_high_risk": shift.get("is_high_risk")
+            "risk_score": risk.get("risk_score"),
+            "is_high_risk": risk.get("is_high_risk")
         }
     }
 
 
+@app.get("/shift/risk/history")
+async def shift_risk_history(shift_id: Optional[str] = None, window_seconds: Optional[float] = None,
+                             bucket_seconds: Optional[float] = None, max_points: int = 120, agg: str = "max"):
+    """
+    Risk trend for a shift (default: the active one) from the in-memory ring, no task/alert scan.
+    Downsampled to at most `max_points` buckets (or fixed `bucket_seconds`); agg is max, mean or last.
+    The first request for a ring merges in the stored points older than its oldest entry (one indexed read).
+    Rings are per worker process: under serve.py, points recorded by other workers since that backfill are
+    not included until they are backfilled into a fresh ring (restart / eviction).
+    """
+    if not shift_id:
+        shift = await get_active_shift()
+        if not shift:
+            return {
+                "status": "error",
+                "message": "No active shift found"
+            }
+        shift_id = shift.get("id")
+
+    if not risk_history.backfilled(shift_id):
+        rows = await get_shift_risk_history(shift_id, before=risk_history.oldest(shift_id))
+        if rows is not None:  # retried on the next request after a DB error
+            risk_history.backfill(shift_id, rows)
+
+    try:
+        history = risk_history.query(shift_id, window_seconds=window_seconds, bucket_seconds=bucket_seconds,
+                                     max_points=max_points, agg=agg.lower())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "status": "success",
+        "message": "Risk history fetched",
+        "data": history
+    }
+
+
 @app.patch("/task/{task_id}/priority")
 def update_priority(task_id: int, body: PriorityOverrideRequest):
     return ok()
@@ -242,8 +526,8 @@ def update_priority(task_id: int, body: PriorityOverrideRequest):
 from fastapi import HTTPException
 
 @app.patch("/task/{task_id}/status")
-def change_task_status(task_id: str, body: TaskStatusRequest):
-    data, err, code = update_task_status(task_id, body.status)
+async def change_task_status(task_id: str, body: TaskStatusRequest):
+    data, err, code = await update_task_status(task_id, body.status)
     if err:
         if code == 404:
             raise HTTPException(status_code=404, detail=err)
@@ -262,8 +546,8 @@ def change_task_status(task_id: str, body: TaskStatusRequest):
 
 
 @app.post("/task/create")
-def create_new_task(body: TaskCreateRequest):
-    task, err, code = create_task(body.title, body.assigned_to)
+async def create_new_task(body: TaskCreateRequest):
+    task, err, code = await create_task(body.title, body.assigned_to)
     if err:
         if code == 400:
             raise HTTPException(status_code=400, detail=err)
@@ -286,25 +570,71 @@ def create_new_task(body: TaskCreateRequest):
     }
 
 
+@app.post("/task/bulk")
+async def create_tasks_in_bulk(body: BulkTaskCreateRequest):
+    """
+    Shift-start bulk load: one active-shift lookup, chunked multi-row inserts, per-row errors,
+    and ONE (background) risk re-evaluation for the whole batch.
+    """
+    if not body.tasks:
+        raise HTTPException(status_code=400, detail="No tasks supplied.")
+    if len(body.tasks) > TASK_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many tasks ({len(body.tasks)} > {TASK_BULK_MAX_ITEMS}).")
+
+    result, err, code = await create_tasks_bulk([t.model_dump() for t in body.tasks])
+    if err:
+        if code == 400:
+            raise HTTPException(status_code=400, detail=err)
+        return {
+            "status": "error",
+            "message": err
+        }
+
+    created = result["created"]
+    risk_evaluation = None
+    if created:
+        risk_evaluator.notify(result["shift_id"])
+        risk_evaluation = await latest_risk(result["shift_id"])
+
+    return {
+        "status": "success" if not result["errors"] else ("partial" if created else "error"),
+        "message": f"Created {len(created)} of {len(body.tasks)} tasks",
+        "data": {
+            "created": [{
+                "index": index,
+                "task_id": task.get("id"),
+                "task_code": task.get("task_code"),
+                "title": task.get("title"),
+                "assigned_to": task.get("assigned_to"),
+                "shift_id": task.get("shift_id"),
+                "status": task.get("status", "TODO"),
+                "priority": task.get("priority", "MEDIUM")
+            } for index, task in created],
+            "errors": result["errors"],
+            "system_risk_update": risk_evaluation
+        }
+    }
+
+
 @app.post("/shift/end")
-def shift_end():
+async def shift_end():
     """
     Phase 6: Shift Endpoint Extension 
     Rotates shift logically, THEN traps Gemini summary generation implicitly.
     """
-    active_shift = get_active_shift()
+    active_shift = await get_active_shift()
     if not active_shift:
          return {"status": "error", "message": "No shift to end."}
          
     shift_id_closing = active_shift.get("id")
 
     # 1. Mutate active boundary 
-    data, err = end_active_shift()
+    data, err = await end_active_shift()
     if err:
         return {"status": "error", "message": err}
         
     # 2. Trigger Generative AI 
-    generate_shift_summary(shift_id_closing)
+    await generate_shift_summary(shift_id_closing)
 
     return {
         "status": "success",
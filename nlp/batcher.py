@@ -0,0 +1,221 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+
+# Threads do not survive fork(); live batchers restart their worker in the child (see serve.py)
+_live_batchers = weakref.WeakSet()
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when max_queue items are already waiting (backpressure)."""
+
+
+class MicroBatcher:
+    """
+    In-process dynamic micro-batching queue.
+    Collects concurrent single-item requests for up to `max_wait_ms` (or until `max_batch_size`
+    items are waiting), runs them through `handler` as ONE batch and hands each caller its own result.
+    `handler(list_of_items) -> list_of_results` must preserve order.
+    """
+
+    def __init__(self, handler, max_batch_size: int = 16, max_wait_ms: float = 5.0, name: str = "nlp-batcher",
+                 max_queue: int = 0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue  # 0 = unbounded
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Tuning counters (guarded by _stats_lock)
+        self._stats_lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._max_batch_seen = 0
+        self._queue_wait_total = 0.0
+        self._compute_total = 0.0
+        self._recent_latencies = deque(maxlen=1024)
+
+        self._start_worker()
+        _live_batchers.add(self)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._worker.start()
+
+    def _reinit_after_fork(self):
+        # Fresh primitives: the parent's worker thread (and anything it held) does not exist here
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._queue.clear()
+        self.reset_stats()
+        if not self._closed:
+            self._start_worker()
+
+    # --- Public API ---
+
+    def submit(self, item) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            full = self.max_queue and len(self._queue) >= self.max_queue
+            if not full:
+                self._queue.append((item, future, time.perf_counter()))
+                self._cond.notify()
+        if full:
+            # Counted after releasing _cond: the two locks are never held together
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(f"{self.name} queue full ({self.max_queue} waiting)")
+        return future
+
+    def process(self, item, timeout: float = None):
+        """Blocking helper: submit one item and wait for its own result."""
+        return self.submit(item).result(timeout=timeout)
+
+    async def process_async(self, item):
+        """Awaitable helper: the caller's event loop is never blocked and no thread is held while waiting."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout=timeout)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        depth = self.queue_depth()  # takes _cond; never while holding _stats_lock
+        with self._stats_lock:
+            elapsed = max(time.perf_counter() - self._started_at, 1e-9)
+            latencies = sorted(self._recent_latencies)
+            batches = self._batches or 1
+            items = self._items or 1
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "max_queue": self.max_queue,
+                "queue_depth": depth,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "avg_batch_size": round(self._items / batches, 2),
+                "max_batch_seen": self._max_batch_seen,
+                "throughput_per_sec": round(self._items / elapsed, 2),
+                "avg_queue_wait_ms": round(self._queue_wait_total / items * 1000, 3),
+                "avg_batch_compute_ms": round(self._compute_total / batches * 1000, 3),
+                "latency_p50_ms": _percentile_ms(latencies, 0.50),
+                "latency_p99_ms": _percentile_ms(latencies, 0.99),
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._started_at = time.perf_counter()
+            self._batches = self._items = self._errors = self._rejected = self._cancelled = self._max_batch_seen = 0
+            self._queue_wait_total = self._compute_total = 0.0
+            self._recent_latencies.clear()
+
+    # --- Worker ---
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            # First item arrived: keep the window open for max_wait_ms or until the batch is full
+            deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _claim(self, batch: list) -> list:
+        """Marks the batch's futures running; callers that already gave up (cancelled) are dropped."""
+        claimed = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if len(claimed) != len(batch):
+            with self._stats_lock:
+                self._cancelled += len(batch) - len(claimed)
+        return claimed
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            # From here on the futures can't be cancelled, so setting their results can't fail
+            batch = self._claim(batch)
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.handler(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch handler returned {len(results)} results for {len(items)} items")
+                failed = False
+            except Exception as e:
+                print("NLP BATCH ERROR:", e)
+                results = [e] * len(items)
+                failed = True
+            finished = time.perf_counter()
+
+            for (_, future, enqueued_at), result in zip(batch, results):
+                if failed:
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._errors += len(batch) if failed else 0
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._compute_total += finished - started
+                for _, _, enqueued_at in batch:
+                    self._queue_wait_total += started - enqueued_at
+                    self._recent_latencies.append(finished - enqueued_at)
+
+
+def _percentile_ms(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 3)
+
+
+def _reinit_batchers_after_fork():
+    for batcher in list(_live_batchers):
+        batcher._reinit_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reinit_batchers_after_fork)
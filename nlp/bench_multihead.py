@@ -0,0 +1,95 @@
+"""
+Benchmark: two DistilBERT pipelines vs. the shared-encoder multi-head model.
+Each mode runs in a fresh subprocess so RSS numbers are not polluted by the other model.
+Rule tier and result cache are disabled so every message pays for the model.
+
+Usage (from repo root, after train_multihead.py):
+    python nlp/bench_multihead.py [--rounds 3]
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = {"two_pipelines": "0", "multihead": "1"}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_worker(rounds: int):
+    # Both CREATE_TASK and ALERT rows need intent AND priority, which is where the shared encoder pays off
+    with open(os.path.join(BASE_DIR, "full_dataset.csv"), newline="", encoding="utf-8") as f:
+        texts = [r["text"] for r in csv.DictReader(f) if r["label"] in ("CREATE_TASK", "ALERT")]
+
+    started = time.perf_counter()
+    from engine import nlp_engine_instance
+    nlp_engine_instance.load()
+    load_seconds = time.perf_counter() - started
+
+    nlp_engine_instance.process_message(texts[0])  # warmup
+    latencies = []
+    for _ in range(rounds):
+        for text in texts:
+            t0 = time.perf_counter()
+            nlp_engine_instance.process_message(text)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+
+    print(json.dumps({
+        "multihead": nlp_engine_instance.multihead,
+        "messages": len(latencies),
+        "load_seconds": round(load_seconds, 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.rounds)
+        return
+
+    results = {}
+    for mode, flag in MODES.items():
+        env = dict(os.environ, NLP_MULTIHEAD=flag, NLP_RULES_ENABLED="0", NLP_CACHE_MAX_SIZE="0")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--rounds", str(args.rounds)],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(proc.stderr)
+            sys.exit(f"{mode} benchmark failed")
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"\n{'mode':<16}{'p50 ms':>10}{'p99 ms':>10}{'peak RSS MB':>14}{'load s':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<16}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['peak_rss_mb']:>14}{r['load_seconds']:>10}")
+
+    two, multi = results["two_pipelines"], results["multihead"]
+    print(f"\np50 speedup: {two['p50_ms'] / multi['p50_ms']:.2f}x  "
+          f"p99 speedup: {two['p99_ms'] / multi['p99_ms']:.2f}x  "
+          f"RSS saved: {two['peak_rss_mb'] - multi['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
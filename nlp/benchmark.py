@@ -0,0 +1,205 @@
+"""
+NLP latency / throughput benchmark suite with regression gates.
+Replays nlp/full_dataset.csv + nlp/priority_dataset.csv through the engine and records:
+  - cold start (model load + warmup) in this fresh process
+  - batched runs (process_messages) at several batch sizes
+  - concurrent runs (process_message via the micro-batcher) at several concurrency levels
+  - p50/p95/p99 latency, throughput, peak RSS
+A machine-readable report is written to --report. If a baseline exists, any metric that regresses
+past the tolerance fails the run (exit code 1).
+
+Usage (from repo root):
+    python nlp/benchmark.py                                  # run + compare against nlp/benchmark_baseline.json
+    python nlp/benchmark.py --save-baseline                  # record a new baseline on the reference box
+    python nlp/benchmark.py --batch-sizes 1 8 32 --concurrency 1 4 16 --tolerance 0.15
+
+The result cache is disabled unless --with-cache is passed, so repeated rows measure the model, not the cache.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BASE_DIR, "benchmark_baseline.json")
+DEFAULT_REPORT = os.path.join(BASE_DIR, "benchmark_report.json")
+
+# metric -> True if higher is better
+GATED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "throughput_per_sec": True,
+}
+
+
+def load_texts() -> list:
+    texts = []
+    for name in ("full_dataset.csv", "priority_dataset.csv"):
+        with open(os.path.join(BASE_DIR, name), newline="", encoding="utf-8") as f:
+            texts.extend(row["text"] for row in csv.DictReader(f))
+    return texts
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def summarize(latencies_ms: list, messages: int, wall_seconds: float) -> dict:
+    ordered = sorted(latencies_ms)
+
+    def pct(q):
+        return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+
+    return {
+        "messages": messages,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "throughput_per_sec": round(messages / wall_seconds, 2),
+    }
+
+
+def bench_batched(engine, texts: list, batch_size: int, rounds: int) -> dict:
+    """Latency per message = latency of the batch it rode in."""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            t0 = time.perf_counter()
+            engine.process_messages(batch)
+            elapsed = (time.perf_counter() - t0) * 1000
+            latencies.extend([elapsed] * len(batch))
+    return summarize(latencies, len(texts) * rounds, time.perf_counter() - started)
+
+
+def bench_concurrent(process_message, texts: list, concurrency: int, rounds: int) -> dict:
+    """Each worker thread sends single messages, like concurrent /chat requests hitting the micro-batcher."""
+    work = texts * rounds
+
+    def call(text):
+        t0 = time.perf_counter()
+        process_message(text, None)
+        return (time.perf_counter() - t0) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, work))
+    return summarize(latencies, len(work), time.perf_counter() - started)
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+
+    def check(name, current, previous, higher_is_better):
+        if previous in (None, 0) or current is None:
+            return
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {previous} -> {current} ({change:+.1%})")
+
+    check("cold_start_seconds", report["cold_start_seconds"], baseline.get("cold_start_seconds"), False)
+    check("peak_rss_mb", report["peak_rss_mb"], baseline.get("peak_rss_mb"), False)
+    for scenario, metrics in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        for metric, higher_is_better in GATED_METRICS.items():
+            check(f"{scenario}.{metric}", metrics.get(metric), previous.get(metric), higher_is_better)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--report", default=DEFAULT_REPORT)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the result cache enabled")
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ["NLP_CACHE_MAX_SIZE"] = "0"  # read by engine at import time
+
+    import torch
+    import transformers
+
+    started = time.perf_counter()
+    import engine
+    engine.nlp_engine_instance.load()
+    cold_start = time.perf_counter() - started
+    if not engine.nlp_engine_instance.is_ready():
+        sys.exit(f"NLP load failed: {engine.nlp_engine_instance.load_error}")
+
+    texts = load_texts()
+    scenarios = {}
+    for batch_size in args.batch_sizes:
+        scenarios[f"batch_{batch_size}"] = bench_batched(engine.nlp_engine_instance, texts, batch_size, args.rounds)
+        print(f"batch_{batch_size}: {scenarios[f'batch_{batch_size}']}")
+    for concurrency in args.concurrency:
+        engine.nlp_batcher.reset_stats()
+        result = bench_concurrent(engine.process_message, texts, concurrency, args.rounds)
+        result["avg_batch_size"] = engine.nlp_batcher.stats()["avg_batch_size"]
+        scenarios[f"concurrency_{concurrency}"] = result
+        print(f"concurrency_{concurrency}: {result}")
+
+    load_status = engine.get_load_status()
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "backend": load_status["backend"],
+            "multihead": load_status["multihead"],
+            "cpu_count": os.cpu_count(),
+            "cache_enabled": args.with_cache,
+        },
+        "dataset_rows": len(texts),
+        "cold_start_seconds": round(cold_start, 3),
+        "model_load_seconds": load_status["model_load_seconds"],
+        "peak_rss_mb": peak_rss_mb(),
+        "scenarios": scenarios,
+    }
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; skipping regression gate. Run with --save-baseline on the reference machine.")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("environment") != report["environment"]:
+        print(f"NOTE: environment differs from baseline: {baseline.get('environment')}")
+
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} metric(s) regressed more than {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Streaming bulk classifier for offline message backfills.
+Reads an arbitrarily large CSV or JSONL export in chunks, classifies each chunk with
+MediStreamNLP.process_messages (optionally across a process pool) and appends JSONL results as it goes.
+Memory stays flat: at most `--workers * 2` chunks are in flight at any time.
+
+Resuming: progress (rows done + output byte offset) is checkpointed to `<output>.progress` after every
+chunk. Re-running the same command continues where it stopped; a half-written tail is truncated first.
+If the output is missing or shorter than the checkpoint says, it refuses to resume (use --restart).
+
+Usage (from repo root):
+    python nlp/bulk_classify.py messages.csv results.jsonl [--text-column text] [--chunk-size 512] [--workers 4]
+    python nlp/bulk_classify.py messages.jsonl results.jsonl --text-column message_text
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_worker_engine = None
+
+
+def read_rows(path: str, text_column: str):
+    """Yields (row_number, text, source_row) lazily; never materializes the file."""
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for row_number, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                yield row_number, row.get(text_column) or "", row
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row_number, row in enumerate(csv.DictReader(f)):
+                yield row_number, row.get(text_column) or "", row
+
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(torch_threads: int):
+    global _worker_engine
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    from engine import MediStreamNLP
+    _worker_engine = MediStreamNLP()
+
+
+def classify_chunk(chunk: list) -> list:
+    results = _worker_engine.process_messages([text for _, text, _ in chunk])
+    return [
+        {"row": row_number, "text": text, **result}
+        for (row_number, text, _), result in zip(chunk, results)
+    ]
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"rows_done": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, rows_done: int, output_bytes: int):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"rows_done": rows_done, "output_bytes": output_bytes}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def run(args):
+    checkpoint_path = args.output + ".progress"
+    checkpoint = load_checkpoint(checkpoint_path) if not args.restart else {"rows_done": 0, "output_bytes": 0}
+    rows_done = checkpoint["rows_done"]
+
+    if rows_done:
+        # truncate() would pad a deleted or shortened output with NUL bytes and resume after rows that are gone
+        size = os.path.getsize(args.output) if os.path.exists(args.output) else None
+        if size is None or size < checkpoint["output_bytes"]:
+            found = "missing" if size is None else f"only {size} bytes"
+            sys.exit(f"{args.output} is {found} but {checkpoint_path} expects {checkpoint['output_bytes']} bytes "
+                     f"after {rows_done} rows. Refusing to resume; re-run with --restart.")
+
+    # Drop anything written after the last checkpoint (interrupted mid-chunk)
+    mode = "r+b" if os.path.exists(args.output) and rows_done else "wb"
+    out = open(args.output, mode)
+    out.truncate(checkpoint["output_bytes"])
+    out.seek(checkpoint["output_bytes"])
+
+    if rows_done:
+        print(f"Resuming after {rows_done} rows.")
+
+    rows = itertools.islice(read_rows(args.input, args.text_column), rows_done, None)
+    chunks = chunked(rows, args.chunk_size)
+
+    cores = os.cpu_count() or 1
+    torch_threads = max(1, cores // args.workers) if args.workers > 1 else 0
+
+    if args.workers <= 1:
+        _init_worker(0)  # load before the clock starts so rows/sec reflects classification only
+
+    started = time.perf_counter()
+    last_report = started
+    processed = 0
+
+    def write(results):
+        nonlocal rows_done, processed, last_report
+        for record in results:
+            out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        out.flush()
+        os.fsync(out.fileno())
+        rows_done += len(results)
+        processed += len(results)
+        save_checkpoint(checkpoint_path, rows_done, out.tell())
+
+        now = time.perf_counter()
+        if now - last_report >= args.report_every:
+            print(f"{rows_done} rows done | {processed / (now - started):.1f} rows/sec")
+            last_report = now
+
+    try:
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                     initargs=(torch_threads,)) as pool:
+                # Bounded in-flight window keeps memory flat and results in input order
+                in_flight = deque()
+                for chunk in chunks:
+                    in_flight.append(pool.submit(classify_chunk, chunk))
+                    if len(in_flight) >= args.workers * 2:
+                        write(in_flight.popleft().result())
+                while in_flight:
+                    write(in_flight.popleft().result())
+        else:
+            for chunk in chunks:
+                write(classify_chunk(chunk))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {rows_done} rows. Re-run the same command to resume.")
+        sys.exit(130)
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {rows_done} rows total, {processed} this run in {elapsed:.1f}s "
+          f"({processed / max(elapsed, 1e-9):.1f} rows/sec). Output: {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL (.jsonl/.ndjson) export")
+    parser.add_argument("output", help="JSONL results file (appended incrementally)")
+    parser.add_argument("--text-column", default="text", help="CSV column / JSON field holding the message")
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=1, help="Process pool size (1 = in-process)")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between rows/sec reports")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
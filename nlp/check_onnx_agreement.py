@@ -0,0 +1,80 @@
+"""
+Agreement check: ONNX (int8 by default) vs PyTorch pipelines on the labelled datasets.
+Exits non-zero if label agreement drops below --min-agreement, so it can gate a deploy.
+
+Usage (from repo root):
+    python nlp/check_onnx_agreement.py [--fp32] [--min-agreement 0.99]
+"""
+import argparse
+import csv
+import os
+import sys
+
+from transformers import pipeline
+from onnx_backend import OnnxTextClassifier, ONNX_DIR
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHECKS = [
+    ("intent_distilbert", "full_dataset.csv"),
+    ("priority_distilbert", "priority_dataset.csv"),
+]
+
+
+def load_texts(csv_name: str) -> list:
+    with open(os.path.join(BASE_DIR, csv_name), newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+
+def compare(model_name: str, csv_name: str, quantized: bool) -> dict:
+    texts = load_texts(csv_name)
+    model_path = os.path.join(BASE_DIR, model_name)
+
+    torch_clf = pipeline("text-classification", model=model_path, tokenizer=model_path)
+    onnx_clf = OnnxTextClassifier(os.path.join(ONNX_DIR, model_name), quantized=quantized)
+
+    torch_out = torch_clf(texts, batch_size=32)
+    onnx_out = onnx_clf(texts, batch_size=32)
+
+    mismatches = []
+    max_score_diff = 0.0
+    for text, t, o in zip(texts, torch_out, onnx_out):
+        max_score_diff = max(max_score_diff, abs(t["score"] - o["score"]))
+        if t["label"] != o["label"]:
+            mismatches.append((text, t["label"], o["label"]))
+
+    return {
+        "model": model_name,
+        "dataset": csv_name,
+        "rows": len(texts),
+        "agreement": 1 - len(mismatches) / max(len(texts), 1),
+        "max_score_diff": max_score_diff,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fp32", action="store_true", help="Compare the non-quantized ONNX export instead of int8")
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    failed = False
+    for model_name, csv_name in CHECKS:
+        report = compare(model_name, csv_name, quantized=not args.fp32)
+        print(f"\n{report['model']} on {report['dataset']} ({report['rows']} rows)")
+        print(f"  Label agreement: {report['agreement']:.2%}")
+        print(f"  Max |score diff|: {report['max_score_diff']:.4f}")
+        for text, torch_label, onnx_label in report["mismatches"]:
+            print(f"  MISMATCH: '{text}' torch={torch_label} onnx={onnx_label}")
+        if report["agreement"] < args.min_agreement:
+            failed = True
+
+    if failed:
+        print(f"\nFAILED: agreement below {args.min_agreement:.2%}")
+        sys.exit(1)
+    print("\nONNX backend agrees with PyTorch.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Strict-mode verification of the rule tier.
+Runs every row of full_dataset.csv through the rule tier AND the intent model, and fails if any
+rule hit disagrees with the model (or with the dataset label).
+
+Usage (from repo root):
+    python nlp/check_rules.py
+"""
+import csv
+import os
+import re
+import sys
+
+from transformers import pipeline
+from rules import RuleTier
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def clean_text(text: str) -> str:
+    # Mirrors MediStreamNLP._clean_text so rules see exactly what production sees
+    return re.sub(r'@[a-zA-Z0-9_]+', '', text).strip()
+
+
+def main():
+    with open(os.path.join(BASE_DIR, "full_dataset.csv"), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    model_path = os.path.join(BASE_DIR, "intent_distilbert")
+    intent_pipeline = pipeline("text-classification", model=model_path, tokenizer=model_path)
+
+    tier = RuleTier()
+    cleaned = [clean_text(row["text"]) for row in rows]
+    model_out = intent_pipeline(cleaned, batch_size=32)
+
+    model_disagreements = []
+    label_disagreements = []
+    for row, text, res in zip(rows, cleaned, model_out):
+        rule = tier.match(text)
+        if not rule:
+            continue
+        if rule.intent != res["label"]:
+            tier.record_disagreement(rule)
+            model_disagreements.append((rule.name, text, rule.intent, res["label"]))
+        if rule.intent != row["label"]:
+            label_disagreements.append((rule.name, text, rule.intent, row["label"]))
+
+    stats = tier.stats()
+    print(f"Rows: {stats['checked']}  Rule hits: {stats['hits']} ({stats['hit_rate']:.1%})")
+    for name, rule_stats in stats["per_rule"].items():
+        print(f"  {name:<24} hits={rule_stats['hits']:<4} rate={rule_stats['hit_rate']:.1%}  model_disagreements={rule_stats['model_disagreements']}")
+
+    for name, text, rule_intent, model_intent in model_disagreements:
+        print(f"MODEL DISAGREEMENT [{name}] '{text}': rule={rule_intent} model={model_intent}")
+    for name, text, rule_intent, label in label_disagreements:
+        print(f"LABEL DISAGREEMENT [{name}] '{text}': rule={rule_intent} label={label}")
+
+    if model_disagreements or label_disagreements:
+        print("\nFAILED: rule tier is not safe to serve.")
+        sys.exit(1)
+    print("\nRule tier never disagrees with the model or the labels.")
+
+
+if __name__ == "__main__":
+    main()
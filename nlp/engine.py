@@ -1,7 +1,53 @@
+import asyncio
 import os
 import re
+import threading
+import time
 from transformers import pipeline
 
+try:
+    from nlp.batcher import MicroBatcher, QueueFullError
+    from nlp.rules import RuleTier
+    from nlp.cache import ResultCache
+    from nlp.tokenization import TokenBatcher, PipelineEncodedClassifier, same_tokenizer
+except ImportError:  # executed from inside nlp/ (e.g. test_engine.py)
+    from batcher import MicroBatcher, QueueFullError
+    from rules import RuleTier
+    from cache import ResultCache
+    from tokenization import TokenBatcher, PipelineEncodedClassifier, same_tokenizer
+
+PRIORITY_INTENTS = ("CREATE_TASK", "ALERT")
+
+# Micro-batching knobs (tune via env, see /nlp/stats)
+NLP_BATCH_MAX_SIZE = int(os.getenv("NLP_BATCH_MAX_SIZE", "16"))
+NLP_BATCH_MAX_WAIT_MS = float(os.getenv("NLP_BATCH_MAX_WAIT_MS", "5"))
+# Backpressure: messages allowed to wait for the inference thread before /chat answers "busy" (0 = unbounded)
+NLP_INFERENCE_MAX_QUEUE = int(os.getenv("NLP_INFERENCE_MAX_QUEUE", "256"))
+
+# Inference backend: "torch" (HF pipelines) or "onnx" (int8 ONNX Runtime, see export_onnx.py)
+NLP_BACKEND = os.getenv("NLP_BACKEND", "torch").lower()
+NLP_ONNX_QUANTIZED = os.getenv("NLP_ONNX_QUANTIZED", "1") != "0"
+
+# Shared-encoder model: "auto" uses nlp/multihead_distilbert when present AND its stored held-out eval
+# (multihead_eval.json) meets or beats the single-head models on both heads, "1" requires it, "0" disables
+NLP_MULTIHEAD = os.getenv("NLP_MULTIHEAD", "auto").lower()
+MULTIHEAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "multihead_distilbert")
+
+# Regex fast path in front of the intent model (see rules.py / check_rules.py)
+NLP_RULES_ENABLED = os.getenv("NLP_RULES_ENABLED", "1") != "0"
+NLP_RULES_STRICT = os.getenv("NLP_RULES_STRICT", "0") == "1"
+
+# Classification result cache (0 disables, TTL 0 = no expiry)
+NLP_CACHE_MAX_SIZE = int(os.getenv("NLP_CACHE_MAX_SIZE", "2048"))
+NLP_CACHE_TTL_SECONDS = float(os.getenv("NLP_CACHE_TTL_SECONDS", "0"))
+
+# Tokenization policy: hard cap on sequence length, and length-bucketed forward batches
+NLP_MAX_SEQ_LEN = int(os.getenv("NLP_MAX_SEQ_LEN", "128"))
+NLP_LENGTH_BUCKETING = os.getenv("NLP_LENGTH_BUCKETING", "1") != "0"
+
+# "1" (default): models load in a background thread started by main.py's startup hook
+NLP_LAZY_LOAD = os.getenv("NLP_LAZY_LOAD", "1") != "0"
+
 class MediStreamNLP:
     """
     Phase 3: NLP Engine Integration (Singleton)
@@ -12,25 +58,225 @@ class MediStreamNLP:
     
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
-            cls._instance = super(MediStreamNLP, cls).__new__(cls, *args, **kwargs)
+            cls._instance = super(MediStreamNLP, cls).__new__(cls)
             cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, backend: str = None, lazy: bool = False):
         if self._initialized:
             return
             
-        print("Initializing Global NLP Singletons...")
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        intent_model_path = os.path.join(base_dir, "intent_distilbert")
-        priority_model_path = os.path.join(base_dir, "priority_distilbert")
-        
-        self.intent_pipeline = pipeline("text-classification", model=intent_model_path, tokenizer=intent_model_path)
-        self.priority_pipeline = pipeline("text-classification", model=priority_model_path, tokenizer=priority_model_path)
+        self.backend = (backend or NLP_BACKEND).lower()
+        if self.backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown NLP backend '{self.backend}'. Expected 'torch' or 'onnx'.")
+
+        self.intent_pipeline = None
+        self.priority_pipeline = None
+        self.intent_tokens = None
+        self.priority_tokens = None
+        self.shared_tokenizer = False
+        self.multihead = False
+        self.batch_size = NLP_BATCH_MAX_SIZE
+        self.rule_tier = RuleTier() if NLP_RULES_ENABLED else None
+        self.rules_strict = NLP_RULES_STRICT
+        self.result_cache = ResultCache(NLP_CACHE_MAX_SIZE, NLP_CACHE_TTL_SECONDS) if NLP_CACHE_MAX_SIZE > 0 else None
+        self._model_generation = 0
+
+        # Load lifecycle: idle -> loading -> ready | failed
+        self.state = "idle"
+        self.load_error = None
+        self.load_timings = {}
+        self.models_total = 0
+        self.models_loaded = 0
+        self._load_started_at = None
+        self._load_finished_at = None
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()     # set once models are usable
+        self._settled = threading.Event()   # set when the current load attempt finished (ok or failed)
         
         self._initialized = True
-        print("NLP Engine Ready.")
+        if not lazy:
+            self.load()
+
+    # --- Load lifecycle ---
+
+    def load(self):
+        """Synchronously loads both models (no-op if already loaded or loading elsewhere)."""
+        with self._load_lock:
+            if self.state in ("loading", "ready"):
+                start_thread = False
+            else:
+                self._begin_load()
+                start_thread = True
+        if start_thread:
+            self._load_worker()
+        else:
+            self._settled.wait()
+
+    def start_background_load(self):
+        """Kicks off model loading on a daemon thread so the server can bind immediately."""
+        with self._load_lock:
+            if self.state in ("loading", "ready"):
+                return
+            self._begin_load()
+        threading.Thread(target=self._load_worker, name="nlp-model-loader", daemon=True).start()
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        """True once models are loaded; False on timeout or if the load failed."""
+        if self.state == "idle":
+            return False
+        self._settled.wait(timeout)
+        return self._ready.is_set()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def ensure_loaded(self):
+        if self._ready.is_set():
+            return
+        if self.state in ("idle", "failed"):
+            self.load()
+        else:
+            self._settled.wait()
+        if self.state != "ready":
+            raise RuntimeError(f"NLP models failed to load: {self.load_error}")
+
+    def load_status(self) -> dict:
+        finished = self._load_finished_at or time.time()
+        return {
+            "state": self.state,
+            "backend": self.backend,
+            "multihead": self.multihead,
+            "models_loaded": self.models_loaded,
+            "models_total": self.models_total,
+            "model_load_seconds": dict(self.load_timings),
+            "elapsed_seconds": round(finished - self._load_started_at, 3) if self._load_started_at else 0.0,
+            "error": self.load_error,
+        }
+
+    def _begin_load(self):
+        # Caller holds _load_lock
+        self.state = "loading"
+        self.load_error = None
+        self._load_started_at = time.time()
+        self._load_finished_at = None
+        self._settled.clear()
+
+    def _load_worker(self):
+        print(f"Initializing Global NLP Singletons (backend={self.backend})...")
+        try:
+            self._install_models(*self._load_models())
+
+            # Warmup forward (first call allocates kernels / thread pools); skips rules and cache
+            started = time.perf_counter()
+            warmup = self.intent_tokens.encode(["Test warmup CREATE_TASK"])
+            self.intent_tokens.run(self._intent_model.classify_encoded, warmup)
+            self.priority_tokens.run(self._priority_model.classify_encoded, self.priority_tokens.encode(["Test warmup CREATE_TASK"]))
+            self.load_timings["warmup"] = round(time.perf_counter() - started, 3)
+
+            self.state = "ready"
+            self._ready.set()
+            print("NLP Engine Ready.")
+        except Exception as e:
+            self.state = "failed"
+            self.load_error = str(e)
+            print("NLP LOAD ERROR:", e)
+        finally:
+            self._load_finished_at = time.time()
+            self._settled.set()
+
+    def reload_models(self):
+        """Re-reads both models from disk (e.g. after retraining) and invalidates cached results."""
+        print(f"Reloading NLP models (backend={self.backend})...")
+        self._install_models(*self._load_models())
+        self._model_generation += 1
+        if self.result_cache:
+            self.result_cache.clear()
+        print("NLP models reloaded.")
+
+    def _install_models(self, intent_pipeline, priority_pipeline):
+        """Wires loaded models into the pre-tokenized path; one tokenization feeds both models when they share a vocab."""
+        intent_tokens = TokenBatcher(intent_pipeline.tokenizer, NLP_MAX_SEQ_LEN, self.batch_size, NLP_LENGTH_BUCKETING)
+        shared = same_tokenizer(intent_pipeline.tokenizer, priority_pipeline.tokenizer)
+        priority_tokens = intent_tokens if shared else TokenBatcher(
+            priority_pipeline.tokenizer, NLP_MAX_SEQ_LEN, self.batch_size, NLP_LENGTH_BUCKETING)
+
+        self.intent_pipeline = intent_pipeline
+        self.priority_pipeline = priority_pipeline
+        self._intent_model = self._as_encoded(intent_pipeline)
+        self._priority_model = self._as_encoded(priority_pipeline)
+        self.intent_tokens = intent_tokens
+        self.priority_tokens = priority_tokens
+        self.shared_tokenizer = shared
+
+    @staticmethod
+    def _as_encoded(classifier):
+        return classifier if hasattr(classifier, "classify_encoded") else PipelineEncodedClassifier(classifier)
+
+    def _encode_missing(self, encodings: dict, indices: list, cleaned: dict):
+        # Each text is tokenized at most once per call, shared by the intent and priority passes
+        todo = [i for i in indices if i not in encodings]
+        if todo:
+            for i, ids in zip(todo, self.intent_tokens.encode([cleaned[i] for i in todo])):
+                encodings[i] = ids
+
+    def _load_models(self):
+        """
+        Returns (intent_pipeline, priority_pipeline).
+        If a trained shared-encoder model exists (train_multihead.py) it backs BOTH, so one forward yields both heads.
+        In "auto" mode only when its stored eval is at least as accurate as the single-head models.
+        """
+        self.multihead = False
+        self.models_loaded = 0
+        use_multihead = self.backend == "torch" and NLP_MULTIHEAD != "0" and os.path.isdir(MULTIHEAD_DIR)
+        if use_multihead:
+            try:
+                from nlp.multihead import MultiHeadClassifier, eval_shortfall
+            except ImportError:
+                from multihead import MultiHeadClassifier, eval_shortfall
+            shortfall = eval_shortfall(MULTIHEAD_DIR) if NLP_MULTIHEAD == "auto" else None
+            if shortfall:
+                print(f"Not using the multi-head model: {shortfall}. Loading the single-head models.")
+                use_multihead = False
+
+        if use_multihead:
+            self.models_total = 1
+            classifier = self._timed_load("multihead_distilbert", lambda: MultiHeadClassifier(MULTIHEAD_DIR))
+            self.multihead = True
+            print("Loaded shared-encoder multi-head model.")
+            return classifier, classifier.priority_view()
+
+        if NLP_MULTIHEAD == "1":
+            raise FileNotFoundError(f"NLP_MULTIHEAD=1 but {MULTIHEAD_DIR} is missing (torch backend only).")
+
+        self.models_total = 2
+        intent = self._timed_load("intent_distilbert", lambda: self._load_classifier("intent_distilbert"))
+        priority = self._timed_load("priority_distilbert", lambda: self._load_classifier("priority_distilbert"))
+        return intent, priority
+
+    def _timed_load(self, model_name: str, loader):
+        started = time.perf_counter()
+        model = loader()
+        self.load_timings[model_name] = round(time.perf_counter() - started, 3)
+        self.models_loaded += 1
+        print(f"Loaded {model_name} in {self.load_timings[model_name]:.2f}s")
+        return model
+
+    def _load_classifier(self, model_name: str):
+        """Both backends return a callable with the HF pipeline contract: list[str] -> list[{label, score}]"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+
+        if self.backend == "onnx":
+            try:
+                from nlp.onnx_backend import OnnxTextClassifier, ONNX_DIR
+            except ImportError:
+                from onnx_backend import OnnxTextClassifier, ONNX_DIR
+            return OnnxTextClassifier(os.path.join(ONNX_DIR, model_name), quantized=NLP_ONNX_QUANTIZED)
+
+        model_path = os.path.join(base_dir, model_name)
+        # safetensors weights are memory-mapped; low_cpu_mem_usage skips the extra random-init copy
+        return pipeline("text-classification", model=model_path, tokenizer=model_path,
+                        model_kwargs={"low_cpu_mem_usage": True})
 
     def extract_mentions(self, text: str) -> str:
         mentions = re.findall(r'@\w+', text)
@@ -43,39 +289,108 @@ class MediStreamNLP:
     def _clean_text(self, text: str) -> str:
         return re.sub(r'@[a-zA-Z0-9_]+', '', text).strip()
 
-    def process_message(self, text: str, user_id: str) -> dict:
+    def process_message(self, text: str, user_id: str = None) -> dict:
         """
         Extracts structural signals and guarantees output contract structure.
         Phase 3: NO GENAI. NO DB CALLS.
         """
-        if not text or len(text.strip()) < 3:
-            return {"status": "invalid", "message": "Text too short"}
+        return self.process_messages([text], user_id)[0]
 
-        cleaned = self._clean_text(text)
-        
-        # Identify Intent via Local BERT
-        intent_res = self.intent_pipeline(cleaned)[0]
-        intent = intent_res['label']
-        confidence = intent_res['score']
-        
-        priority = None
+    def process_messages(self, texts: list, user_id: str = None) -> list:
+        """
+        Batched variant of process_message. Runs each pipeline ONCE over the whole list
+        (padded tensor batch) and returns one contract dict per input, in input order.
+        """
+        self.ensure_loaded()
+
+        results = [None] * len(texts)
+        valid = []
+        for i, text in enumerate(texts):
+            if not text or len(text.strip()) < 3:
+                results[i] = {"status": "invalid", "message": "Text too short"}
+            else:
+                valid.append(i)
+
+        if not valid:
+            return results
+
+        cleaned = {i: self._clean_text(texts[i]) for i in valid}
+
+        # Repeat phrases are served from the result cache; entities are still re-extracted from raw text
+        classified = {}
+        generation = self._model_generation
+        if self.result_cache:
+            for i in valid:
+                cached = self.result_cache.get(cleaned[i])
+                if cached:
+                    classified[i] = cached
+        pending = [i for i in valid if i not in classified]
+
+        # Deterministic rule tier first: unambiguous shapes skip the transformer entirely
+        intents = {}
+        rule_hits = {}
+        if self.rule_tier:
+            for i in pending:
+                rule = self.rule_tier.match(cleaned[i])
+                if rule:
+                    rule_hits[i] = rule
+                    intents[i] = (rule.intent, rule.confidence)
+
+        # Identify Intent via Local BERT (one forward per batch).
+        # Strict mode shadow-runs the model on rule hits too, and the model stays authoritative.
+        to_model = [i for i in pending if i not in rule_hits or self.rules_strict]
+        encodings = {}
+        head_priorities = {}
+        if to_model:
+            self._encode_missing(encodings, to_model, cleaned)
+            intent_out = self.intent_tokens.run(self._intent_model.classify_encoded, [encodings[i] for i in to_model])
+            for i, res in zip(to_model, intent_out):
+                rule = rule_hits.get(i)
+                if rule and rule.intent != res['label']:
+                    self.rule_tier.record_disagreement(rule)
+                    print(f"NLP RULE DISAGREEMENT: rule={rule.name} rule_intent={rule.intent} model_intent={res['label']} text='{cleaned[i]}'")
+                intents[i] = (res['label'], res['score'])
+                if 'priority' in res:  # multi-head model already produced it in the same pass
+                    head_priorities[i] = res['priority']['label']
+
+        # Priority only for the intents that need it, again as one batch
+        needs_priority = [i for i in pending if intents[i][0] in PRIORITY_INTENTS]
+        priorities = {i: head_priorities[i] for i in needs_priority if i in head_priorities}
+        missing = [i for i in needs_priority if i not in priorities]
+        if missing:
+            if self.shared_tokenizer:
+                self._encode_missing(encodings, missing, cleaned)
+                prio_encodings = [encodings[i] for i in missing]
+            else:
+                prio_encodings = self.priority_tokens.encode([cleaned[i] for i in missing])
+            prio_out = self.priority_tokens.run(self._priority_model.classify_encoded, prio_encodings)
+            priorities.update({i: res['label'] for i, res in zip(missing, prio_out)})
+
+        for i in pending:
+            classified[i] = (intents[i][0], intents[i][1], priorities.get(i))
+            # Skip the write if models were reloaded mid-batch, so stale results never enter the cache
+            if self.result_cache and generation == self._model_generation:
+                self.result_cache.put(cleaned[i], classified[i])
+
+        for i in valid:
+            intent, confidence, priority = classified[i]
+            results[i] = self._build_result(texts[i], cleaned[i], intent, confidence, priority)
+        return results
+
+    def _build_result(self, text: str, cleaned: str, intent: str, confidence: float, priority: str) -> dict:
         entities = {}
-        
+
         if intent == "CREATE_TASK":
-            prio_res = self.priority_pipeline(cleaned)[0]
-            priority = prio_res['label']
             entities["assigned_to"] = self.extract_mentions(text)
             entities["title"] = cleaned
-            
+
         elif intent in ["COMPLETE_TASK", "BLOCK_TASK"]:
             entities["task_code"] = self.extract_task_code(text)
             if intent == "BLOCK_TASK":
                 block_parts = re.split(r'due to|because', cleaned, flags=re.IGNORECASE)
                 entities["block_reason"] = block_parts[1].strip() if len(block_parts) > 1 else "Unspecified operational blocker"
-                
+
         elif intent == "ALERT":
-            prio_res = self.priority_pipeline(cleaned)[0]
-            priority = prio_res['label']
             entities["alert_message"] = cleaned
 
         return {
@@ -86,9 +401,72 @@ class MediStreamNLP:
             "entities": entities
         }
 
-# Instantiate Singleton immediately so import is heavy, not router logic
-nlp_engine_instance = MediStreamNLP()
+# Singleton is created at import, but (by default) its models load lazily/in the background,
+# so importing main.py no longer blocks uvicorn from binding.
+nlp_engine_instance = MediStreamNLP(lazy=NLP_LAZY_LOAD)
+
+# Concurrent /chat callers are coalesced into one padded forward pass
+nlp_batcher = MicroBatcher(
+    lambda batch: nlp_engine_instance.process_messages(batch),
+    max_batch_size=NLP_BATCH_MAX_SIZE,
+    max_wait_ms=NLP_BATCH_MAX_WAIT_MS,
+    max_queue=NLP_INFERENCE_MAX_QUEUE,
+)
+
+# The batcher's worker thread is the dedicated inference executor; a full queue raises this
+InferenceQueueFull = QueueFullError
 
 def process_message(text: str, user_id: str) -> dict:
     """Wrapper exposing the standardized contract required by main.py"""
-    return nlp_engine_instance.process_message(text, user_id)
+    return nlp_batcher.process(text)
+
+async def process_message_async(text: str, user_id: str) -> dict:
+    """Async /chat entrypoint. Raises InferenceQueueFull instead of queueing without bound."""
+    return await nlp_batcher.process_async(text)
+
+async def process_clauses_async(clauses: list, user_id: str) -> list:
+    """Async variant of process_clauses (all clauses are submitted before awaiting any)."""
+    futures = [asyncio.wrap_future(nlp_batcher.submit(clause)) for clause in clauses]
+    results = await asyncio.gather(*futures)
+    return [dict(result, clause=clause) for clause, result in zip(clauses, results)]
+
+def process_clauses(clauses: list, user_id: str) -> list:
+    """
+    Classifies the clauses of one compound message (see segmenter.split_clauses) together: all clauses are
+    queued at once, so they ride the same micro-batch (one padded forward). Returns one contract dict per
+    clause, tagged with its "clause" text, in message order.
+    """
+    futures = [nlp_batcher.submit(clause) for clause in clauses]
+    return [dict(future.result(), clause=clause) for clause, future in zip(clauses, futures)]
+
+def process_messages(texts: list, user_id: str = None) -> list:
+    """Direct batched entrypoint (backfills, tests). Bypasses the micro-batch queue."""
+    return nlp_engine_instance.process_messages(texts, user_id)
+
+def start_background_load():
+    nlp_engine_instance.start_background_load()
+
+def wait_until_ready(timeout: float = None) -> bool:
+    return nlp_engine_instance.wait_until_ready(timeout)
+
+def is_ready() -> bool:
+    return nlp_engine_instance.is_ready()
+
+def get_load_status() -> dict:
+    return nlp_engine_instance.load_status()
+
+def get_nlp_stats() -> dict:
+    return {
+        "batcher": nlp_batcher.stats(),
+        "rules": nlp_engine_instance.rule_tier.stats() if nlp_engine_instance.rule_tier else None,
+        "cache": nlp_engine_instance.result_cache.stats() if nlp_engine_instance.result_cache else None,
+        "tokens": _token_stats(),
+    }
+
+def _token_stats():
+    engine = nlp_engine_instance
+    if not engine.intent_tokens:
+        return None
+    if engine.shared_tokenizer:
+        return {"shared_tokenizer": True, "shared": engine.intent_tokens.stats()}
+    return {"shared_tokenizer": False, "intent": engine.intent_tokens.stats(), "priority": engine.priority_tokens.stats()}
@@ -0,0 +1,63 @@
+"""
+Exports the intent & priority DistilBERT models to ONNX and applies dynamic int8 quantization.
+Output: nlp/onnx/<model_name>/{model.onnx, model.int8.onnx, config.json, tokenizer files}
+
+Usage (from repo root):
+    python nlp/export_onnx.py
+Then start the backend with NLP_BACKEND=onnx.
+"""
+import os
+import shutil
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_DIR = os.path.join(BASE_DIR, "onnx")
+MODELS = ["intent_distilbert", "priority_distilbert"]
+OPSET = 17
+
+
+def export_model(name: str):
+    src = os.path.join(BASE_DIR, name)
+    out_dir = os.path.join(ONNX_DIR, name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(src)
+    model = AutoModelForSequenceClassification.from_pretrained(src)
+    model.eval()
+
+    sample = tokenizer(["Prepare discharge summary for ward 5", "T-1023 done"], padding=True, return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=OPSET,
+            dynamo=False,
+        )
+
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(out_dir)
+    shutil.copy(os.path.join(src, "config.json"), os.path.join(out_dir, "config.json"))
+
+    fp32_mb = os.path.getsize(fp32_path) / 1e6
+    int8_mb = os.path.getsize(int8_path) / 1e6
+    print(f"Exported {name}: fp32 {fp32_mb:.1f} MB -> int8 {int8_mb:.1f} MB ({out_dir})")
+
+
+if __name__ == "__main__":
+    for model_name in MODELS:
+        export_model(model_name)
+    print("ONNX export complete. Verify with `python nlp/check_onnx_agreement.py`.")
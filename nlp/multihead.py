@@ -0,0 +1,130 @@
+import json
+import os
+
+import torch
+from torch import nn
+from transformers import AutoModel, AutoTokenizer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MULTIHEAD_DIR = os.path.join(BASE_DIR, "multihead_distilbert")
+
+HEADS_FILE = "heads.pt"
+LABELS_FILE = "multihead_labels.json"
+EVAL_FILE = "multihead_eval.json"  # held-out accuracy vs the single-head models, written by train_multihead.py
+
+
+class MultiHeadDistilBert(nn.Module):
+    """One DistilBERT encoder pass -> intent logits AND priority logits."""
+
+    def __init__(self, encoder, intent_labels: list, priority_labels: list, dropout: float = 0.1):
+        super().__init__()
+        self.encoder = encoder
+        self.intent_labels = list(intent_labels)
+        self.priority_labels = list(priority_labels)
+
+        hidden = encoder.config.hidden_size if hasattr(encoder.config, "hidden_size") else encoder.config.dim
+        self.dropout = nn.Dropout(dropout)
+        self.intent_head = nn.Linear(hidden, len(self.intent_labels))
+        self.priority_head = nn.Linear(hidden, len(self.priority_labels))
+
+    def forward(self, input_ids, attention_mask):
+        hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        pooled = self.dropout(hidden[:, 0])  # [CLS] token, same pooling as DistilBertForSequenceClassification
+        return self.intent_head(pooled), self.priority_head(pooled)
+
+    def save(self, out_dir: str, tokenizer):
+        os.makedirs(out_dir, exist_ok=True)
+        self.encoder.save_pretrained(out_dir)
+        tokenizer.save_pretrained(out_dir)
+        torch.save({
+            "intent_head": self.intent_head.state_dict(),
+            "priority_head": self.priority_head.state_dict(),
+        }, os.path.join(out_dir, HEADS_FILE))
+        with open(os.path.join(out_dir, LABELS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"intent_labels": self.intent_labels, "priority_labels": self.priority_labels}, f, indent=2)
+
+    @classmethod
+    def load(cls, model_dir: str):
+        with open(os.path.join(model_dir, LABELS_FILE), encoding="utf-8") as f:
+            labels = json.load(f)
+        encoder = AutoModel.from_pretrained(model_dir, low_cpu_mem_usage=True)
+        model = cls(encoder, labels["intent_labels"], labels["priority_labels"])
+        heads = torch.load(os.path.join(model_dir, HEADS_FILE), map_location="cpu", weights_only=True)
+        model.intent_head.load_state_dict(heads["intent_head"])
+        model.priority_head.load_state_dict(heads["priority_head"])
+        return model
+
+
+def eval_shortfall(model_dir: str = MULTIHEAD_DIR):
+    """None if the stored held-out eval meets or beats the single-head baselines on both heads, else why not."""
+    path = os.path.join(model_dir, EVAL_FILE)
+    if not os.path.exists(path):
+        return f"no {EVAL_FILE} (retrain with train_multihead.py)"
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    for head in ("intent", "priority"):
+        scores = report.get(head) or {}
+        if not scores.get("rows") or scores.get("multihead") is None or scores.get("baseline") is None:
+            return f"{EVAL_FILE} has no {head} accuracy"
+        if scores["multihead"] < scores["baseline"]:
+            return f"{head} accuracy {scores['multihead']:.2%} < single-head {scores['baseline']:.2%}"
+    return None
+
+
+class MultiHeadClassifier:
+    """
+    Inference wrapper with the HF pipeline contract.
+    Calling it returns the intent `{label, score}` plus a nested `priority` `{label, score}` from the same pass,
+    so MediStreamNLP can use it as its intent_pipeline. `priority_view()` serves priority-only requests.
+    """
+
+    def __init__(self, model_dir: str = MULTIHEAD_DIR):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = MultiHeadDistilBert.load(model_dir)
+        self.model.eval()
+
+    def __call__(self, inputs, batch_size: int = 16, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        results = []
+        for start in range(0, len(texts), batch_size):
+            results.extend(self._classify(texts[start:start + batch_size]))
+        return results
+
+    def priority_view(self):
+        return _PriorityView(self)
+
+    def _classify(self, texts: list) -> list:
+        enc = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        return self.classify_encoded(enc["input_ids"], enc["attention_mask"])
+
+    def classify_encoded(self, input_ids, attention_mask) -> list:
+        """Pre-tokenized entrypoint used by the engine's TokenBatcher."""
+        with torch.inference_mode():
+            intent_logits, priority_logits = self.model(torch.from_numpy(input_ids), torch.from_numpy(attention_mask))
+        intent_probs = intent_logits.softmax(dim=-1)
+        priority_probs = priority_logits.softmax(dim=-1)
+
+        results = []
+        for ip, pp in zip(intent_probs, priority_probs):
+            i_best = int(ip.argmax())
+            p_best = int(pp.argmax())
+            results.append({
+                "label": self.model.intent_labels[i_best],
+                "score": float(ip[i_best]),
+                "priority": {"label": self.model.priority_labels[p_best], "score": float(pp[p_best])},
+            })
+        return results
+
+
+class _PriorityView:
+    """Priority-only face of a MultiHeadClassifier (same weights, same tokenizer)."""
+
+    def __init__(self, classifier: MultiHeadClassifier):
+        self.classifier = classifier
+        self.tokenizer = classifier.tokenizer
+
+    def __call__(self, inputs, batch_size: int = 16, **kwargs):
+        return [res["priority"] for res in self.classifier(inputs, batch_size=batch_size)]
+
+    def classify_encoded(self, input_ids, attention_mask) -> list:
+        return [res["priority"] for res in self.classifier.classify_encoded(input_ids, attention_mask)]
@@ -0,0 +1,62 @@
+import json
+import os
+
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_DIR = os.path.join(BASE_DIR, "onnx")
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+class OnnxTextClassifier:
+    """
+    Drop-in replacement for a HuggingFace text-classification pipeline, backed by ONNX Runtime (CPU).
+    Returns the same `{label, score}` dicts so process_message callers don't change.
+    Model directories are produced by nlp/export_onnx.py.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, intra_op_threads: int = 0):
+        model_file = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"{model_file} missing. Run `python nlp/export_onnx.py` first.")
+
+        with open(os.path.join(model_dir, "config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        self.id2label = {int(k): v for k, v in config["id2label"].items()}
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, inputs, batch_size: int = 16, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        results = []
+        for start in range(0, len(texts), batch_size):
+            results.extend(self._classify(texts[start:start + batch_size]))
+        return results
+
+    def _classify(self, texts: list) -> list:
+        enc = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        return self.classify_encoded(enc["input_ids"], enc["attention_mask"])
+
+    def classify_encoded(self, input_ids, attention_mask) -> list:
+        """Pre-tokenized entrypoint used by the engine's TokenBatcher."""
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        feed = {name: inputs[name].astype(np.int64) for name in self._input_names}
+        logits = self.session.run(None, feed)[0]
+
+        # Same softmax + argmax the HF pipeline applies for single-label classification
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=-1, keepdims=True)
+        best = probs.argmax(axis=-1)
+        return [{"label": self.id2label[int(b)], "score": float(p[b])} for b, p in zip(best, probs)]
@@ -0,0 +1,72 @@
+import re
+import threading
+
+RULE_CONFIDENCE = 0.99
+
+
+class Rule:
+    def __init__(self, name: str, pattern: str, intent: str, confidence: float = RULE_CONFIDENCE):
+        self.name = name
+        self.intent = intent
+        self.confidence = confidence
+        self.regex = re.compile(pattern, re.IGNORECASE)
+
+    def matches(self, cleaned: str) -> bool:
+        return self.regex.fullmatch(cleaned) is not None
+
+
+# Ordered: first match wins. Patterns run on the _clean_text() output (mentions stripped)
+# and are intentionally narrow -- anything ambiguous falls through to DistilBERT.
+DEFAULT_RULES = [
+    Rule("complete_code_done", r"T-\d+\s+(?:is\s+|has\s+been\s+)?(?:done|completed|finished)[.!]?", "COMPLETE_TASK"),
+    Rule("complete_verb_code", r"(?:complete|completed|finished)\s+T-\d+[.!]?", "COMPLETE_TASK"),
+    Rule("block_code_reason", r"T-\d+\s+(?:is\s+)?(?:blocked|on hold|delayed|cannot proceed|waiting for|awaiting)\b.*", "BLOCK_TASK"),
+    Rule("alert_code_colour", r"code\s+(?:blue|red)\b.*", "ALERT"),
+    Rule("alert_cardiac_arrest", r"(?:sudden\s+)?cardiac arrest\b.*", "ALERT"),
+]
+
+
+class RuleTier:
+    """
+    Deterministic fast path in front of the intent model.
+    Resolves high-certainty message shapes with a synthetic confidence and keeps per-rule hit counters.
+    """
+
+    def __init__(self, rules: list = None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._hits = {rule.name: 0 for rule in self.rules}
+        self._disagreements = {rule.name: 0 for rule in self.rules}
+
+    def match(self, cleaned: str):
+        """Returns the matching Rule or None (counted towards hit rates)."""
+        text = cleaned.strip()
+        hit = next((rule for rule in self.rules if rule.matches(text)), None)
+        with self._lock:
+            self._checked += 1
+            if hit:
+                self._hits[hit.name] += 1
+        return hit
+
+    def record_disagreement(self, rule: Rule):
+        with self._lock:
+            self._disagreements[rule.name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            checked = self._checked or 1
+            total_hits = sum(self._hits.values())
+            return {
+                "checked": self._checked,
+                "hits": total_hits,
+                "hit_rate": round(total_hits / checked, 4),
+                "per_rule": {
+                    name: {
+                        "hits": hits,
+                        "hit_rate": round(hits / checked, 4),
+                        "model_disagreements": self._disagreements[name],
+                    }
+                    for name, hits in self._hits.items()
+                },
+            }
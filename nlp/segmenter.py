@@ -0,0 +1,51 @@
+import re
+
+# Hard clause boundaries: semicolons, newlines, bullet dots
+_HARD_SPLIT = re.compile(r'\s*(?:;|\n|•)\s*')
+
+# Words that open a command right after its task code / mention ("T-1102 waiting ...", "@Riya monitor ...")
+_ACTION_WORDS = (
+    r"done|completed?|finished|blocked|waiting|awaiting|on\s+hold|delayed|cannot|can't|is|has|was"
+    r"|please|monitor|check|update|prepare|review|call|give|administer|start|finish|mark|escalate|notify"
+    r"|transfer|discharge|bring|draw|schedule|follow|assess|recheck|handle|take|send|collect|arrange"
+)
+
+# Soft boundaries (comma / "and" / "then") only count when the next clause opens a new command: a task
+# code or mention followed by an action word. "Prepare summary for ward 5, bed 3", "move T-12 and T-13 to
+# done" and "assign T-4 to @ana, @raj" stay one clause.
+_SOFT_SPLIT = re.compile(
+    rf'\s*(?:,|\band\b|\bthen\b)\s+(?=(?:T-\d+|@\w+)\s+(?:{_ACTION_WORDS})\b)', re.IGNORECASE
+)
+
+_ONLY_MENTIONS = re.compile(r'^(?:@\w+[\s,]*)+$')
+
+
+def split_clauses(text: str) -> list:
+    """
+    Splits a compound chat message into command clauses, e.g.
+    "T-1023 done, T-1102 waiting for lab report, @Riya monitor ICU 12" -> 3 clauses.
+    A single-command message comes back as a one-element list.
+    """
+    if not text:
+        return []
+
+    pieces = []
+    for part in _HARD_SPLIT.split(text):
+        pieces.extend(p.strip() for p in _SOFT_SPLIT.split(part))
+    pieces = [p.strip(" ,.") for p in pieces if p and p.strip(" ,.")]
+
+    # "@Neha and @Amit check ICU": a clause made only of mentions belongs to the next clause
+    clauses = []
+    carry = ""
+    for piece in pieces:
+        if _ONLY_MENTIONS.match(piece):
+            carry = f"{carry} {piece}".strip()
+            continue
+        clauses.append(f"{carry} {piece}".strip() if carry else piece)
+        carry = ""
+    if carry:
+        if clauses:
+            clauses[-1] = f"{clauses[-1]} {carry}"
+        else:
+            clauses.append(carry)
+    return clauses or [text.strip()]
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from batcher import MicroBatcher, QueueFullError
+
+
+def run_tests():
+    seen_batches = []
+
+    def handler(items):
+        seen_batches.append(len(items))
+        time.sleep(0.01)  # simulate one padded forward pass
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(handler, max_batch_size=8, max_wait_ms=20)
+
+    print("\n--- TEST 1: Each caller gets its own result ---")
+    texts = [f"msg-{i}" for i in range(32)]
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(batcher.process, texts))
+    print(f"Results in order (Expected True): {results == [t.upper() for t in texts]}")
+
+    print("\n--- TEST 2: Requests were coalesced ---")
+    print(f"Batches run: {len(seen_batches)} (Expected < 32)")
+    print(f"Largest batch (Expected <= 8): {max(seen_batches)}")
+
+    print("\n--- TEST 3: Counters ---")
+    stats = batcher.stats()
+    print(f"Items counted (Expected 32): {stats['items']}")
+    print(f"Stats: {stats}")
+
+    print("\n--- TEST 4: Handler failure propagates to every caller in the batch ---")
+    failing = MicroBatcher(lambda items: 1 / 0, max_batch_size=4, max_wait_ms=5)
+    try:
+        failing.process("boom", timeout=2)
+        print("Raised (Expected True): False")
+    except ZeroDivisionError:
+        print("Raised (Expected True): True")
+
+    print("\n--- TEST 5: Async callers await results without holding a thread ---")
+    async def gather_async():
+        return await asyncio.gather(*(batcher.process_async(t) for t in texts))
+    print(f"Async results in order (Expected True): {asyncio.run(gather_async()) == [t.upper() for t in texts]}")
+
+    print("\n--- TEST 6: Full queue rejects instead of growing (backpressure) ---")
+    gate = threading.Event()
+    bounded = MicroBatcher(lambda items: gate.wait() and items, max_batch_size=1, max_wait_ms=0, max_queue=2)
+    futures = [bounded.submit("first")]
+    time.sleep(0.05)  # worker picks up "first" and blocks in the handler
+    futures += [bounded.submit("second"), bounded.submit("third")]
+    try:
+        bounded.submit("fourth")
+        print("Rejected (Expected True): False")
+    except QueueFullError:
+        print("Rejected (Expected True): True")
+    # Stats readers racing rejected submits must not deadlock
+    def hammer(action):
+        for _ in range(2000):
+            try:
+                action()
+            except QueueFullError:
+                pass
+    threads = [threading.Thread(target=hammer, args=(a,), daemon=True)
+               for a in (bounded.stats, lambda: bounded.submit("extra"), bounded.stats)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    print(f"Stats and rejections never deadlock (Expected True): {not any(t.is_alive() for t in threads)}")
+    gate.set()
+    print(f"Queued items still served (Expected ['first', 'second', 'third']): {[f.result(timeout=2) for f in futures]}")
+    print(f"Rejected counted (Expected 2001): {bounded.stats()['rejected']}")
+
+    print("\n--- TEST 7: A caller that gives up mid-batch doesn't kill the worker ---")
+    gate = threading.Event()
+    slow = MicroBatcher(lambda items: gate.wait() and items, max_batch_size=1, max_wait_ms=0)
+
+    async def cancel_waiters():
+        running = asyncio.ensure_future(slow.process_async("running"))
+        await asyncio.sleep(0.05)  # worker is inside the handler with "running"
+        queued = asyncio.ensure_future(slow.process_async("queued"))
+        await asyncio.sleep(0.01)
+        running.cancel()
+        queued.cancel()
+        await asyncio.sleep(0.01)
+        gate.set()
+        return await asyncio.wait_for(slow.process_async("next"), 2)
+
+    print(f"Next submit completes (Expected next): {asyncio.run(cancel_waiters())}")
+    print(f"Worker alive (Expected True): {slow._worker.is_alive()}")
+    print(f"Dropped before running (Expected 1): {slow.stats()['cancelled']}")
+
+    batcher.close()
+    failing.close()
+    bounded.close()
+    slow.close()
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,34 @@
+import time
+from cache import ResultCache
+
+
+def run_tests():
+    print("\n--- TEST 1: Normalized key hit ---")
+    cache = ResultCache(max_size=2)
+    cache.put("Update attendance sheet", ("CREATE_TASK", 0.97, "LOW"))
+    print(f"Hit on extra whitespace (Expected CREATE_TASK): {cache.get('Update   attendance sheet')}")
+
+    print("\n--- TEST 2: LRU eviction ---")
+    cache.put("Urgent ICU monitoring required", ("CREATE_TASK", 0.95, "HIGH"))
+    cache.get("Update attendance sheet")  # refresh -> ICU entry is now least recently used
+    cache.put("Code blue", ("ALERT", 0.99, "CRITICAL"))
+    print(f"Evicted entry (Expected None): {cache.get('Urgent ICU monitoring required')}")
+    print(f"Refreshed entry kept (Expected True): {cache.get('Update attendance sheet') is not None}")
+    print(f"Evictions (Expected 1): {cache.stats()['evictions']}")
+
+    print("\n--- TEST 3: TTL expiry ---")
+    ttl_cache = ResultCache(max_size=10, ttl_seconds=0.05)
+    ttl_cache.put("Okay noted", ("OTHER", 0.9, None))
+    time.sleep(0.1)
+    print(f"Expired entry (Expected None): {ttl_cache.get('Okay noted')}")
+    print(f"Expirations (Expected 1): {ttl_cache.stats()['expirations']}")
+
+    print("\n--- TEST 4: Invalidation on model reload ---")
+    cache.clear()
+    stats = cache.stats()
+    print(f"Size after clear (Expected 0): {stats['size']}")
+    print(f"Stats: {stats}")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,32 @@
+from segmenter import split_clauses
+
+
+def run_tests():
+    test_cases = [
+        # (message, expected clauses)
+        ("T-1023 done, T-1102 waiting for lab report, @Riya monitor ICU 12",
+         ["T-1023 done", "T-1102 waiting for lab report", "@Riya monitor ICU 12"]),
+        ("Prepare discharge summary for ward 5, bed 3", ["Prepare discharge summary for ward 5, bed 3"]),
+        ("Code blue in ward 5; @Karan update medication chart for bed 8",
+         ["Code blue in ward 5", "@Karan update medication chart for bed 8"]),
+        ("T-2100 blocked due to equipment failure and T-3301 done",
+         ["T-2100 blocked due to equipment failure", "T-3301 done"]),
+        ("@Neha and @Amit check ICU", ["@Neha @Amit check ICU"]),
+        ("T-4500 done", ["T-4500 done"]),
+        # List-style references inside one command stay together
+        ("move T-12 and T-13 to done", ["move T-12 and T-13 to done"]),
+        ("assign T-4 to @ana, @raj", ["assign T-4 to @ana, @raj"]),
+        ("T-7 and T-8 are waiting on pharmacy", ["T-7 and T-8 are waiting on pharmacy"]),
+        ("notify @ana and @raj about bed 4, then T-9 done", ["notify @ana and @raj about bed 4", "T-9 done"]),
+    ]
+
+    print("\n--- Running Segmenter Tests ---")
+    for text, expected in test_cases:
+        result = split_clauses(text)
+        print(f"\nMessage: {text}")
+        print(f"Clauses: {result}")
+        print(f"Matches expected (Expected True): {result == expected}")
+
+
+if __name__ == "__main__":
+    run_tests()
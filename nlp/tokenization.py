@@ -0,0 +1,138 @@
+import threading
+import time
+
+import numpy as np
+
+
+class TokenBatcher:
+    """
+    Tokenization policy for chat inference.
+    - Tokenizes each text ONCE (truncated to max_length, no padding) so the ids can be reused by every model
+      that shares this tokenizer (intent + priority passes).
+    - Groups rows of similar length into the same forward batch, so one pasted note doesn't pad every short
+      message to its length. Results come back in input order.
+    - Tracks tokens/sec and padding waste (with the unbucketed waste alongside, to show the gain).
+    """
+
+    def __init__(self, tokenizer, max_length: int = 128, batch_size: int = 16, bucketing: bool = True):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.bucketing = bucketing
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+        self._lock = threading.Lock()
+        self._texts = 0
+        self._truncated = 0
+        self._batches = 0
+        self._real_tokens = 0
+        self._padded_tokens = 0
+        self._unbucketed_padded_tokens = 0
+        self._tokenize_seconds = 0.0
+        self._forward_seconds = 0.0
+
+    def encode(self, texts: list) -> list:
+        started = time.perf_counter()
+        enc = self.tokenizer(list(texts), truncation=True, max_length=self.max_length, padding=False)
+        ids = enc["input_ids"]
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._texts += len(ids)
+            self._truncated += sum(1 for row in ids if len(row) >= self.max_length)
+            self._tokenize_seconds += elapsed
+        return ids
+
+    def run(self, classify_encoded, encodings: list) -> list:
+        """
+        classify_encoded(input_ids, attention_mask) -> list of per-row results (numpy int64 [B, T] inputs).
+        Returns one result per encoding, in the order given.
+        """
+        if not encodings:
+            return []
+
+        order = list(range(len(encodings)))
+        if self.bucketing:
+            order.sort(key=lambda i: len(encodings[i]))
+
+        results = [None] * len(encodings)
+        real = padded = 0
+        started = time.perf_counter()
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            input_ids, attention_mask = self._pad([encodings[i] for i in rows])
+            for i, res in zip(rows, classify_encoded(input_ids, attention_mask)):
+                results[i] = res
+            real += int(attention_mask.sum())
+            padded += attention_mask.size
+        elapsed = time.perf_counter() - started
+
+        # What the same rows would have cost padded in arrival order
+        unbucketed = sum(
+            len(chunk) * max(len(e) for e in chunk)
+            for chunk in (encodings[s:s + self.batch_size] for s in range(0, len(encodings), self.batch_size))
+        )
+
+        with self._lock:
+            self._batches += -(-len(order) // self.batch_size)
+            self._real_tokens += real
+            self._padded_tokens += padded
+            self._unbucketed_padded_tokens += unbucketed
+            self._forward_seconds += elapsed
+        return results
+
+    def _pad(self, rows: list):
+        width = max(len(r) for r in rows)
+        input_ids = np.full((len(rows), width), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for n, row in enumerate(rows):
+            input_ids[n, :len(row)] = row
+            attention_mask[n, :len(row)] = 1
+        return input_ids, attention_mask
+
+    def stats(self) -> dict:
+        with self._lock:
+            padded = self._padded_tokens or 1
+            unbucketed = self._unbucketed_padded_tokens or 1
+            return {
+                "max_length": self.max_length,
+                "bucketing": self.bucketing,
+                "texts_tokenized": self._texts,
+                "texts_truncated": self._truncated,
+                "forward_batches": self._batches,
+                "real_tokens": self._real_tokens,
+                "padded_tokens": self._padded_tokens,
+                "padding_waste": round(1 - self._real_tokens / padded, 4),
+                "padding_waste_unbucketed": round(1 - self._real_tokens / unbucketed, 4),
+                "tokens_per_sec": round(self._real_tokens / self._forward_seconds, 1) if self._forward_seconds else 0.0,
+                "tokenize_ms_total": round(self._tokenize_seconds * 1000, 3),
+            }
+
+
+def same_tokenizer(a, b) -> bool:
+    """True if two tokenizers produce identical ids, so one encoding can feed both models."""
+    if a is b:
+        return True
+    try:
+        return a.backend_tokenizer.to_str() == b.backend_tokenizer.to_str()
+    except AttributeError:  # slow tokenizers
+        return type(a) is type(b) and a.get_vocab() == b.get_vocab()
+
+
+class PipelineEncodedClassifier:
+    """Runs a HF text-classification pipeline's model directly on pre-tokenized ids."""
+
+    def __init__(self, hf_pipeline):
+        self.model = hf_pipeline.model
+        self.tokenizer = hf_pipeline.tokenizer
+        self.id2label = self.model.config.id2label
+
+    def classify_encoded(self, input_ids, attention_mask) -> list:
+        import torch
+        with torch.inference_mode():
+            logits = self.model(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask),
+            ).logits
+        probs = logits.softmax(dim=-1)
+        scores, best = probs.max(dim=-1)
+        return [{"label": self.id2label[int(b)], "score": float(s)} for b, s in zip(best, scores)]
@@ -0,0 +1,142 @@
+"""
+Trains the shared-encoder intent + priority model from nlp/full_dataset.csv and nlp/priority_dataset.csv.
+The encoder is initialised from nlp/intent_distilbert; each row only contributes loss to the head it is labelled for.
+--eval-fraction of each dataset is held out; the multi-head model and the single-head models (nlp/intent_distilbert,
+nlp/priority_distilbert) are scored on it and the result is saved as multihead_eval.json. NLP_MULTIHEAD=auto only
+serves the multi-head model when it meets or beats both baselines there. The single-head models may have seen the
+held-out rows in their own training, which only makes the gate stricter.
+Output: nlp/multihead_distilbert.
+
+Usage (from repo root):
+    python nlp/train_multihead.py [--epochs 8] [--lr 5e-5] [--batch-size 16] [--eval-fraction 0.2]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+
+import torch
+from torch import nn
+from transformers import AutoModel, AutoTokenizer, pipeline
+
+from multihead import MultiHeadDistilBert, MULTIHEAD_DIR, EVAL_FILE
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IGNORE = -100
+
+
+def load_rows(csv_name: str) -> list:
+    with open(os.path.join(BASE_DIR, csv_name), newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-model", default=os.path.join(BASE_DIR, "intent_distilbert"))
+    parser.add_argument("--epochs", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--eval-fraction", type=float, default=0.2, help="Share of each dataset held out for the eval")
+    parser.add_argument("--out", default=MULTIHEAD_DIR)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+
+    intent_all = load_rows("full_dataset.csv")
+    priority_all = load_rows("priority_dataset.csv")
+    intent_labels = sorted({r["label"] for r in intent_all})
+    priority_labels = sorted({r["label"] for r in priority_all})
+    intent_rows, intent_eval = split_rows(intent_all, args.eval_fraction)
+    priority_rows, priority_eval = split_rows(priority_all, args.eval_fraction)
+
+    # (text, intent_id, priority_id) -- the missing label is masked out of the loss
+    samples = [(r["text"], intent_labels.index(r["label"]), IGNORE) for r in intent_rows]
+    samples += [(r["text"], IGNORE, priority_labels.index(r["label"])) for r in priority_rows]
+
+    tokenizer = AutoTokenizer.from_pretrained(args.base_model)
+    encoder = AutoModel.from_pretrained(args.base_model)
+    model = MultiHeadDistilBert(encoder, intent_labels, priority_labels)
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr)
+    loss_fn = nn.CrossEntropyLoss(ignore_index=IGNORE)
+
+    for epoch in range(1, args.epochs + 1):
+        model.train()
+        random.shuffle(samples)
+        total_loss = 0.0
+        for start in range(0, len(samples), args.batch_size):
+            batch = samples[start:start + args.batch_size]
+            enc = tokenizer([s[0] for s in batch], padding=True, truncation=True, return_tensors="pt")
+            intent_y = torch.tensor([s[1] for s in batch])
+            priority_y = torch.tensor([s[2] for s in batch])
+
+            intent_logits, priority_logits = model(enc["input_ids"], enc["attention_mask"])
+            loss = torch.zeros(())
+            if (intent_y != IGNORE).any():
+                loss = loss + loss_fn(intent_logits, intent_y)
+            if (priority_y != IGNORE).any():
+                loss = loss + loss_fn(priority_logits, priority_y)
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(batch)
+
+        print(f"Epoch {epoch}/{args.epochs} - loss {total_loss / len(samples):.4f} - "
+              f"intent acc {accuracy(model, tokenizer, intent_rows, intent_labels, head=0):.2%} - "
+              f"priority acc {accuracy(model, tokenizer, priority_rows, priority_labels, head=1):.2%}")
+
+    report = {
+        "eval_fraction": args.eval_fraction,
+        "intent": {"rows": len(intent_eval),
+                   "multihead": accuracy(model, tokenizer, intent_eval, intent_labels, head=0),
+                   "baseline": baseline_accuracy(os.path.join(BASE_DIR, "intent_distilbert"), intent_eval)},
+        "priority": {"rows": len(priority_eval),
+                     "multihead": accuracy(model, tokenizer, priority_eval, priority_labels, head=1),
+                     "baseline": baseline_accuracy(os.path.join(BASE_DIR, "priority_distilbert"), priority_eval)},
+    }
+    for head in ("intent", "priority"):
+        print(f"Held-out {head} accuracy: multi-head {report[head]['multihead']:.2%} vs "
+              f"single-head {report[head]['baseline']:.2%} ({report[head]['rows']} rows)")
+
+    model.save(args.out, tokenizer)
+    with open(os.path.join(args.out, EVAL_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved multi-head model to {args.out}")
+
+
+def split_rows(rows: list, fraction: float):
+    """(train, held_out), shuffled with the global seed."""
+    rows = list(rows)
+    random.shuffle(rows)
+    cut = int(len(rows) * fraction)
+    return rows[cut:], rows[:cut]
+
+
+def baseline_accuracy(model_dir: str, rows: list):
+    """Accuracy of a single-head model on the same rows, None if it isn't there to compare against."""
+    if not os.path.isdir(model_dir):
+        return None
+    classifier = pipeline("text-classification", model=model_dir, tokenizer=model_dir, device=-1)
+    preds = classifier([r["text"] for r in rows], batch_size=64, truncation=True)
+    return sum(1 for r, p in zip(rows, preds) if p["label"] == r["label"]) / max(len(rows), 1)
+
+
+def accuracy(model, tokenizer, rows: list, labels: list, head: int) -> float:
+    model.eval()
+    correct = 0
+    with torch.inference_mode():
+        for start in range(0, len(rows), 64):
+            batch = rows[start:start + 64]
+            enc = tokenizer([r["text"] for r in batch], padding=True, truncation=True, return_tensors="pt")
+            logits = model(enc["input_ids"], enc["attention_mask"])[head]
+            preds = logits.argmax(dim=-1).tolist()
+            correct += sum(1 for r, p in zip(batch, preds) if labels[p] == r["label"])
+    return correct / max(len(rows), 1)
+
+
+if __name__ == "__main__":
+    main()
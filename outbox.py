@@ -0,0 +1,297 @@
+"""
+Durable write-behind outbox for fire-and-forget inserts (alerts, SYSTEM chat_messages).
+Request handlers append rows to a local SQLite file (WAL mode) and return immediately; a background
+flusher batches pending rows into one multi-row upsert per table and deletes them once Supabase accepts.
+
+- Durable: rows survive a crash/restart and are flushed on the next start.
+- Idempotent: every row gets a client-side uuid `id` at enqueue time and is upserted with ignore-duplicates,
+  so a retry after an ambiguous failure never double-inserts.
+- Ordered per shift: rows go out in enqueue order. If a batch fails, rows are retried shift by shift; a failing
+  shift backs off (exponentially) without holding up other shifts, and its later rows wait behind it.
+- Rows that keep failing (OUTBOX_MAX_ATTEMPTS) move to `outbox_dead` instead of blocking their shift forever.
+- With several pre-forked workers sharing the file, a file lock lets exactly one of them flush.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, always the flusher
+    fcntl = None
+
+from db_client import get_client, execute
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", os.path.join(BASE_DIR, "outbox.db"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_FLUSH_INTERVAL_MS = float(os.getenv("OUTBOX_FLUSH_INTERVAL_MS", "200"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))
+OUTBOX_DRAIN_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_DRAIN_TIMEOUT_SECONDS", "10"))
+
+_SCHEMA = """
+create table if not exists outbox (
+    id integer primary key autoincrement,
+    table_name text not null,
+    shift_id text,
+    payload text not null,
+    enqueued_at real not null,
+    attempts integer not null default 0,
+    last_error text
+);
+create index if not exists outbox_shift_idx on outbox (shift_id, id);
+create table if not exists outbox_dead (
+    id integer primary key,
+    table_name text not null,
+    shift_id text,
+    payload text not null,
+    enqueued_at real not null,
+    attempts integer not null,
+    last_error text,
+    dead_at real not null
+);
+"""
+
+
+class Outbox:
+
+    def __init__(self, path: str = OUTBOX_PATH, batch_size: int = OUTBOX_BATCH_SIZE,
+                 flush_interval_ms: float = OUTBOX_FLUSH_INTERVAL_MS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._lock_pid = None
+        self._task = None
+        self._stopping = False
+        self._wakeup = None
+        self._backoff = {}  # shift_id -> (retry_at, delay)
+
+        self._enqueued = 0
+        self._flushed = 0
+        self._batches = 0
+        self._failures = 0
+        self._dead_lettered = 0
+        self._last_flush_at = None
+        self._last_error = None
+
+    # --- storage ---
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per process (a forked worker must not reuse its parent's handle)
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")  # WAL + NORMAL: durable across process crashes
+            conn.execute("pragma busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._conn_pid = os.getpid()
+            self._lock = threading.Lock()
+        return self._conn
+
+    def enqueue(self, table: str, rows: list) -> list:
+        """Durably queues rows for `table` and returns them with their client-side ids filled in."""
+        rows = [dict(row) for row in rows]
+        now = time.time()
+        for row in rows:
+            row.setdefault("id", str(uuid.uuid4()))
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("begin")
+                conn.executemany(
+                    "insert into outbox (table_name, shift_id, payload, enqueued_at) values (?, ?, ?, ?)",
+                    [(table, row.get("shift_id"), json.dumps(row), now) for row in rows]
+                )
+            self._enqueued += len(rows)
+        if self._wakeup is not None and rows:
+            self._wakeup.set()
+        return rows
+
+    def pending(self, table: str, shift_id: str) -> list:
+        """Rows still waiting to be flushed (readers merge these with the DB, de-duplicated on id)."""
+        with self._lock:
+            cursor = self._db().execute(
+                "select payload from outbox where table_name = ? and shift_id = ? order by id", (table, shift_id)
+            )
+            return [json.loads(payload) for (payload,) in cursor.fetchall()]
+
+    # --- flushing ---
+
+    def _is_flusher(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._lock_file is None or self._lock_pid != os.getpid():
+            self._lock_file = open(self.path + ".lock", "a")
+            self._lock_pid = os.getpid()
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _next_batch(self) -> list:
+        now = time.monotonic()
+        waiting = [shift for shift, (retry_at, _) in self._backoff.items() if retry_at > now]
+        query = "select id, table_name, shift_id, payload, attempts from outbox"
+        if waiting:
+            query += f" where coalesce(shift_id, '') not in ({','.join('?' * len(waiting))})"
+        query += " order by id limit ?"
+        with self._lock:
+            return self._db().execute(query, [*waiting, self.batch_size]).fetchall()
+
+    async def _insert(self, table: str, rows: list):
+        db = await get_client()
+        await execute(db.table(table).upsert(
+            [json.loads(payload) for payload in rows], on_conflict="id", ignore_duplicates=True
+        ))
+
+    def _delete(self, ids: list):
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("begin")
+                conn.executemany("delete from outbox where id = ?", [(i,) for i in ids])
+
+    def _record_failure(self, rows: list, error: str):
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("begin")
+                for row_id, _, _, _, attempts in rows:
+                    if attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                        conn.execute(
+                            "insert or replace into outbox_dead select id, table_name, shift_id, payload, enqueued_at,"
+                            " attempts + 1, ?, ? from outbox where id = ?", (error, time.time(), row_id)
+                        )
+                        conn.execute("delete from outbox where id = ?", (row_id,))
+                        self._dead_lettered += 1
+                    else:
+                        conn.execute("update outbox set attempts = attempts + 1, last_error = ? where id = ?",
+                                     (error, row_id))
+
+    async def _flush_group(self, rows: list) -> bool:
+        """rows from one shift (or one batch) in id order; each table gets one multi-row upsert."""
+        by_table = {}
+        for row in rows:
+            by_table.setdefault(row[1], []).append(row[3])
+        for table, payloads in by_table.items():
+            await self._insert(table, payloads)
+        self._delete([row[0] for row in rows])
+        return True
+
+    async def flush_once(self) -> int:
+        """Flushes one batch of pending rows. Returns how many were written."""
+        rows = self._next_batch()
+        if not rows:
+            return 0
+
+        self._batches += 1
+        try:
+            await self._flush_group(rows)
+            self._flushed += len(rows)
+            self._last_flush_at = time.time()
+            return len(rows)
+        except Exception as e:
+            self._failures += 1
+            self._last_error = str(e)
+            print("OUTBOX FLUSH ERROR:", e)
+
+        # Isolate the failure: retry shift by shift, keeping each shift's rows in order
+        by_shift = {}
+        for row in rows:
+            by_shift.setdefault(row[2] or "", []).append(row)
+        written = 0
+        for shift_id, shift_rows in by_shift.items():
+            try:
+                await self._flush_group(shift_rows)
+                written += len(shift_rows)
+                self._backoff.pop(shift_id, None)
+            except Exception as e:
+                self._last_error = str(e)
+                self._record_failure(shift_rows, str(e))
+                _, delay = self._backoff.get(shift_id, (0, self.flush_interval_ms / 1000))
+                delay = min(delay * 2, OUTBOX_MAX_BACKOFF_SECONDS)
+                self._backoff[shift_id] = (time.monotonic() + delay, delay)
+        self._flushed += written
+        if written:
+            self._last_flush_at = time.time()
+        return written
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                if self._is_flusher():
+                    while not self._stopping and await self.flush_once():
+                        pass
+            except Exception as e:
+                print("OUTBOX ERROR:", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        """Starts the background flusher on the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def drain(self, timeout: float = OUTBOX_DRAIN_TIMEOUT_SECONDS) -> int:
+        """Stops the flusher and flushes what it can within `timeout`. Returns rows left on disk."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        deadline = time.monotonic() + timeout
+        self._backoff.clear()
+        if self._is_flusher():
+            while time.monotonic() < deadline:
+                try:
+                    if not await asyncio.wait_for(self.flush_once(), max(0.01, deadline - time.monotonic())):
+                        break
+                except Exception as e:
+                    print("OUTBOX DRAIN ERROR:", e)
+                    break
+        left = self.stats()["queue_depth"]
+        if left:
+            print(f"OUTBOX: {left} rows left on disk; they will be flushed on next start.")
+        return left
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth, oldest = self._db().execute("select count(*), min(enqueued_at) from outbox").fetchone()
+            dead = self._db().execute("select count(*) from outbox_dead").fetchone()[0]
+        return {
+            "queue_depth": depth,
+            "flush_lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "enqueued": self._enqueued,
+            "flushed": self._flushed,
+            "batches": self._batches,
+            "failures": self._failures,
+            "dead_letter_depth": dead,
+            "dead_lettered": self._dead_lettered,
+            "shifts_backing_off": len(self._backoff),
+            "last_flush_at": self._last_flush_at,
+            "last_error": self._last_error,
+            "flusher": self._task is not None and not self._task.done(),
+        }
+
+
+outbox = Outbox()
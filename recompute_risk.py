@@ -0,0 +1,173 @@
+"""
+Bulk risk recomputation for historical shifts, for after PRIORITY_WEIGHTS, STATUS_WEIGHTS or RISK_THRESHOLD
+change in agent/agent_service.py. Same formula as evaluate_shift_risk, but instead of two queries and one
+write per shift it:
+  - pages shifts by id (--shift-page at a time) and streams their tasks and active alerts in keyset pages
+    of --row-page rows with one `shift_id in (...)` query per page, until a page comes back empty (the
+    server may return fewer rows than asked: PostgREST's db-max-rows, 1000 on Supabase),
+  - scores the whole shift page at once with NumPy (weight lookup + bincount per shift),
+  - writes only the shifts whose score or high-risk flag changed, one update per distinct
+    (risk_score, is_high_risk) pair per page (at most 22), not one per shift.
+The active shift is skipped: the running backend's risk evaluator owns it and rescans it after the restart
+that picks up the new weights. No escalation messages are logged for past shifts.
+
+--dry-run writes nothing and prints every shift whose escalation state would change, plus totals.
+
+Usage (from repo root):
+    python recompute_risk.py --dry-run
+    python recompute_risk.py [--shift-page 200] [--row-page 1000] [--show-scores]
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from agent.agent_service import PRIORITY_WEIGHTS, STATUS_WEIGHTS, RISK_THRESHOLD
+from db_client import get_client, execute
+
+WRITE_CHUNK = 100  # ids per `id in (...)` update; keeps the PostgREST URL short
+
+
+def lookup_weights(values: list, weights: dict, default: int) -> np.ndarray:
+    """Vectorized weights.get(value, default): one dict lookup per distinct value, not per row."""
+    if not values:
+        return np.zeros(0, dtype=np.int64)
+    keys, inverse = np.unique(np.array([str(v) for v in values]), return_inverse=True)
+    table = np.array([weights.get(key, default) for key in keys], dtype=np.int64)
+    return table[inverse]
+
+
+def score_shifts(shift_ids: list, tasks: dict, alerts: dict):
+    """
+    tasks: {"shift_id": [...], "priority": [...], "status": [...]} columns; alerts: {"shift_id": [...]}.
+    Returns (risk_score, is_high_risk) arrays aligned with shift_ids, matching evaluate_shift_risk.
+    """
+    index = {shift_id: i for i, shift_id in enumerate(shift_ids)}
+    n = len(shift_ids)
+    task_shift = np.fromiter((index[s] for s in tasks["shift_id"]), dtype=np.int64, count=len(tasks["shift_id"]))
+    alert_shift = np.fromiter((index[s] for s in alerts["shift_id"]), dtype=np.int64, count=len(alerts["shift_id"]))
+
+    weights = (lookup_weights(tasks["priority"], PRIORITY_WEIGHTS, 1)
+               + lookup_weights(tasks["status"], STATUS_WEIGHTS, 0))
+    task_count = np.bincount(task_shift, minlength=n)
+    task_risk = np.bincount(task_shift, weights=weights, minlength=n).astype(np.int64)
+    alert_count = np.bincount(alert_shift, minlength=n)
+
+    risk = np.minimum(10, (task_risk + 10 * alert_count) // 10)
+    risk[task_count == 0] = 0  # a shift without tasks scores 0 whatever its alerts
+    return risk, risk >= RISK_THRESHOLD
+
+
+async def stream_columns(db, build, columns: list, shift_ids: list, row_page: int) -> dict:
+    """
+    All rows of build() for these shifts, keyset-paged by id until an empty page, as {column: [values]}.
+    """
+    out = {column: [] for column in columns}
+    last_id = None
+    while True:
+        query = build(db).in_("shift_id", shift_ids).order("id").limit(row_page)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = (await execute(query)).data or []
+        if not rows:
+            return out
+        for row in rows:
+            for column in columns:
+                out[column].append(row.get(column))
+        # A short page is not the end: the server may cap rows per response below row_page
+        last_id = rows[-1]["id"]
+
+
+async def write_scores(db, changed: list) -> int:
+    """changed: [(shift_id, risk, escalated)]. One update per (risk, escalated) group and id chunk."""
+    groups = defaultdict(list)
+    for shift_id, risk, escalated in changed:
+        groups[(risk, escalated)].append(shift_id)
+    writes = 0
+    for (risk, escalated), ids in groups.items():
+        for start in range(0, len(ids), WRITE_CHUNK):
+            await execute(db.table("shifts")
+                .update({"risk_score": risk, "is_high_risk": escalated})
+                .in_("id", ids[start:start + WRITE_CHUNK]))
+            writes += 1
+    return writes
+
+
+async def recompute(shift_page: int = 200, row_page: int = 1000, dry_run: bool = False,
+                    show_scores: bool = False, report=print) -> dict:
+    """Runs the job. Returns totals plus the escalation changes (shift id, name, old/new score and flag)."""
+    db = await get_client()
+    totals = {"shifts": 0, "tasks": 0, "alerts": 0, "score_changed": 0, "escalated": 0, "deescalated": 0,
+              "writes": 0, "dry_run": dry_run}
+    escalation_changes = []
+    last_id = None
+    started = time.perf_counter()
+
+    while True:
+        query = db.table("shifts").select("id, name, is_active, risk_score, is_high_risk").order("id").limit(shift_page)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = (await execute(query)).data or []
+        if not page:
+            break
+        last_id = page[-1]["id"]
+        shifts = [s for s in page if not s.get("is_active")]
+        if not shifts:
+            continue
+        shift_ids = [s["id"] for s in shifts]
+
+        tasks = await stream_columns(db, lambda d: d.table("tasks").select("id, shift_id, priority, status"),
+                                     ["shift_id", "priority", "status"], shift_ids, row_page)
+        alerts = await stream_columns(db, lambda d: d.table("alerts").select("id, shift_id").eq("is_active", True),
+                                      ["shift_id"], shift_ids, row_page)
+        risk, escalated = score_shifts(shift_ids, tasks, alerts)
+
+        changed = []
+        for shift, new_risk, new_flag in zip(shifts, risk.tolist(), escalated.tolist()):
+            old_risk, old_flag = shift.get("risk_score") or 0, bool(shift.get("is_high_risk"))
+            if (new_risk, new_flag) == (old_risk, old_flag):
+                continue
+            changed.append((shift["id"], new_risk, new_flag))
+            if new_flag != old_flag:
+                escalation_changes.append({"shift_id": shift["id"], "name": shift.get("name"),
+                                           "old_risk": old_risk, "new_risk": new_risk,
+                                           "old_high_risk": old_flag, "new_high_risk": new_flag})
+                totals["escalated" if new_flag else "deescalated"] += 1
+                if report:
+                    report(f"{'ESCALATE' if new_flag else 'CLEAR':>8}  {shift.get('name')} ({shift['id']}): "
+                           f"risk {old_risk} -> {new_risk}")
+            elif show_scores and report:
+                report(f"{'SCORE':>8}  {shift.get('name')} ({shift['id']}): risk {old_risk} -> {new_risk}")
+
+        totals["shifts"] += len(shifts)
+        totals["tasks"] += len(tasks["shift_id"])
+        totals["alerts"] += len(alerts["shift_id"])
+        totals["score_changed"] += len(changed)
+        if changed and not dry_run:
+            totals["writes"] += await write_scores(db, changed)
+
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    totals["escalation_changes"] = escalation_changes
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shift-page", type=int, default=200, help="Shifts scored per batch")
+    parser.add_argument("--row-page", type=int, default=1000,
+                        help="Task/alert rows per read (PostgREST caps responses at db-max-rows, 1000 on Supabase)")
+    parser.add_argument("--dry-run", action="store_true", help="Write nothing; print the escalation diff")
+    parser.add_argument("--show-scores", action="store_true", help="Also print score-only changes")
+    args = parser.parse_args()
+
+    totals = asyncio.run(recompute(args.shift_page, args.row_page, args.dry_run, args.show_scores))
+    verb = "Would change" if args.dry_run else "Changed"
+    print(f"\n{totals['shifts']} shifts ({totals['tasks']} tasks, {totals['alerts']} alerts) in {totals['seconds']}s. "
+          f"{verb} {totals['score_changed']} scores: {totals['escalated']} newly high risk, "
+          f"{totals['deescalated']} cleared. {totals['writes']} update calls.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Resilience primitives for the Supabase data path (wired in by db_client.execute / execute_read).
+- Request budget: a deadline set once per HTTP request (contextvar, so it follows every query and hedge the
+  request spawns); each query gets min(its own timeout, time left) and fails fast once the budget is spent.
+- Circuit breaker: opens when the failure rate over a sliding window spikes, fails calls immediately while
+  open, and lets a single probe through after a cool-down. Only transport failures and timeouts count;
+  PostgREST errors (4xx, constraint violations) mean the database answered.
+- Hedged reads: an idempotent read still pending after the recent p95 read latency gets one duplicate
+  request; the first answer wins and the other is cancelled.
+- Last known good: successful reads are remembered by key and served (flagged stale) when a read fails or
+  the breaker is open.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import httpx
+
+DB_REQUEST_BUDGET_MS = float(os.getenv("DB_REQUEST_BUDGET_MS", "5000"))
+DB_HEDGE_ENABLED = os.getenv("DB_HEDGE", "1") == "1"
+# Fixed hedge delay; 0 = adaptive (p95 of recent reads, clamped to [DB_HEDGE_MIN_MS, DB_HEDGE_MAX_MS])
+DB_HEDGE_AFTER_MS = float(os.getenv("DB_HEDGE_AFTER_MS", "0"))
+DB_HEDGE_MIN_MS = float(os.getenv("DB_HEDGE_MIN_MS", "20"))
+DB_HEDGE_MAX_MS = float(os.getenv("DB_HEDGE_MAX_MS", "1000"))
+DB_BREAKER_FAILURE_RATE = float(os.getenv("DB_BREAKER_FAILURE_RATE", "0.5"))
+DB_BREAKER_MIN_CALLS = int(os.getenv("DB_BREAKER_MIN_CALLS", "10"))
+DB_BREAKER_WINDOW_SECONDS = float(os.getenv("DB_BREAKER_WINDOW_SECONDS", "30"))
+DB_BREAKER_OPEN_SECONDS = float(os.getenv("DB_BREAKER_OPEN_SECONDS", "5"))
+DB_LAST_GOOD_MAX_KEYS = int(os.getenv("DB_LAST_GOOD_MAX_KEYS", "256"))
+
+# Errors that say "the backend is unhealthy" (as opposed to "the backend said no")
+UNAVAILABLE_ERRORS = (TimeoutError, ConnectionError, OSError, httpx.TransportError)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's DB budget ran out before (or while) this query ran."""
+
+
+class CircuitOpenError(ConnectionError):
+    """The breaker is open: the query was not sent."""
+
+
+# --- request budget ---
+
+_deadline = contextvars.ContextVar("db_deadline", default=None)
+
+
+@contextmanager
+def request_budget(seconds: float = DB_REQUEST_BUDGET_MS / 1000):
+    """Every query awaited inside shares this budget. Nested budgets can only tighten it."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def separate_budget(seconds: float = DB_REQUEST_BUDGET_MS / 1000):
+    """
+    A fresh budget that replaces the current one instead of tightening it, for DB work that follows slow
+    non-DB work inside one request (the shift summary insert after the Gemini call).
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget():
+    """Seconds left in the current request budget, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+# --- circuit breaker ---
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_rate: float = DB_BREAKER_FAILURE_RATE, min_calls: int = DB_BREAKER_MIN_CALLS,
+                 window_seconds: float = DB_BREAKER_WINDOW_SECONDS, open_seconds: float = DB_BREAKER_OPEN_SECONDS):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._outcomes = deque()  # (monotonic, ok)
+            self._opened_at = 0.0
+            self._probe_in_flight = False
+            self._opened = 0
+            self._rejected = 0
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._state, self._opened_at = self.OPEN, now
+                    self._opened += 1
+                return
+            self._outcomes.append((now, ok))
+            self._trim(now)
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._state, self._opened_at = self.OPEN, now
+                self._opened += 1
+
+    def release(self):
+        """A call that was let through ended without an outcome (cancelled): free the half-open probe slot."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 4) if calls else 0.0,
+                "times_opened": self._opened,
+                "rejected": self._rejected,
+            }
+
+
+# --- hedging ---
+
+class ReadLatency:
+    """Recent read latencies; the hedge fires once a read outlives their p95."""
+
+    def __init__(self, maxlen: int = 512):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=maxlen)
+
+    def add(self, ms: float):
+        with self._lock:
+            self._samples.append(ms)
+
+    def hedge_after_ms(self) -> float:
+        if DB_HEDGE_AFTER_MS > 0:
+            return DB_HEDGE_AFTER_MS
+        with self._lock:
+            if len(self._samples) < 20:
+                return DB_HEDGE_MAX_MS  # not enough history: hedge only the obviously stuck
+            ordered = sorted(self._samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return max(DB_HEDGE_MIN_MS, min(DB_HEDGE_MAX_MS, p95))
+
+
+async def hedged(call, delay_seconds: float, on_hedge=None):
+    """
+    Awaits call(); if it hasn't finished after delay_seconds, starts a second call() and returns whichever
+    succeeds first (the loser is cancelled). Raises the first error only if both fail.
+    Returns (result, hedge_won).
+    """
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay_seconds)
+        if done:
+            return tasks[0].result(), False
+
+        if on_hedge:
+            on_hedge()
+        tasks.append(asyncio.ensure_future(call()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is tasks[1]
+                error = error or task.exception()
+        raise error
+    finally:
+        # Cancels the loser (or both, if our caller gave up)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+# --- last known good ---
+
+class LastGood:
+    def __init__(self, max_keys: int = DB_LAST_GOOD_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._values = OrderedDict()  # key -> (data, stored_at)
+
+    def put(self, key, data):
+        with self._lock:
+            self._values[key] = (data, time.time())
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_keys:
+                self._values.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
@@ -0,0 +1,273 @@
+"""
+In-memory risk time-series per shift, for trend charts that must not rebuild risk from tasks/alerts.
+- evaluate_shift_risk records every result here. A point equal to the previous one is skipped unless
+  RISK_HISTORY_HEARTBEAT_SECONDS have passed, so a quiet shift costs nothing and the chart still reaches "now".
+- Each shift keeps a fixed-size ring (RISK_HISTORY_POINTS) of timestamp / score / high-risk flag in NumPy
+  arrays; the oldest point is overwritten when it is full. At most RISK_HISTORY_MAX_SHIFTS shifts are kept
+  (least recently recorded evicted).
+- Every RISK_HISTORY_FLUSH_SECONDS the points recorded since the last flush go to the outbox as
+  `shift_risk_history` rows (sql/004_shift_risk_history.sql), so they survive restarts without a write per
+  evaluation. Points older than a ring's oldest entry are merged back from that table once per ring
+  (backfill), so a ring that was just created by one evaluation still shows the earlier trend.
+- Rings are per process: under serve.py's pre-fork workers, points recorded by other workers after the
+  backfill only reach this worker's ring after a restart / eviction.
+- query() downsamples into fixed time buckets (max / mean / last) for /shift/risk/history.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+from outbox import outbox
+
+RISK_HISTORY_POINTS = int(os.getenv("RISK_HISTORY_POINTS", "2048"))
+RISK_HISTORY_MAX_SHIFTS = int(os.getenv("RISK_HISTORY_MAX_SHIFTS", "64"))
+RISK_HISTORY_HEARTBEAT_SECONDS = float(os.getenv("RISK_HISTORY_HEARTBEAT_SECONDS", "60"))
+RISK_HISTORY_FLUSH_SECONDS = float(os.getenv("RISK_HISTORY_FLUSH_SECONDS", "30"))
+
+HISTORY_TABLE = "shift_risk_history"
+AGGREGATES = ("max", "mean", "last")
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class _Ring:
+    def __init__(self, capacity: int):
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.risk = np.zeros(capacity, dtype=np.int8)
+        self.flag = np.zeros(capacity, dtype=np.bool_)
+        self.written = 0  # points ever appended; slot = written % capacity
+        self.flushed = 0  # value of `written` at the last flush
+        self.backfilled = False  # older stored points merged in (RiskHistory.backfill)
+
+    def append(self, ts: float, risk: int, flag: bool):
+        slot = self.written % len(self.ts)
+        self.ts[slot], self.risk[slot], self.flag[slot] = ts, risk, flag
+        self.written += 1
+
+    def last(self):
+        if not self.written:
+            return None
+        slot = (self.written - 1) % len(self.ts)
+        return self.ts[slot], int(self.risk[slot]), bool(self.flag[slot])
+
+    def ordered(self, since_written: int = 0):
+        """(ts, risk, flag) arrays oldest first, limited to points appended after `since_written`."""
+        capacity = len(self.ts)
+        count = min(self.written - since_written, self.written, capacity)
+        if count <= 0:
+            return self.ts[:0], self.risk[:0], self.flag[:0]
+        order = np.arange(self.written - count, self.written) % capacity
+        return self.ts[order], self.risk[order], self.flag[order]
+
+
+class RiskHistory:
+    def __init__(self, points: int = RISK_HISTORY_POINTS, max_shifts: int = RISK_HISTORY_MAX_SHIFTS,
+                 heartbeat_seconds: float = RISK_HISTORY_HEARTBEAT_SECONDS,
+                 flush_seconds: float = RISK_HISTORY_FLUSH_SECONDS):
+        self.points = points
+        self.max_shifts = max_shifts
+        self.heartbeat_seconds = heartbeat_seconds
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._rings = OrderedDict()  # shift_id -> _Ring, least recently recorded first
+        self._task = None
+        self._recorded = 0
+        self._skipped = 0
+        self._lost = 0  # overwritten before they were flushed
+        self._flushed_rows = 0
+        self._backfills = 0
+
+    def record(self, shift_id: str, risk: int, escalated: bool, ts: float = None):
+        ts = time.time() if ts is None else ts
+        evicted = None
+        with self._lock:
+            ring = self._rings.get(shift_id)
+            if ring is None:
+                ring = self._rings[shift_id] = _Ring(self.points)
+                if len(self._rings) > self.max_shifts:
+                    evicted = self._rings.popitem(last=False)
+            self._rings.move_to_end(shift_id)
+
+            last = ring.last()
+            if last and last[1:] == (risk, bool(escalated)) and ts - last[0] < self.heartbeat_seconds:
+                self._skipped += 1
+            else:
+                if ring.written - ring.flushed >= self.points:
+                    self._lost += 1
+                ring.append(ts, risk, escalated)
+                self._recorded += 1
+        if evicted:
+            self._enqueue(*self._take_unflushed(*evicted))
+
+    def oldest(self, shift_id: str):
+        """Timestamp of the oldest point held for a shift, or None."""
+        with self._lock:
+            ring = self._rings.get(shift_id)
+            ts, _, _ = ring.ordered() if ring else (np.zeros(0), None, None)
+            return float(ts[0]) if len(ts) else None
+
+    def backfilled(self, shift_id: str) -> bool:
+        with self._lock:
+            ring = self._rings.get(shift_id)
+            return bool(ring and ring.backfilled)
+
+    def backfill(self, shift_id: str, rows: list):
+        """
+        Merges stored points (shift_risk_history rows) older than the shift's oldest held point into its ring,
+        keeping the newest RISK_HISTORY_POINTS. Done once per ring: afterwards the ring only grows from this
+        process's own evaluations.
+        """
+        stored = sorted(
+            (datetime.fromisoformat(str(row["recorded_at"]).replace("Z", "+00:00")).timestamp(),
+             row.get("risk_score") or 0, bool(row.get("is_high_risk")))
+            for row in rows
+        )
+        evicted = None
+        with self._lock:
+            ring = self._rings.get(shift_id)
+            if ring is None:
+                ring = self._rings[shift_id] = _Ring(self.points)
+                if len(self._rings) > self.max_shifts:
+                    evicted = self._rings.popitem(last=False)
+            if not ring.backfilled:
+                ts, risk, flag = ring.ordered()
+                older = [point for point in stored if not len(ts) or point[0] < ts[0]]
+                merged = _Ring(self.points)
+                for point in older + list(zip(ts.tolist(), risk.tolist(), flag.tolist())):
+                    merged.append(*point)
+                # This process's unflushed points are the newest ones; everything before them is stored
+                merged.flushed = merged.written - min(ring.written - ring.flushed, self.points)
+                merged.backfilled = True
+                self._rings[shift_id] = merged
+                self._backfills += 1
+        if evicted:
+            self._enqueue(*self._take_unflushed(*evicted))
+
+    def query(self, shift_id: str, window_seconds: float = None, bucket_seconds: float = None,
+              max_points: int = 120, agg: str = "max") -> dict:
+        """
+        Points for one shift, oldest first, downsampled into buckets of bucket_seconds (default: the window
+        split into max_points buckets). Each bucket reports the max, mean or last score and whether the shift
+        was high risk at any point in it. Raises ValueError for a bad agg or bucket size.
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+        if bucket_seconds is not None and bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        max_points = max(1, max_points)
+
+        with self._lock:
+            ring = self._rings.get(shift_id)
+            ts, risk, flag = ring.ordered() if ring else (np.zeros(0), np.zeros(0, np.int8), np.zeros(0, np.bool_))
+        if window_seconds is not None and len(ts):
+            keep = ts >= time.time() - window_seconds
+            ts, risk, flag = ts[keep], risk[keep], flag[keep]
+
+        result = {"shift_id": shift_id, "agg": agg, "raw_points": int(len(ts)), "bucket_seconds": bucket_seconds,
+                  "points": []}
+        if not len(ts):
+            return result
+
+        if bucket_seconds is None:
+            span = float(ts[-1] - ts[0])
+            if len(ts) <= max_points or span <= 0:
+                result["points"] = [{"t": _iso(t), "risk": int(r), "high_risk": bool(f)}
+                                    for t, r, f in zip(ts.tolist(), risk.tolist(), flag.tolist())]
+                return result
+            # Rounded up to the millisecond and strictly wider than span / max_points: at most max_points buckets
+            bucket_seconds = math.floor(span / max_points * 1000 + 1) / 1000
+            result["bucket_seconds"] = bucket_seconds
+            origin = float(ts[0])
+        else:
+            origin = math.floor(ts[0] / bucket_seconds) * bucket_seconds
+        bucket = ((ts - origin) // bucket_seconds).astype(np.int64)
+        # Points are time-ordered, so each bucket is a contiguous run starting at `starts`
+        ids, starts = np.unique(bucket, return_index=True)
+        ends = np.append(starts[1:], len(ts))
+        if agg == "max":
+            values = np.maximum.reduceat(risk, starts).astype(np.float64)
+        elif agg == "mean":
+            values = np.add.reduceat(risk.astype(np.float64), starts) / (ends - starts)
+        else:
+            values = risk[ends - 1].astype(np.float64)
+        high = np.maximum.reduceat(flag, starts)
+
+        result["points"] = [
+            {"t": _iso(origin + i * bucket_seconds), "risk": round(v, 2) if agg == "mean" else int(v),
+             "high_risk": bool(h), "samples": int(n)}
+            for i, v, h, n in zip(ids.tolist(), values.tolist(), high.tolist(), (ends - starts).tolist())
+        ][-max_points:]
+        return result
+
+    # --- flushing ---
+
+    def _take_unflushed(self, shift_id: str, ring: _Ring):
+        ts, risk, flag = ring.ordered(ring.flushed)
+        ring.flushed = ring.written
+        return shift_id, ts, risk, flag
+
+    def _enqueue(self, shift_id, ts, risk, flag) -> int:
+        if not len(ts):
+            return 0
+        outbox.enqueue(HISTORY_TABLE, [
+            {"shift_id": shift_id, "recorded_at": _iso(t), "risk_score": int(r), "is_high_risk": bool(f)}
+            for t, r, f in zip(ts.tolist(), risk.tolist(), flag.tolist())
+        ])
+        with self._lock:
+            self._flushed_rows += len(ts)
+        return len(ts)
+
+    def flush_once(self) -> int:
+        """Hands every point recorded since the last flush to the outbox. Returns rows handed over."""
+        with self._lock:
+            batches = [self._take_unflushed(shift_id, ring) for shift_id, ring in self._rings.items()
+                       if ring.written > ring.flushed]
+        return sum(self._enqueue(*batch) for batch in batches)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                self.flush_once()
+            except Exception as e:
+                print("RISK HISTORY ERROR:", e)
+
+    def start(self):
+        """Starts the periodic flush on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the periodic flush and hands the remaining points to the outbox (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush_once()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shifts": len(self._rings),
+                "points_per_shift": self.points,
+                "recorded": self._recorded,
+                "skipped_unchanged": self._skipped,
+                "unflushed": sum(min(r.written - r.flushed, self.points) for r in self._rings.values()),
+                "flushed_rows": self._flushed_rows,
+                "lost_before_flush": self._lost,
+                "backfills": self._backfills,
+            }
+
+
+risk_history = RiskHistory()
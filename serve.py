@@ -0,0 +1,131 @@
+"""
+Pre-fork serving mode.
+The master process loads both NLP models ONCE, then forks N uvicorn workers that share the weights
+copy-on-write and accept on one shared listening socket. Torch intra-op threads are split across
+workers so they don't oversubscribe the cores.
+
+Usage:
+    python serve.py --workers 4 [--host 0.0.0.0] [--port 8000] [--threads-per-worker N]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="Torch intra-op threads per worker (default: cores // workers)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, threads: int, log_level: str):
+    import torch
+    torch.set_num_threads(threads)
+
+    config = uvicorn.Config(app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main():
+    args = parse_args()
+    cores = os.cpu_count() or 1
+    threads = args.threads_per_worker or max(1, cores // args.workers)
+
+    # The master must never spin up a multi-threaded OpenMP pool: forking after one exists can
+    # deadlock the children. Load + warm up single-threaded; each worker sets its own count.
+    import torch
+    torch.set_num_threads(1)
+
+    # Per-process state (the risk accumulator's published-score cache, the active shift cache TTL) must know it isn't alone
+    os.environ["SERVE_WORKERS"] = str(args.workers)
+    from main import app
+    from nlp.engine import nlp_engine_instance
+
+    if nlp_engine_instance.backend == "torch":
+        print(f"Master {os.getpid()}: loading NLP models before fork...")
+        nlp_engine_instance.load()
+        if not nlp_engine_instance.is_ready():
+            sys.exit(f"NLP load failed: {nlp_engine_instance.load_error}")
+    else:
+        # ONNX Runtime sessions own native thread pools that don't survive fork(); load per worker instead
+        print(f"Backend '{nlp_engine_instance.backend}' is not fork-safe. Each worker loads its own copy.")
+
+    # Move everything allocated so far out of the GC's reach, so collections in the
+    # workers don't write to (and un-share) the pages holding the model objects.
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(f"Master {os.getpid()}: {args.workers} workers x {threads} torch threads on {args.host}:{args.port}")
+
+    children = {}
+    shutting_down = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(app, sock, threads, args.log_level)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(args.workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or shutting_down:
+            continue
+        print(f"Worker {pid} exited with status {status}. Respawning.")
+        if time.time() - started < 1:
+            time.sleep(1)  # crash loop guard
+        spawn()
+
+    sock.close()
+    print("Master: all workers stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+_MISSING = object()
+
+
+class ActiveShiftCache:
+    """
+    Process-local cache of the active shift row (or None when no shift is active).
+    - Shared by every db_service caller, so /chat, /shift/* and create_task stop re-querying `is_active`.
+    - invalidate() is called by end_active_shift; the TTL is only a backstop for changes made outside the app.
+    - Concurrent misses are coalesced: one coroutine queries Supabase, the others await its result.
+    - Loader errors are never cached.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self._value = _MISSING
+        self._stored_at = 0.0
+        self._generation = 0
+
+        self._pending = None  # future of the in-flight load, joined by concurrent misses
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._db_calls = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _lookup(self):
+        """Returns the cached value or _MISSING. Caller holds self._lock."""
+        if self._value is _MISSING:
+            return _MISSING
+        if time.monotonic() - self._stored_at > self.ttl_seconds:
+            self._value = _MISSING
+            self._expirations += 1
+            return _MISSING
+        return self._value
+
+    async def get(self, loader):
+        """Returns the active shift, awaiting loader() (which may raise) only on a miss."""
+        if not self.enabled:
+            with self._lock:
+                self._db_calls += 1
+            return await loader()
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            value = self._lookup()
+            if value is not _MISSING:
+                self._hits += 1
+                return _copy(value)
+
+            # Another request on this loop is already loading: share its result
+            pending = self._pending
+            if pending is not None and pending.get_loop() is loop:
+                self._hits += 1
+            else:
+                pending = None
+                self._misses += 1
+                self._db_calls += 1
+                generation = self._generation
+                future = self._pending = loop.create_future()
+
+        if pending is not None:
+            return _copy(await asyncio.shield(pending))
+
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            with self._lock:
+                if self._pending is future:
+                    self._pending = None
+
+        with self._lock:
+            # Don't store a row read before an invalidate() that raced with this load
+            if generation == self._generation:
+                self._value = value
+                self._stored_at = time.monotonic()
+        future.set_result(value)
+        return _copy(value)
+
+    def invalidate(self):
+        with self._lock:
+            self._value = _MISSING
+            self._pending = None  # later callers must not join a load that started before this
+            self._generation += 1
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl_seconds,
+                "cached": self._value is not _MISSING,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "db_calls": self._db_calls,
+                "db_calls_saved": self._hits,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+def _copy(value):
+    return dict(value) if isinstance(value, dict) else value
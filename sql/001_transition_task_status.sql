@@ -0,0 +1,47 @@
+-- Single-round-trip status transition by task code (used by /chat via db_service.transition_task_status_by_code).
+-- Looks the task up, refuses to touch DONE tasks, updates it and reports previous/new status in ONE statement.
+-- Zero rows back = task code not found; updated = false = task was already DONE.
+--
+-- Apply once per database (Supabase SQL editor or psql) before deploying the backend:
+--     psql "$DATABASE_URL" -f sql/001_transition_task_status.sql
+
+create or replace function transition_task_status(
+    p_task_code tasks.task_code%type,
+    p_new_status tasks.status%type
+)
+returns table (
+    task_id tasks.id%type,
+    previous_status text,
+    current_status text,
+    updated boolean
+)
+language plpgsql
+as $$
+declare
+    v_id tasks.id%type;
+    v_previous tasks.status%type;
+begin
+    -- Row lock so two concurrent transitions on the same task serialize
+    select t.id, t.status into v_id, v_previous
+    from tasks t
+    where t.task_code = p_task_code
+    limit 1
+    for update;
+
+    if not found then
+        return;
+    end if;
+
+    if v_previous = 'DONE' then
+        return query select v_id, v_previous::text, v_previous::text, false;
+        return;
+    end if;
+
+    update tasks
+    set status = p_new_status,
+        completed_at = case when p_new_status = 'DONE' then now() else null end
+    where id = v_id;
+
+    return query select v_id, v_previous::text, p_new_status::text, true;
+end;
+$$;
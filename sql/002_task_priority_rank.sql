@@ -0,0 +1,22 @@
+-- Server-side ordering + keyset pagination for GET /shift/tasks (db_service.get_shift_tasks).
+-- priority_rank mirrors the old in-Python priority_order (CRITICAL first); ties break on created_at, then id.
+-- The composite index serves "WHERE shift_id = ? ORDER BY priority_rank, created_at, id LIMIT n" and the
+-- cursor predicate without sorting the shift, so page latency stays flat as shifts grow.
+--
+-- Apply once per database:
+--     psql "$DATABASE_URL" -f sql/002_task_priority_rank.sql
+
+alter table tasks
+    add column if not exists priority_rank smallint
+    generated always as (
+        case priority
+            when 'CRITICAL' then 0
+            when 'HIGH' then 1
+            when 'MEDIUM' then 2
+            when 'LOW' then 3
+            else 4
+        end
+    ) stored;
+
+create index if not exists tasks_shift_priority_created_idx
+    on tasks (shift_id, priority_rank, created_at, id);
@@ -0,0 +1,61 @@
+-- Atomic shift rotation (used by /shift/end via db_service.end_active_shift).
+-- The backend passes the shift it believes is active and its successor from the cached ring order; the
+-- function checks that belief under a row lock and flips both rows in ONE update, so concurrent readers
+-- (/chat, /shift/status) see either the old or the new active shift, never none or two.
+--   rotated = true                          -> p_to_shift_id is now active
+--   rotated = false, active_shift_id = ...  -> p_from_shift_id was no longer active (already rotated); nothing changed
+--   zero rows                               -> p_to_shift_id is not the successor in sequence_order (stale
+--                                              ring cache: shift added, removed or reordered); nothing changed
+--
+-- Apply once per database:
+--     psql "$DATABASE_URL" -f sql/003_rotate_shift.sql
+
+create or replace function rotate_shift(
+    p_from_shift_id shifts.id%type,
+    p_to_shift_id shifts.id%type
+)
+returns table (
+    rotated boolean,
+    active_shift_id shifts.id%type
+)
+language plpgsql
+as $$
+declare
+    v_active shifts.id%type;
+    v_next shifts.id%type;
+begin
+    -- Serializes concurrent rotations: the second caller waits here, then sees the new active shift
+    select s.id into v_active
+    from shifts s
+    where s.is_active
+    order by s.sequence_order
+    limit 1
+    for update;
+
+    if v_active is distinct from p_from_shift_id then
+        return query select false, v_active;
+        return;
+    end if;
+
+    -- The ring is cached by the caller; the successor is checked here, wrapping to the first shift
+    select s.id into v_next
+    from shifts s
+    where s.sequence_order > (select a.sequence_order from shifts a where a.id = v_active)
+    order by s.sequence_order
+    limit 1;
+
+    if v_next is null then
+        select s.id into v_next from shifts s order by s.sequence_order limit 1;
+    end if;
+
+    if v_next is distinct from p_to_shift_id then
+        return;
+    end if;
+
+    update shifts
+    set is_active = (id = p_to_shift_id)
+    where id in (p_from_shift_id, p_to_shift_id);
+
+    return query select true, p_to_shift_id;
+end;
+$$;
@@ -0,0 +1,18 @@
+-- Risk trend per shift (risk_history.py). The backend keeps recent evaluations in memory and flushes them
+-- here through the outbox every RISK_HISTORY_FLUSH_SECONDS; rows carry a client-side uuid so a retried
+-- flush never duplicates a point. Read back only to re-seed a shift the serving process has no points
+-- for (db_service.get_shift_risk_history), newest first through the index.
+--
+-- Apply once per database:
+--     psql "$DATABASE_URL" -f sql/004_shift_risk_history.sql
+
+create table if not exists shift_risk_history (
+    id uuid primary key,
+    shift_id uuid not null references shifts (id) on delete cascade,
+    recorded_at timestamptz not null,
+    risk_score smallint not null,
+    is_high_risk boolean not null
+);
+
+create index if not exists shift_risk_history_shift_recorded_idx
+    on shift_risk_history (shift_id, recorded_at desc);
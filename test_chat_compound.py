@@ -0,0 +1,65 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+import db_service
+import main
+from fake_supabase import FakeSupabase, seed_demo
+
+
+def clause(text: str, intent: str, **entities) -> dict:
+    """An NLP result as process_clauses_async returns it."""
+    return {"clause": text, "intent": intent, "confidence": 0.95, "entities": entities}
+
+
+async def run_tests():
+    fake = FakeSupabase()
+    shift_id = seed_demo(fake, tasks=4)
+    db_client.use_client(fake)
+    db_service.active_shift_cache.invalidate()
+    codes = [t["task_code"] for t in fake.tables["tasks"] if t["shift_id"] == shift_id]
+
+    print("\n--- TEST 1: Clauses are reported one by one ---")
+    result = await main.chat_compound(shift_id, [
+        clause(f"{codes[0]} done", "COMPLETE_TASK", task_code=codes[0]),
+        clause(f"{codes[1]} waiting for lab report", "BLOCK_TASK", task_code=codes[1], block_reason="lab report"),
+        clause("code blue in ward 5", "ALERT", alert_message="code blue in ward 5"),
+    ])
+    print(f"Clause statuses (Expected ['success', 'success', 'success']): {[c['status'] for c in result['data']['clauses']]}")
+
+    print("\n--- TEST 2: A later clause for the same task supersedes an earlier one ---")
+    result = await main.chat_compound(shift_id, [
+        clause(f"{codes[2]} blocked due to x", "BLOCK_TASK", task_code=codes[2], block_reason="x"),
+        clause(f"{codes[2]} done", "COMPLETE_TASK", task_code=codes[2]),
+    ])
+    clauses = result["data"]["clauses"]
+    task = next(t for t in fake.tables["tasks"] if t["task_code"] == codes[2])
+    print(f"Clause statuses (Expected ['error', 'success']): {[c['status'] for c in clauses]}")
+    print(f"Earlier clause says why (Expected True): {clauses[0]['message'].startswith('Superseded')}")
+    print(f"Stored status (Expected DONE): {task['status']}")
+
+    print("\n--- TEST 3: A failed alert insert fails the clauses that raised it ---")
+    create_alerts = main.create_alerts
+
+    async def failing_create_alerts(alerts):
+        return None, "Failed to log alerts"
+
+    main.create_alerts = failing_create_alerts
+    result = await main.chat_compound(shift_id, [
+        clause(f"{codes[3]} waiting for porter", "BLOCK_TASK", task_code=codes[3], block_reason="porter"),
+        clause("code blue in ward 5", "ALERT", alert_message="code blue in ward 5"),
+    ])
+    main.create_alerts = create_alerts
+    print(f"Clause statuses (Expected ['error', 'error']): {[c['status'] for c in result['data']['clauses']]}")
+    print(f"Overall status (Expected error): {result['status']}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,183 @@
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+import db_service
+from postgrest.exceptions import APIError
+
+from fake_supabase import FakeSupabase, seed_demo
+
+
+async def run_tests():
+    fake = FakeSupabase()
+    shift_id = seed_demo(fake, shifts=2, tasks=7)
+    db_client.use_client(fake)
+    db_service.active_shift_cache.invalidate()
+
+    print("\n--- TEST 1: Query builder basics ---")
+    db = await db_client.get_client()
+    active = (await db.table("shifts").select("id, name").eq("is_active", True).single().execute()).data
+    print(f"Active shift (Expected Morning): {active['name']}")
+    open_tasks = (await db.table("tasks").select("task_id:id, status").neq("status", "DONE").limit(3).execute()).data
+    print(f"Limited + aliased (Expected 3 ['status', 'task_id']): {len(open_tasks)} {sorted(open_tasks[0])}")
+    try:
+        await db.table("shifts").select("*").eq("id", "missing").single().execute()
+        print("single() on no rows (Expected APIError): no error")
+    except Exception as e:
+        print(f"single() on no rows (Expected APIError): {type(e).__name__}")
+
+    print("\n--- TEST 2: db_service keyset pagination runs unchanged ---")
+    seen = []
+    cursor = None
+    while True:
+        page = await db_service.get_shift_tasks(shift_id, limit=3, cursor=cursor)
+        seen += [t["priority"] for t in page["tasks"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    print(f"Tasks paged (Expected 7): {len(seen)}")
+    print(f"Priority order (Expected CRITICAL first, LOW last): {seen[0]} ... {seen[-1]}")
+    forged = [
+        [0, '2024-01-01T00:00:00+00:00",id.gt.0),status.eq.DONE,and(id.eq."', fake.tables["tasks"][0]["id"]],
+        [0, "2024-01-01T00:00:00+00:00", "0),status.eq.DONE"],
+        [True, "2024-01-01T00:00:00+00:00", fake.tables["tasks"][0]["id"]],
+    ]
+    rejected = 0
+    for key in forged:
+        try:
+            await db_service.get_shift_tasks(shift_id, cursor=base64.urlsafe_b64encode(json.dumps(key).encode()).decode())
+        except ValueError:
+            rejected += 1
+    print(f"Forged cursors rejected (Expected 3): {rejected}")
+
+    print("\n--- TEST 3: Writes and the transition RPC ---")
+    task, err, code = await db_service.create_task("Check drip rate", "house")
+    print(f"Created (Expected 201 T-*): {code} {task['task_code'][:2]}*")
+    result, err, code = await db_service.transition_task_status_by_code(task["task_code"], "DONE")
+    print(f"Transition (Expected 200 TODO->DONE): {code} {result['previous_status']}->{result['current_status']}")
+    _, err, code = await db_service.transition_task_status_by_code(task["task_code"], "TODO")
+    print(f"DONE guard (Expected 400): {code}")
+    deleted = (await db.table("tasks").delete().eq("id", task["id"]).execute()).data
+    print(f"Deleted rows (Expected 1): {len(deleted)}")
+
+    print("\n--- TEST 4: Injected latency is paid per round trip ---")
+    slow = FakeSupabase(latency_ms=20)
+    seed_demo(slow, tasks=1)
+    start = time.perf_counter()
+    await asyncio.gather(*(slow.table("tasks").select("*").execute() for _ in range(10)))
+    concurrent_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(3):
+        await slow.table("tasks").select("*").execute()
+    serial_ms = (time.perf_counter() - start) * 1000
+    print(f"10 concurrent calls overlap (Expected < 100ms): {concurrent_ms < 100}")
+    print(f"3 serial calls (Expected >= 60ms): {serial_ms >= 60}")
+    print(f"Round trips counted (Expected 13): {slow.stats()['round_trips']}")
+
+    print("\n--- TEST 5: Atomic shift rotation ---")
+    db_service.active_shift_cache.invalidate()
+    db_service.shift_ring_cache.invalidate()
+    data, err = await db_service.end_active_shift()
+    print(f"Rotated (Expected Morning -> Evening): {data['previous_shift']} -> {data['current_shift']}")
+    results = await asyncio.gather(db_service.end_active_shift(), db_service.end_active_shift())
+    print(f"Double submit rotates once (Expected 1 'Shift was already rotated'): "
+          f"{sum(1 for _, e in results if e is None)} {[e for _, e in results if e][0]!r}")
+    # Insert a shift between Morning and Evening behind the cache's back
+    next(s for s in fake.tables["shifts"] if s["name"] == "Evening")["sequence_order"] = 3
+    fake.tables["shifts"].append(fake.with_defaults("shifts", {"name": "Overflow", "sequence_order": 2}))
+    data, err = await db_service.end_active_shift()
+    print(f"Stale cached ring is corrected (Expected Morning -> Overflow): {data['previous_shift']} -> {data['current_shift']}")
+    active = [s["name"] for s in fake.tables["shifts"] if s["is_active"]]
+    print(f"Active shifts (Expected ['Overflow']): {active}")
+
+    print("\n--- TEST 6: Shift risk is read live, never from the cached shift row ---")
+    db_service.active_shift_cache.invalidate()
+    shift = await db_service.get_active_shift()
+    row = next(s for s in fake.tables["shifts"] if s["id"] == shift["id"])
+    row["risk_score"], row["is_high_risk"] = 10, True  # written by evaluate_shift_risk after caching
+    cached = await db_service.get_active_shift()
+    print(f"Cached row carries no risk (Expected False): {'risk_score' in cached}")
+    live = await db_service.get_shift_risk(shift["id"])
+    print(f"Live risk (Expected 10 True): {live['risk_score']} {live['is_high_risk']}")
+
+    print("\n--- TEST 7: Bulk chunks never duplicate on an ambiguous failure ---")
+    table = fake.table
+
+    def commit_then_drop(name):
+        builder = table(name)
+        if name == "tasks":
+            async def execute():
+                result = builder._run()
+                if builder._op == "insert" and not dropped:
+                    dropped.append(name)
+                    raise ConnectionError("connection reset after the insert committed")
+                return result
+            builder.execute = execute
+        return builder
+
+    def reject_clash(name):
+        builder = table(name)
+        if name == "tasks":
+            async def execute():
+                rows = builder._payload if isinstance(builder._payload, list) else [builder._payload]
+                if builder._op == "insert" and any(row["title"] == "Clash" for row in rows):
+                    raise APIError({"code": "23514", "message": "new row violates check constraint"})
+                return builder._run()
+            builder.execute = execute
+        return builder
+
+    dropped = []
+    fake.table = commit_then_drop
+    before = len(fake.tables["tasks"])
+    items = [{"title": f"Bulk {i}", "assigned_to": "Nurse A"} for i in range(5)]
+    result, err, _ = await db_service.create_tasks_bulk(items, chunk_size=5)
+    titles = [t["title"] for t in fake.tables["tasks"][before:]]
+    print(f"Created / errors (Expected 5 0): {len(result['created'])} {len(result['errors'])}")
+    print(f"Stored once each (Expected 5 True): {len(titles)} {sorted(titles) == sorted(i['title'] for i in items)}")
+
+    fake.table = reject_clash
+    items = [{"title": "Fresh", "assigned_to": "Nurse A"}, {"title": "Clash", "assigned_to": "Nurse A"}]
+    result, err, _ = await db_service.create_tasks_bulk(items, chunk_size=5)
+    print(f"Rejected chunk retried row by row (Expected 1 [1]): {len(result['created'])} "
+          f"{[e['index'] for e in result['errors']]}")
+    fake.table = table
+
+    print("\n--- TEST 8: A task completed after the lookup is reported, not counted ---")
+    todo = [t for t in fake.tables["tasks"] if t["shift_id"] == shift["id"] and t["status"] != "DONE"][:2]
+    racing, other = todo
+
+    def close_first(name):
+        builder = table(name)
+        if name == "tasks":
+            async def execute():
+                if builder._op == "update":
+                    racing["status"] = "DONE"  # closed by another request in between
+                return builder._run()
+            builder.execute = execute
+        return builder
+
+    changed = []
+    task_status_changed = db_service.risk_tracker.task_status_changed
+    db_service.risk_tracker.task_status_changed = lambda task_id, status: changed.append(task_id)
+    fake.table = close_first
+    results, err = await db_service.update_task_statuses_by_code({racing["task_code"]: "BLOCKED",
+                                                                  other["task_code"]: "BLOCKED"})
+    fake.table = table
+    db_service.risk_tracker.task_status_changed = task_status_changed
+    print(f"Raced code (Expected error): {'error' if 'error' in results[racing['task_code']] else 'updated'}")
+    print(f"Other code (Expected BLOCKED): {results[other['task_code']].get('current_status')}")
+    print(f"Risk deltas (Expected 1 True): {len(changed)} {changed == [other['id']]}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
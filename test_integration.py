@@ -1,7 +1,11 @@
 import requests
 import time
 import sys
-from db_service import supabase  # Connect directly to DB to spawn dependencies
+from supabase import create_client
+from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+
+# Sync client straight to the DB to spawn dependencies (the app itself goes through db_client)
+supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
 BASE_URL = "http://localhost:8000"
 
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import tempfile
+
+import db_client
+from outbox import Outbox
+
+
+class FakeUpsert:
+    def __init__(self, db, table, rows):
+        self.db, self.table, self.rows = db, table, rows
+
+    async def execute(self):
+        self.db.calls.append((self.table, len(self.rows)))
+        if any(row.get("shift_id") in self.db.failing for row in self.rows):
+            raise ConnectionError("insert rejected")
+        stored = self.db.tables.setdefault(self.table, [])
+        ids = {row["id"] for row in stored}
+        stored.extend(row for row in self.rows if row["id"] not in ids)  # ignore_duplicates
+
+
+class FakeTable:
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        return FakeUpsert(self.db, self.table, rows)
+
+
+class FakeDB:
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+        self.failing = set()
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+async def run_tests():
+    fake = FakeDB()
+    db_client.use_client(fake)
+    path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+
+    print("\n--- TEST 1: Enqueued rows are durable and get client-side ids ---")
+    box = Outbox(path=path, batch_size=50)
+    queued = box.enqueue("alerts", [{"shift_id": "s1", "weight": 8, "is_active": True} for _ in range(3)])
+    box.enqueue("chat_messages", [{"shift_id": "s1", "message_text": "hello", "message_type": "SYSTEM"}])
+    print(f"Ids assigned (Expected 3): {sum(1 for r in queued if r.get('id'))}")
+    reopened = Outbox(path=path)
+    print(f"Queue depth after reopen (Expected 4): {reopened.stats()['queue_depth']}")
+    print(f"Pending alerts for s1 (Expected 3): {len(reopened.pending('alerts', 's1'))}")
+
+    print("\n--- TEST 2: One multi-row insert per table ---")
+    written = await box.flush_once()
+    print(f"Rows written (Expected 4): {written}")
+    print(f"Insert calls (Expected [('alerts', 3), ('chat_messages', 1)]): {fake.calls}")
+    print(f"Queue depth (Expected 0): {box.stats()['queue_depth']}")
+
+    print("\n--- TEST 3: A failing shift backs off without blocking others, order kept ---")
+    fake.calls.clear()
+    fake.failing.add("bad")
+    box.enqueue("chat_messages", [{"shift_id": "bad", "message_text": "first"}])
+    box.enqueue("chat_messages", [{"shift_id": "ok", "message_text": "other shift"}])
+    box.enqueue("chat_messages", [{"shift_id": "bad", "message_text": "second"}])
+    await box.flush_once()
+    stats = box.stats()
+    print(f"Rows left (Expected 2): {stats['queue_depth']}")
+    print(f"Shifts backing off (Expected 1): {stats['shifts_backing_off']}")
+    print(f"Healthy shift delivered (Expected True): {any(m['shift_id'] == 'ok' for m in fake.tables['chat_messages'])}")
+    print(f"Flush lag reported (Expected True): {stats['flush_lag_seconds'] >= 0}")
+
+    fake.failing.clear()
+    box._backoff.clear()
+    await box.flush_once()
+    delivered = [m["message_text"] for m in fake.tables["chat_messages"] if m["shift_id"] == "bad"]
+    print(f"Per-shift order (Expected ['first', 'second']): {delivered}")
+
+    print("\n--- TEST 4: Retried rows are not duplicated ---")
+    rows = box.enqueue("alerts", [{"shift_id": "s2", "is_active": True}])
+    fake.tables["alerts"].append(dict(rows[0]))  # first attempt landed but the response was lost
+    await box.flush_once()
+    print(f"Copies of the alert (Expected 1): {sum(1 for a in fake.tables['alerts'] if a['id'] == rows[0]['id'])}")
+
+    print("\n--- TEST 5: Background flusher and drain on shutdown ---")
+    box.start()
+    box.enqueue("alerts", [{"shift_id": "s3", "is_active": True} for _ in range(5)])
+    left = await box.drain(timeout=2)
+    print(f"Rows left after drain (Expected 0): {left}")
+    print(f"Alerts for s3 delivered (Expected 5): {sum(1 for a in fake.tables['alerts'] if a['shift_id'] == 's3')}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
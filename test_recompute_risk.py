@@ -0,0 +1,109 @@
+import asyncio
+import os
+import random
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+from agent.agent_service import PRIORITY_WEIGHTS, STATUS_WEIGHTS, RISK_THRESHOLD, task_weight
+from fake_supabase import FakeSupabase
+from recompute_risk import recompute
+
+
+def build_history(shifts: int = 300, seed: int = 5) -> FakeSupabase:
+    rng = random.Random(seed)
+    fake = FakeSupabase()
+    for i in range(shifts):
+        shift = fake.with_defaults("shifts", {
+            "name": f"Shift {i + 1}", "is_active": i == 0, "sequence_order": i + 1,
+            "risk_score": rng.randint(0, 10), "is_high_risk": rng.random() < 0.3,
+        })
+        fake.tables.setdefault("shifts", []).append(shift)
+        for _ in range(rng.choice([0, 2, 6, 15])):
+            fake.tables.setdefault("tasks", []).append(fake.with_defaults("tasks", {
+                "title": "History", "shift_id": shift["id"],
+                "priority": rng.choice(list(PRIORITY_WEIGHTS) + [None]),
+                "status": rng.choice(list(STATUS_WEIGHTS)),
+            }))
+        for _ in range(rng.randint(0, 3)):
+            fake.tables.setdefault("alerts", []).append(fake.with_defaults("alerts", {
+                "shift_id": shift["id"], "alert_type": "BLOCK", "is_active": rng.random() < 0.7,
+            }))
+    return fake
+
+
+def expected_scores(fake: FakeSupabase) -> dict:
+    """evaluate_shift_risk's formula, one shift at a time."""
+    scores = {}
+    for shift in fake.tables["shifts"]:
+        tasks = [t for t in fake.tables["tasks"] if t["shift_id"] == shift["id"]]
+        alerts = [a for a in fake.tables["alerts"] if a["shift_id"] == shift["id"] and a["is_active"]]
+        risk = min(10, (sum(task_weight(t) for t in tasks) + 10 * len(alerts)) // 10) if tasks else 0
+        scores[shift["id"]] = (risk, risk >= RISK_THRESHOLD)
+    return scores
+
+
+def stored(fake: FakeSupabase) -> dict:
+    return {s["id"]: (s["risk_score"], s["is_high_risk"]) for s in fake.tables["shifts"]}
+
+
+async def run_tests():
+    fake = build_history()
+    db_client.use_client(fake)
+    expected = expected_scores(fake)
+    active_id = fake.tables["shifts"][0]["id"]
+    before = stored(fake)
+    flips = {shift_id for shift_id, score in expected.items()
+             if shift_id != active_id and score[1] != before[shift_id][1]}
+
+    print("\n--- TEST 1: Dry run diffs escalation state and writes nothing ---")
+    totals = await recompute(shift_page=64, row_page=500, dry_run=True, report=None)
+    print(f"Escalation changes match (Expected True): {({c['shift_id'] for c in totals['escalation_changes']}) == flips}")
+    print(f"Shift writes (Expected 0): {fake.calls.get('update shifts', 0)}")
+    print(f"Shifts scored, active skipped (Expected 299): {totals['shifts']}")
+
+    print("\n--- TEST 2: Bulk run matches the per-shift formula ---")
+    fake.reset_stats()
+    totals = await recompute(shift_page=64, row_page=500, report=None)
+    after = stored(fake)
+    mismatches = sum(1 for shift_id, score in expected.items() if shift_id != active_id and after[shift_id] != score)
+    print(f"Mismatches (Expected 0): {mismatches}")
+    print(f"Active shift untouched (Expected True): {after[active_id] == before[active_id]}")
+    print(f"Round trips for 300 shifts (Expected < 100): {fake.round_trips}")
+    print(f"Update calls, not one per changed shift (Expected True): {totals['writes'] < totals['score_changed']}")
+
+    print("\n--- TEST 3: Re-running changes nothing ---")
+    totals = await recompute(shift_page=64, row_page=500, report=None)
+    print(f"Score changes / writes (Expected 0 / 0): {totals['score_changed']} / {totals['writes']}")
+
+    print("\n--- TEST 4: Page sizes don't change the result ---")
+    fake = build_history(seed=9)
+    db_client.use_client(fake)
+    expected = expected_scores(fake)
+    active_id = fake.tables["shifts"][0]["id"]
+    await recompute(shift_page=7, row_page=3, report=None)
+    after = stored(fake)
+    mismatches = sum(1 for shift_id, score in expected.items() if shift_id != active_id and after[shift_id] != score)
+    print(f"Mismatches with tiny pages (Expected 0): {mismatches}")
+
+    print("\n--- TEST 5: A server row cap below row_page doesn't drop rows ---")
+    fake = build_history(seed=13)
+    fake.max_rows = 50  # PostgREST db-max-rows: every 1000-row page comes back short
+    db_client.use_client(fake)
+    expected = expected_scores(fake)
+    active_id = fake.tables["shifts"][0]["id"]
+    totals = await recompute(report=None)
+    after = stored(fake)
+    mismatches = sum(1 for shift_id, score in expected.items() if shift_id != active_id and after[shift_id] != score)
+    inactive = {s["id"] for s in fake.tables["shifts"][1:]}
+    print(f"Tasks read (Expected True): {totals['tasks'] == sum(t['shift_id'] in inactive for t in fake.tables['tasks'])}")
+    print(f"Mismatches under a 50-row cap (Expected 0): {mismatches}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import db_client
+import db_service
+from agent import summary_service
+from agent.summary_service import generate_shift_summary
+from fake_supabase import FakeSupabase, seed_demo
+from resilience import CircuitOpenError, DeadlineExceeded, ReadLatency, request_budget
+
+
+def reset(fake: FakeSupabase):
+    db_client.use_client(fake)
+    db_client.breaker.reset()
+    db_client.resilience_metrics.reset()
+    db_client.read_latency = ReadLatency()
+    db_client.last_good.clear()
+    db_service.active_shift_cache.invalidate()
+
+
+def pct(latencies: list, q: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_tests():
+    print("\n--- TEST 1: Request budget caps every query ---")
+    fake = FakeSupabase(latency_ms=200)
+    seed_demo(fake, tasks=1)
+    reset(fake)
+    db = await db_client.get_client()
+    start = time.perf_counter()
+    with request_budget(0.05):
+        try:
+            await db_client.execute(db.table("shifts").select("*"))
+        except DeadlineExceeded:
+            pass
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        trips = fake.round_trips
+        try:
+            await db_client.execute(db.table("shifts").select("*"))
+        except DeadlineExceeded:
+            pass
+    print(f"Gave up at the budget, not the 200ms query (Expected True): {elapsed_ms < 120}")
+    print(f"Spent budget fails without a round trip (Expected True): {fake.round_trips == trips}")
+    print(f"deadline_exceeded counted (Expected 2): {db_client.resilience_stats()['deadline_exceeded']}")
+
+    print("\n--- TEST 2: Hedged reads cut the tail ---")
+    fake = FakeSupabase(latency_ms=10, jitter_ms=2, tail_ms=400, tail_rate=0.04, seed=3)
+    seed_demo(fake, tasks=20)
+    reset(fake)
+    shift_id = fake.tables["shifts"][0]["id"]
+    for _ in range(30):  # history for the adaptive hedge delay
+        await db_service.get_shift_tasks(shift_id, limit=5)
+    latencies = []
+    for _ in range(100):
+        start = time.perf_counter()
+        page = await db_service.get_shift_tasks(shift_id, limit=5)
+        latencies.append((time.perf_counter() - start) * 1000)
+    stats = db_client.resilience_stats()
+    print(f"Pages still correct (Expected 5): {len(page['tasks'])}")
+    print(f"Hedges sent (Expected > 0): {stats['hedges_sent']}")
+    print(f"p95 well under the 400ms tail (Expected True): {pct(latencies, 0.95) < 200}")
+
+    print("\n--- TEST 3: Breaker opens on an outage and serves last known good ---")
+    fake = FakeSupabase(latency_ms=2)
+    seed_demo(fake, tasks=3)
+    reset(fake)
+    db_client.breaker.open_seconds = 0.2
+    shift_id = fake.tables["shifts"][0]["id"]
+    good_shift = await db_service.get_active_shift(use_cache=False)
+    good_page = await db_service.get_shift_tasks(shift_id, limit=10)
+
+    fake.error_rate = 1.0
+    for _ in range(12):
+        await db_service.check_db_connection()
+    print(f"Breaker state (Expected open): {db_client.breaker.state}")
+    trips = fake.round_trips
+    shift = await db_service.get_active_shift(use_cache=False)
+    page = await db_service.get_shift_tasks(shift_id, limit=10)
+    print(f"Active shift served from last good (Expected {good_shift['name']}): {shift and shift['name']}")
+    print(f"Task page served from last good (Expected {len(good_page['tasks'])}): {len(page['tasks'])}")
+    print(f"No round trips while open (Expected True): {fake.round_trips == trips}")
+    try:
+        await db_client.execute(db.table("tasks").insert({"title": "x"}))
+        print("Writes fail fast (Expected CircuitOpenError): no error")
+    except CircuitOpenError:
+        print("Writes fail fast (Expected CircuitOpenError): CircuitOpenError")
+
+    print("\n--- TEST 4: Half-open probe closes the breaker after recovery ---")
+    fake.error_rate = 0.0
+    await asyncio.sleep(0.25)
+    shift = await db_service.get_active_shift(use_cache=False)
+    print(f"Breaker state (Expected closed): {db_client.breaker.state}")
+    stats = db_client.resilience_stats()
+    print(f"Metrics (Expected stale_served 2, fast_failed >= 3, times_opened 1): "
+          f"{stats['stale_served']}, {stats['fast_failed']}, {stats['breaker']['times_opened']}")
+
+    print("\n--- TEST 5: Spent request budgets don't trip the breaker; the summary write gets its own ---")
+    fake = FakeSupabase(latency_ms=30)
+    shift_id = seed_demo(fake, tasks=3)
+    reset(fake)
+    for _ in range(12):
+        with request_budget(0.01):
+            try:
+                await db_client.execute(db.table("shifts").select("*"))
+            except DeadlineExceeded:
+                pass
+    print(f"Breaker after 12 budget timeouts (Expected closed 0): {db_client.breaker.state} "
+          f"{db_client.breaker.stats()['window_calls']}")
+    class SlowModel:  # Gemini stand-in that outlives the request budget
+        def __init__(self, **kwargs):
+            pass
+
+        def start_chat(self, history):
+            return self
+
+        def send_message(self, prompt):
+            time.sleep(0.2)
+            return type("Response", (), {"text": "Quiet shift."})()
+
+    summary_service.GEMINI_API_KEY, summary_service.genai.GenerativeModel = "test", SlowModel
+    with request_budget(0.15):
+        await generate_shift_summary(shift_id)
+    summaries = fake.tables.get("shift_summaries", [])
+    print(f"Summary stored (Expected 1 Quiet shift.): {len(summaries)} {summaries and summaries[0]['ai_summary']}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
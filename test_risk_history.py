@@ -0,0 +1,95 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "fake")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+
+import numpy as np
+
+import db_client
+import db_service
+from agent.agent_service import evaluate_shift_risk
+from fake_supabase import FakeSupabase, seed_demo
+from outbox import outbox
+from risk_history import RiskHistory, risk_history
+
+T0 = 1_700_000_000.0
+
+
+async def run_tests():
+    print("\n--- TEST 1: Fixed-size ring keeps the newest points ---")
+    history = RiskHistory(points=8, heartbeat_seconds=60)
+    for i in range(20):
+        history.record("s1", i % 11, i % 11 >= 8, ts=T0 + i)
+    result = history.query("s1")
+    print(f"Points kept (Expected 8): {result['raw_points']}")
+    print(f"Oldest first (Expected [1, 2, 3]): {[p['risk'] for p in result['points'][:3]]}")
+    history.record("s1", 9, True, ts=T0 + 20)
+    history.record("s1", 9, True, ts=T0 + 21)  # unchanged, inside the heartbeat
+    history.record("s1", 9, True, ts=T0 + 90)  # unchanged, heartbeat due
+    print(f"Unchanged points skipped (Expected 1): {history.stats()['skipped_unchanged']}")
+
+    print("\n--- TEST 2: Downsampling ---")
+    history = RiskHistory(points=2048)
+    rng = np.random.default_rng(4)
+    scores = rng.integers(0, 11, 1000)
+    for i, score in enumerate(scores.tolist()):
+        history.record("s2", score, score >= 8, ts=T0 + i)
+    auto = history.query("s2", max_points=50)
+    print(f"Auto buckets (Expected <= 50 True): {len(auto['points'])} "
+          f"{sum(p['samples'] for p in auto['points']) == auto['raw_points']}")
+    fixed = history.query("s2", bucket_seconds=100, agg="last")
+    print(f"Fixed 100s buckets, last value (Expected 10 True): {len(fixed['points'])} "
+          f"{[p['risk'] for p in fixed['points']] == scores[99::100].tolist()}")
+    maxed = history.query("s2", bucket_seconds=100, agg="max")
+    print(f"Max per bucket (Expected True): {[p['risk'] for p in maxed['points']] == scores.reshape(10, 100).max(1).tolist()}")
+    try:
+        history.query("s2", agg="median")
+        print("Bad agg (Expected ValueError): no error")
+    except ValueError:
+        print("Bad agg (Expected ValueError): ValueError")
+
+    print("\n--- TEST 3: Periodic flush goes through the outbox exactly once ---")
+    fake = FakeSupabase()
+    shift_id = seed_demo(fake, tasks=4)
+    db_client.use_client(fake)
+    history = RiskHistory(points=16)
+    for i in range(5):
+        history.record(shift_id, i, False, ts=T0 + i)
+    print(f"Rows handed to the outbox (Expected 5): {history.flush_once()}")
+    print(f"Nothing new to flush (Expected 0): {history.flush_once()}")
+    while await outbox.flush_once():
+        pass
+    stored = fake.tables.get("shift_risk_history", [])
+    print(f"Rows stored (Expected 5): {len(stored)}")
+    for i in range(20):
+        history.record(shift_id, i % 11, False, ts=T0 + 10 + i)
+    print(f"Overwritten before a flush (Expected 4): {history.stats()['lost_before_flush']}")
+
+    print("\n--- TEST 4: Evaluations feed the ring; older stored points are merged in ---")
+    db_service.active_shift_cache.invalidate()
+    await evaluate_shift_risk(shift_id)
+    await db_service.create_alerts([{"shift_id": shift_id, "alert_type": "BLOCK", "weight": 8, "is_active": True}])
+    await evaluate_shift_risk(shift_id)
+    live = risk_history.query(shift_id)
+    print(f"Recorded evaluations (Expected [2, 3]): {[p['risk'] for p in live['points']]}")
+    risk_history.flush_once()
+    while await outbox.flush_once():
+        pass
+    # Another process has just evaluated once: its ring must still show the stored trend
+    other = RiskHistory()
+    other.record(shift_id, 4, False)
+    other.backfill(shift_id, await db_service.get_shift_risk_history(shift_id, before=other.oldest(shift_id)))
+    merged = other.query(shift_id)
+    print(f"Stored points merged before the live one (Expected 8 4): {merged['raw_points']} {merged['points'][-1]['risk']}")
+    print(f"Only the live point is flushed (Expected 1): {other.flush_once()}")
+    other.backfill(shift_id, await db_service.get_shift_risk_history(shift_id))
+    print(f"Backfilled once per ring (Expected True 8): {other.backfilled(shift_id)} {other.query(shift_id)['raw_points']}")
+
+    db_client.use_client(None)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from shift_cache import ActiveShiftCache
+
+
+async def run_tests():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.02)  # simulate a Supabase round trip
+        return {"id": "shift-1", "name": "Morning"}
+
+    cache = ActiveShiftCache(ttl_seconds=30)
+
+    print("\n--- TEST 1: Repeated lookups hit the DB once ---")
+    for _ in range(5):
+        shift = await cache.get(loader)
+    print(f"Shift (Expected shift-1): {shift['id']}")
+    print(f"DB calls (Expected 1): {len(calls)}")
+    print(f"DB calls saved (Expected 4): {cache.stats()['db_calls_saved']}")
+
+    print("\n--- TEST 2: Callers get copies, not the cached row ---")
+    shift["name"] = "mutated"
+    print(f"Cached name (Expected Morning): {(await cache.get(loader))['name']}")
+
+    print("\n--- TEST 3: invalidate() forces a fresh read ---")
+    cache.invalidate()
+    await cache.get(loader)
+    print(f"DB calls (Expected 2): {len(calls)}")
+
+    print("\n--- TEST 4: Concurrent misses are coalesced ---")
+    cache.invalidate()
+    await asyncio.gather(*(cache.get(loader) for _ in range(10)))
+    print(f"DB calls (Expected 3): {len(calls)}")
+
+    print("\n--- TEST 5: TTL backstop ---")
+    short = ActiveShiftCache(ttl_seconds=0.05)
+    await short.get(loader)
+    time.sleep(0.1)
+    await short.get(loader)
+    print(f"Expirations (Expected 1): {short.stats()['expirations']}")
+
+    print("\n--- TEST 6: Errors are not cached, and reach every waiter ---")
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("supabase down")
+    fresh = ActiveShiftCache(ttl_seconds=30)
+    results = await asyncio.gather(*(fresh.get(failing) for _ in range(3)), return_exceptions=True)
+    print(f"Waiters that saw the error (Expected 3): {sum(isinstance(r, ConnectionError) for r in results)}")
+    print(f"Cached after error (Expected False): {fresh.stats()['cached']}")
+
+    print("\n--- TEST 7: ttl_seconds=0 disables caching ---")
+    disabled = ActiveShiftCache(ttl_seconds=0)
+    before = len(calls)
+    await disabled.get(loader)
+    await disabled.get(loader)
+    print(f"DB calls (Expected 2): {len(calls) - before}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())